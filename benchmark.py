@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from datetime import date, timedelta
+
+# The benchmark never needs a display.
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QItemSelection, QItemSelectionModel
+
+import budget_manager
+import ledger_core
+
+BENCHMARK_VERSION = 1
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DESCRIPTIONS = ('Coffee shop', 'Grocery market', 'Monthly salary', 'Bus ticket', 'Electricity bill',
+                'Cinema', 'Restaurant', 'Book store', 'Taxi', 'Internet', 'Pharmacy', 'Bakery')
+
+def synthetic_ledger(count, seed=0, end=date(2024, 12, 31), days=3 * 365):
+    # Deterministic for a given (count, seed): same rows on every machine and
+    # run, with dates spread over the `days` before `end`.
+    rng = random.Random(seed)
+    categories = ledger_core.CategoryBudgets.DEFAULT_CATEGORIES
+    for i in range(count):
+        type_key = 'income' if rng.random() < 0.1 else 'expense'
+        day = end - timedelta(days=rng.randrange(days))
+        yield {
+            'amount': round(rng.uniform(1000, 5000) if type_key == 'income' else rng.uniform(1, 300), 2),
+            'category': rng.choice(categories),
+            'type': type_key,
+            'date': day.isoformat(),
+            'description': f'{rng.choice(DESCRIPTIONS)} {rng.randrange(1000)}',
+            'timestamp': f'{day.isoformat()} {rng.randrange(24):02d}:{rng.randrange(60):02d}:00',
+        }
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def seed_ledger(storage, count, seed, base_name='budget_transactions'):
+    # Writes the synthetic ledger the way each backend stores a saved one: a
+    # binary snapshot for json, table rows for sqlite.
+    if storage == 'json':
+        store = ledger_core.ColumnarTransactionStore()
+        for chunk in _chunks(synthetic_ledger(count, seed), 50000):
+            store.extend(chunk)
+        ledger_core.write_binary_snapshot(base_name + '.bin', store)
+        return
+    repository = ledger_core.open_repository(storage, base_name)
+    for chunk in _chunks(synthetic_ledger(count, seed), 50000):
+        repository.add_many(chunk)
+    repository.flush()
+    repository.close()
+
+class Stopwatch:
+    def __init__(self):
+        self.timings = {}
+
+    def time(self, name, func, *args, repeat=1):
+        # Records the mean milliseconds per call.
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func(*args)
+        self.timings[name] = round((time.perf_counter() - started) * 1000.0 / repeat, 3)
+        return result
+
+def pump(app, until=None, timeout=600.0):
+    deadline = time.perf_counter() + timeout
+    app.processEvents()
+    while until is not None and not until() and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+
+def run_size(app, storage, count, seed, adds=100):
+    stopwatch = Stopwatch()
+    stopwatch.time('seed', seed_ledger, storage, count, seed)
+
+    def load():
+        window = budget_manager.BudgetManagerApp(storage=storage)
+        window.show()
+        pump(app, lambda: window.ledger_loaded or not window.loader_thread.isRunning())
+        return window
+    window = stopwatch.time('load', load)
+    if not window.ledger_loaded:
+        window.close()
+        raise RuntimeError(window.status_text.toPlainText())
+
+    def add():
+        window.amount_input.setText('12.5')
+        window.description_input.setText('Benchmark row')
+        window.add_transaction()
+    stopwatch.time('add', add, repeat=adds)
+    window.repository.flush()
+
+    window.tabs.setCurrentIndex(1)
+    pump(app)
+    stopwatch.time('table_refresh', lambda: (window.update_transactions_table(), pump(app)))
+
+    deleted = min(1000, max(1, count // 10))
+    model = window.transactions_model
+    while model.rowCount() < deleted and model.canFetchMore():
+        model.fetchMore()
+    selection = QItemSelection(model.index(0, 0), model.index(deleted - 1, len(model.COLUMNS) - 1))
+    window.transactions_table.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.Select)
+    stopwatch.time('bulk_delete', window.delete_selected_transactions)
+    window.repository.flush()
+
+    window.tabs.setCurrentIndex(0)
+    pump(app)
+    stopwatch.time('overview_refresh', lambda: (window.update_overview(), pump(app)))
+    texts = window.texts[window.current_lang]
+    labels, series = window.report_series('monthly')
+    stopwatch.time('chart_redraw', lambda: (window.graph.update_graph(
+        labels, series, texts['report_monthly'], texts['axis_period'], texts['axis_amount']), pump(app)), repeat=10)
+
+    stopwatch.time('save', lambda: (window.repository.save(), window.repository.flush()))
+    rows = window.repository.count()
+    window.close()
+    return {'rows': count, 'rows_after': rows, 'storage': storage, 'adds': adds, 'deleted': deleted,
+            'timings_ms': stopwatch.timings}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Budget Manager benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='ledger sizes to benchmark')
+    parser.add_argument('--storage', nargs='+', choices=('json', 'sqlite'), default=['json'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = []
+    cwd = os.getcwd()
+    for storage in args.storage:
+        for count in args.sizes:
+            # Each run gets a fresh working directory, as the app keeps its
+            # files next to where it runs.
+            with tempfile.TemporaryDirectory(prefix='budget-bench-') as workdir:
+                os.chdir(workdir)
+                try:
+                    results.append(run_size(app, storage, count, args.seed))
+                finally:
+                    os.chdir(cwd)
+            print(f'{storage} {count}: {results[-1]["timings_ms"]}', file=sys.stderr)
+
+    report = {
+        'version': BENCHMARK_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
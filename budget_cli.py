@@ -0,0 +1,167 @@
+import sys
+import json
+import argparse
+from datetime import datetime
+
+from ledger_core import (
+    AggregateCache, CategoryBudgets, DuplicateFilter, LedgerCatalog, StatementReader, TRANSACTION_TYPES,
+    open_repository, load_ledger, report_series
+)
+
+# Headless entry point over the same ledger files as the window. Nothing here
+# imports PyQt6 or matplotlib, so it runs on machines without a display.
+REPORTS = ('balance', 'categories', 'daily', 'weekly', 'monthly', 'yoy', 'trailing')
+DATE_FORMATS = {StatementReader.date_format_label(date_format): date_format
+                for date_format in StatementReader.DATE_FORMATS}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Budget Manager (command line)')
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json',
+                        help='ledger storage backend, as for budget_manager.py')
+    parser.add_argument('--ledger', help='named ledger to use (default: the one last open in the app)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='add one transaction')
+    add.add_argument('amount', type=float)
+    add.add_argument('--type', choices=TRANSACTION_TYPES, default='expense')
+    add.add_argument('--category', default=CategoryBudgets.FALLBACK_CATEGORY)
+    add.add_argument('--date', help='YYYY-MM-DD (default: today)')
+    add.add_argument('--description', default='')
+
+    statement = commands.add_parser('import', help='import a CSV or OFX/QFX bank statement')
+    statement.add_argument('file')
+    statement.add_argument('--map', action='append', default=[], metavar='FIELD=HEADER',
+                           help=f'CSV column holding FIELD (one of {", ".join(StatementReader.CSV_HEADERS)}); '
+                                'an empty HEADER ignores the field. Repeatable; unmapped fields are guessed')
+    statement.add_argument('--date-format', choices=DATE_FORMATS,
+                           help='date format of the CSV (default: detected from the first rows)')
+
+    report = commands.add_parser('report', help='print totals or a period report')
+    report.add_argument('--report', choices=REPORTS, default='balance')
+    report.add_argument('--json', action='store_true', help='print the report as JSON')
+
+    export = commands.add_parser('export', help='export the ledger (.bin for a binary snapshot, else JSON)')
+    export.add_argument('path')
+    return parser
+
+def parse_column_map(parser, mappings):
+    column_map = {}
+    for mapping in mappings:
+        field, separator, header = mapping.partition('=')
+        field = field.strip().lower()
+        if not separator or field not in StatementReader.CSV_HEADERS:
+            parser.error(f'invalid --map {mapping!r}, expected FIELD=HEADER with FIELD one of '
+                         f'{", ".join(StatementReader.CSV_HEADERS)}')
+        column_map[field] = header.strip()
+    return column_map
+
+def balance_report(aggregates, budgets, today):
+    report = {type_key: aggregates.total(type_key) for type_key in TRANSACTION_TYPES}
+    report['balance'] = report['income'] - report['expense']
+    report['count'] = aggregates.count()
+    budget_status = {}
+    for category in budgets.categories:
+        status = budgets.status(aggregates, category, today)
+        if status is not None:
+            spent, limit, period = status
+            budget_status[category] = {'spent': spent, 'limit': limit, 'period': period}
+    report['budgets'] = budget_status
+    return report
+
+def print_report(name, report):
+    if name == 'balance':
+        for key in ('balance', 'income', 'expense'):
+            print(f'{key:<10} {report[key]:>14.2f}')
+        print(f'{"count":<10} {report["count"]:>14d}')
+        for category, status in report['budgets'].items():
+            flag = '  OVER' if status['spent'] > status['limit'] else ''
+            print(f'{category}: {status["spent"]:.2f} / {status["limit"]:.2f} per {status["period"]}{flag}')
+        return
+    width = max([len(str(label)) for label in report['labels']] + [8])
+    keys = [key for key, _ in report['series']]
+    print(' ' * width + ''.join(f'{key:>14}' for key in keys))
+    for i, label in enumerate(report['labels']):
+        print(f'{label:<{width}}' + ''.join(f'{values[i]:>14.2f}' for _, values in report['series']))
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    ledgers = LedgerCatalog()
+    ledgers.load()
+    name = args.ledger or ledgers.active
+    if name not in ledgers.ledgers:
+        parser.error(f'unknown ledger {name!r} (known: {", ".join(ledgers.names())})')
+    budgets = CategoryBudgets()
+    budgets.load()
+    today = datetime.now().date()
+
+    transaction = None
+    column_map = None
+    if args.command == 'import':
+        column_map = parse_column_map(parser, args.map)
+    elif args.command == 'add':
+        if args.category not in budgets.categories:
+            parser.error(f'unknown category {args.category!r} (known: {", ".join(budgets.categories)})')
+        day = args.date or today.isoformat()
+        try:
+            datetime.strptime(day, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f'invalid date {day!r}, expected YYYY-MM-DD')
+        transaction = {
+            'amount': args.amount,
+            'category': args.category,
+            'type': args.type,
+            'date': day,
+            'description': args.description,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    # Nothing here searches.
+    repository = open_repository(args.storage, ledgers.base_name(name), indexed=False)
+    aggregates = AggregateCache()
+    status = 0
+    try:
+        load_ledger(repository, aggregates)
+        if args.command == 'add':
+            repository.add(transaction)
+            aggregates.add(transaction)
+            print(f'added {transaction["type"]} {transaction["amount"]:.2f} on {transaction["date"]}')
+        elif args.command == 'import':
+            reader = StatementReader(args.file, budgets.categories, column_map,
+                                     DATE_FORMATS.get(args.date_format))
+            duplicates = DuplicateFilter(repository)
+            added = 0
+            for op, batch, done, total in reader.read_batches():
+                fresh = duplicates.filter(batch)
+                if fresh:
+                    repository.add_many(fresh)
+                    for item in fresh:
+                        aggregates.add(item)
+                    added += len(fresh)
+            print(f'imported {added}, skipped {duplicates.skipped} duplicates and {reader.invalid} invalid rows')
+        elif args.command == 'report':
+            if args.report == 'balance':
+                report = balance_report(aggregates, budgets, today)
+            else:
+                labels, series = report_series(aggregates, args.report, today, budgets.categories)
+                report = {'labels': labels, 'series': [[key, values] for key, values in series]}
+            report['ledger'] = name
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print_report(args.report, report)
+        else:
+            repository.export(args.path)
+        if args.command in ('add', 'import'):
+            ledgers.update_summary(name, aggregates, aggregates.count())
+            ledgers.save(repository.writer)
+    except (OSError, ValueError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        status = 1
+    finally:
+        repository.flush()
+        repository.close()
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
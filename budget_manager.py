@@ -1,201 +1,1083 @@
 import sys
 import json
+import html
+import math
+import argparse
+import functools
+import time
+_STARTUP_T0 = time.perf_counter()
+from collections import OrderedDict, deque
 from datetime import datetime
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QComboBox,
     QPushButton, QTextEdit, QLabel, QStyleFactory, QTabWidget, QGridLayout,
     QScrollArea, QMenuBar, QMenu, QFileDialog, QMessageBox, QLineEdit, QDateEdit,
-    QTableWidget, QTableWidgetItem, QHeaderView
+    QTableView, QHeaderView, QListWidget, QListWidgetItem, QInputDialog, QCheckBox, QTableWidget,
+    QTableWidgetItem, QDialog, QDialogButtonBox, QFormLayout
 )
-from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QIcon, QPalette, QColor, QFont
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from PyQt6.QtCore import Qt, QDate, QAbstractTableModel, QModelIndex, QObject, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QPalette, QColor, QFont, QKeySequence
 import numpy as np
-from pathlib import Path
+from ledger_core import (
+    AggregateCache, CategoryBudgets, DuplicateFilter, LedgerCatalog, RecurringRules, RecurringSchedule,
+    StatementReader, TRANSACTION_TYPES, UndoLog, atomic_write_json, open_repository, report_series
+)
+
+class StartupProfiler:
+    # Time spent in each startup phase, measured from the top of this module.
+    # Phases are recorded once; on_complete fires when every phase in
+    # wait_for has been marked (or finish() is called).
+    def __init__(self, start, wait_for=()):
+        self.start = start
+        self.last = start
+        self.phases = OrderedDict()
+        self.pending = set(wait_for)
+        self.on_complete = None
+
+    def mark(self, phase):
+        if phase in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = (now - self.last, now - self.start)
+        self.last = now
+        self.pending.discard(phase)
+        if not self.pending:
+            self.finish()
+
+    def finish(self):
+        callback, self.on_complete = self.on_complete, None
+        if callback is not None:
+            callback()
+
+    def elapsed_ms(self, phase):
+        return self.phases[phase][1] * 1000.0
+
+    def report(self):
+        return {
+            'phases': [{'phase': phase, 'ms': round(duration * 1000.0, 2), 'elapsed_ms': round(elapsed * 1000.0, 2)}
+                       for phase, (duration, elapsed) in self.phases.items()],
+            'total_ms': round((self.last - self.start) * 1000.0, 2)
+        }
+
+class Instrumentation:
+    # Opt-in counters for the hot paths. Each metric keeps its call count,
+    # a running total and its last WINDOW values, from which the rolling
+    # p50/p95 are taken. Timings are in milliseconds; other metrics (rows,
+    # bytes) carry their own unit. Nothing is recorded while disabled.
+    WINDOW = 200
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.metrics = OrderedDict()
+        self._marks = {}
+
+    def record(self, name, value, unit='ms'):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = {'unit': unit, 'count': 0, 'total': 0.0,
+                                           'window': deque(maxlen=self.WINDOW)}
+        metric['count'] += 1
+        metric['total'] += value
+        metric['window'].append(value)
+
+    def record_delta(self, name, counter, unit):
+        # Records how far a monotonic counter moved since the last call; a
+        # counter that went backwards was replaced and counts from zero.
+        last = self._marks.get(name, 0)
+        self._marks[name] = counter
+        self.record(name, counter - last if counter >= last else counter, unit)
+
+    def reset(self):
+        self.metrics.clear()
+
+    @staticmethod
+    def percentile(ordered, fraction):
+        # Nearest-rank percentile of an already sorted list.
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+    def report(self):
+        metrics = OrderedDict()
+        for name, metric in self.metrics.items():
+            ordered = sorted(metric['window'])
+            metrics[name] = {
+                'unit': metric['unit'],
+                'count': metric['count'],
+                'total': round(metric['total'], 3),
+                'p50': round(self.percentile(ordered, 0.50), 3),
+                'p95': round(self.percentile(ordered, 0.95), 3),
+                'max': round(ordered[-1], 3),
+            }
+        return {'enabled': self.enabled, 'window': self.WINDOW, 'metrics': metrics}
+
+def instrumented(name):
+    # Times a method into its object's instrumentation; a disabled (or
+    # missing) one costs a single attribute check per call.
+    def decorate(method):
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            instrumentation = self.instrumentation
+            if instrumentation is None or not instrumentation.enabled:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                instrumentation.record(name, (time.perf_counter() - started) * 1000.0)
+        return timed
+    return decorate
+
+class TransactionTableModel(QAbstractTableModel):
+    # Rows are read from the repository a page at a time and only for the
+    # cells the view actually paints; nothing is materialized per cell. With
+    # a filter set, the model shows only the transactions with those ids.
+    #
+    # A cached page also keeps its display strings per language, rendered
+    # the first time the page is painted in that language, so switching
+    # languages only renders the rows on screen and switching back renders
+    # nothing.
+    COLUMNS = ('date', 'type', 'category', 'amount', 'description')
+    HEADER_KEYS = ('table_date', 'table_type', 'table_category', 'table_amount', 'table_description')
+    SORTABLE = ('date', 'type', 'category', 'amount')
+    PAGE_SIZE = 256
+    FETCH_SIZE = 1000
+    MAX_CACHED_PAGES = 64
+
+    def __init__(self, repository, texts, formats, lang='en', parent=None):
+        super().__init__(parent)
+        self.repository = repository
+        self.texts = texts
+        self.formats = formats
+        self.lang = lang
+        self._total = 0
+        self._loaded = 0
+        self._pages = OrderedDict()
+        self.ids = None
+        self.materialized = 0
+
+    def set_filter(self, ids):
+        # Takes effect on the next refresh().
+        self.ids = ids
+
+    def refresh(self):
+        self.beginResetModel()
+        self._pages.clear()
+        self._total = self.repository.count() if self.ids is None else len(self.ids)
+        self._loaded = min(self._total, self.FETCH_SIZE)
+        self.endResetModel()
+
+    def ids_for_rows(self, rows):
+        rows = sorted(rows)
+        if self.ids is None:
+            return self.repository.ids_at(rows)
+        return self.ids[rows]
+
+    def sync_count(self):
+        # Picks up rows appended to the repository without resetting the view,
+        # so scrolling and selection survive batched loads.
+        if self.ids is not None:
+            return
+        total = self.repository.count()
+        if total < self._total:
+            self.refresh()
+            return
+        self._total = total
+        target = min(total, max(self._loaded, self.FETCH_SIZE))
+        if target > self._loaded:
+            last_page = self._loaded // self.PAGE_SIZE
+            self._pages.pop(last_page, None)
+            self.beginInsertRows(QModelIndex(), self._loaded, target - 1)
+            self._loaded = target
+            self.endInsertRows()
+        else:
+            self._pages.pop((self._loaded - 1) // self.PAGE_SIZE, None)
+
+    def set_language(self, lang):
+        self.lang = lang
+        self.headerDataChanged.emit(Qt.Orientation.Horizontal, 0, len(self.COLUMNS) - 1)
+        if self._loaded:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._loaded - 1, len(self.COLUMNS) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_SIZE, self._total - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def _page(self, page):
+        # (rows, {lang: display rows}) of a page, read on first use.
+        entry = self._pages.get(page)
+        if entry is None:
+            if self.ids is None:
+                rows = self.repository.fetch(page * self.PAGE_SIZE, self.PAGE_SIZE)
+            else:
+                rows = self.repository.fetch_ids(self.ids[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE])
+            entry = self._pages[page] = (rows, {})
+            self.materialized += len(rows)
+            if len(self._pages) > self.MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page)
+        return entry
+
+    def transaction(self, row):
+        page, offset = divmod(row, self.PAGE_SIZE)
+        rows = self._page(page)[0]
+        return rows[offset] if offset < len(rows) else None
+
+    def display_row(self, row):
+        # The row's cells as display strings, in COLUMNS order.
+        page, offset = divmod(row, self.PAGE_SIZE)
+        rows, rendered = self._page(page)
+        strings = rendered.get(self.lang)
+        if strings is None:
+            lang = self.lang
+            type_labels = {type_key: self.texts[lang][type_key] for type_key in TRANSACTION_TYPES}
+            date, amount = self.formats.date, self.formats.amount
+            strings = rendered[lang] = [
+                (date(lang, t['date']), type_labels.get(t['type'], t['type']), t['category'],
+                 amount(lang, t['amount']), t['description'])
+                for t in rows]
+        return strings[offset] if offset < len(strings) else None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignRight if self.lang == 'fa' else Qt.AlignmentFlag.AlignLeft
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        strings = self.display_row(index.row())
+        return None if strings is None else strings[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.texts[self.lang][self.HEADER_KEYS[section]]
+        return super().headerData(section, orientation, role)
+
+class BatchLoader(QObject):
+    # Runs source.read_batches() (a repository or a StatementReader) on a
+    # worker thread and forwards every batch to the GUI thread through a
+    # queued signal.
+    batch_loaded = pyqtSignal(str, object, int, int)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, source, batch_size=5000):
+        super().__init__()
+        self.source = source
+        self.batch_size = batch_size
+
+    def run(self):
+        try:
+            for op, payload, done, total in self.source.read_batches(self.batch_size):
+                if QThread.currentThread().isInterruptionRequested():
+                    return
+                self.batch_loaded.emit(op, payload, done, total)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+        except Exception as e:
+            # Anything escaping run() would abort the whole application from
+            # the worker thread, dropping the batches already queued.
+            self.failed.emit(f'{type(e).__name__}: {e}')
+        else:
+            self.finished.emit()
+
+class ColumnMappingDialog(QDialog):
+    # Lets the user say which CSV column holds each field before an import.
+    # Starts from the columns StatementReader would guess on its own.
+    FIELD_KEYS = {'date': 'table_date', 'amount': 'table_amount', 'debit': 'map_debit', 'credit': 'map_credit',
+                  'description': 'table_description', 'category': 'table_category', 'type': 'table_type'}
+
+    def __init__(self, header, guessed, texts, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(texts['import_mapping'])
+        layout = QFormLayout(self)
+        self.combos = {}
+        for field, key in self.FIELD_KEYS.items():
+            combo = QComboBox()
+            combo.addItem(texts['map_none'], '')
+            for name in header:
+                combo.addItem(name, name)
+            if field in guessed:
+                combo.setCurrentIndex(combo.findData(guessed[field]))
+            layout.addRow(texts[key], combo)
+            self.combos[field] = combo
+        self.date_format_combo = QComboBox()
+        self.date_format_combo.addItem(texts['date_format_detect'], None)
+        for date_format in StatementReader.DATE_FORMATS:
+            self.date_format_combo.addItem(StatementReader.date_format_label(date_format), date_format)
+        layout.addRow(texts['date_format'], self.date_format_combo)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def column_map(self):
+        return {field: combo.currentData() for field, combo in self.combos.items()}
+
+    def date_format(self):
+        return self.date_format_combo.currentData()
+
+class RefreshScheduler(QObject):
+    # Views report that they are stale with mark_dirty(); the scheduler
+    # renders each stale view at most once per event-loop pass, only while
+    # the tab holding it is current, and no more often than its
+    # min_interval (seconds) so streams of batches don't redraw every time.
+    def __init__(self, tabs, parent=None):
+        super().__init__(parent)
+        self.tabs = tabs
+        self.views = {}
+        self.dirty = set()
+        self.last_render = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        self.tabs.currentChanged.connect(lambda index: self.schedule())
+
+    def register(self, name, page, render, min_interval=0.0):
+        self.views[name] = (page, render, min_interval)
+
+    def mark_dirty(self, *names):
+        self.dirty.update(names)
+        self.schedule()
+
+    def schedule(self):
+        if self.dirty:
+            self.timer.start(0)
+
+    def flush(self):
+        current = self.tabs.currentWidget()
+        now = time.monotonic()
+        retry = None
+        for name in list(self.dirty):
+            page, render, min_interval = self.views[name]
+            if page is not current:
+                continue
+            wait = self.last_render.get(name, float('-inf')) + min_interval - now
+            if wait > 0:
+                retry = wait if retry is None else min(retry, wait)
+                continue
+            self.dirty.discard(name)
+            self.last_render[name] = now
+            render()
+        if retry is not None:
+            self.timer.start(int(retry * 1000) + 1)
 
 class GraphWidget(QWidget):
-    def __init__(self, parent=None):
+    # The bars are created once per category set/language and then only
+    # resized. They are animated artists: a full draw renders the static
+    # axes, whose pixels are cached, and value updates restore that cache,
+    # redraw just the bars and blit. A full draw_idle() happens only when the
+    # y-range no longer fits. matplotlib itself is only imported when the
+    # first graph is drawn, which happens after the window is on screen.
+    def __init__(self, parent=None, instrumentation=None):
         super().__init__(parent)
-        self.figure, self.ax = plt.subplots(figsize=(4, 3))
+        self.instrumentation = instrumentation
+        self.figure = self.ax = self.canvas = None
+        self.setLayout(QVBoxLayout())
+        self.bars = None
+        self._layout_key = None
+        self._background = None
+
+    def _ensure_canvas(self):
+        if self.canvas is not None:
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+        self.figure = Figure(figsize=(4, 3))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvas(self.figure)
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
-        self.setLayout(layout)
+        self.layout().addWidget(self.canvas)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
 
-    def update_graph(self, categories, amounts, title, lang):
+    SERIES_COLORS = ('#005A9E', '#D9822B')
+
+    @instrumented('update_graph')
+    def update_graph(self, labels, series, title, xlabel, ylabel):
+        # series is a list of (name, amounts) pairs, drawn as grouped bars.
+        self._ensure_canvas()
+        layout_key = (tuple(labels), tuple(name for name, _ in series), title, xlabel, ylabel)
+        if layout_key != self._layout_key:
+            self._relayout(labels, series, title, xlabel, ylabel)
+            self._layout_key = layout_key
+            return
+        amounts = [amount for _, values in series for amount in values]
+        for bar, amount in zip(self.bars, amounts):
+            bar.set_height(amount)
+        top = max(amounts, default=0)
+        _, ylim_top = self.ax.get_ylim()
+        if self._background is None or top > ylim_top or top < ylim_top * 0.25:
+            self.ax.set_ylim(0, self._ylim_for(top))
+            self.canvas.draw_idle()
+        else:
+            self._blit_bars()
+
+    def _relayout(self, labels, series, title, xlabel, ylabel):
         self.ax.clear()
-        self.ax.bar(categories, amounts, color='#005A9E')
+        self.bars = []
+        positions = np.arange(len(labels))
+        width = 0.8 / max(len(series), 1)
+        for i, (name, values) in enumerate(series):
+            offset = (i - (len(series) - 1) / 2) * width
+            self.bars.extend(self.ax.bar(positions + offset, values, width, label=name,
+                                         color=self.SERIES_COLORS[i % len(self.SERIES_COLORS)]))
+        for bar in self.bars:
+            bar.set_animated(True)
+        self.ax.set_xticks(positions, labels)
         self.ax.set_title(title, fontsize=12, color='#000000')
-        self.ax.set_xlabel('Categories' if lang == 'en' else 'دسته‌بندی‌ها' if lang == 'fa' else '类别' if lang == 'zh' else 'Категории', fontsize=10, color='#000000')
-        self.ax.set_ylabel('Amount' if lang == 'en' else 'مقدار' if lang == 'fa' else '金额' if lang == 'zh' else 'Сумма', fontsize=10, color='#000000')
+        self.ax.set_xlabel(xlabel, fontsize=10, color='#000000')
+        self.ax.set_ylabel(ylabel, fontsize=10, color='#000000')
         self.ax.grid(True, linestyle='--', alpha=0.7)
         self.ax.tick_params(axis='x', rotation=45)
-        self.canvas.draw()
+        if len(series) > 1:
+            self.ax.legend(fontsize=8)
+        self.ax.set_ylim(0, self._ylim_for(max((a for _, values in series for a in values), default=0)))
+        self._background = None
+        self.canvas.draw_idle()
+
+    def _ylim_for(self, top):
+        return top * 1.15 if top > 0 else 1.0
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_bars()
+
+    def _draw_bars(self):
+        if self.bars is not None:
+            for bar in self.bars:
+                self.ax.draw_artist(bar)
+
+    def _blit_bars(self):
+        self.canvas.restore_region(self._background)
+        self._draw_bars()
+        self.canvas.blit(self.ax.bbox)
+
+def _english_texts():
+    return {
+        'title': 'Budget Manager',
+        'add_transaction': 'Add Transaction',
+        'amount_label': 'Amount:',
+        'category_label': 'Category:',
+        'type_label': 'Type:',
+        'date_label': 'Date:',
+        'description_label': 'Description:',
+        'income': 'Income',
+        'expense': 'Expense',
+        'overview_tab': 'Overview',
+        'transactions_tab': 'Transactions',
+        'settings_tab': 'Settings',
+        'clear_transactions': 'Clear Transactions',
+        'save_transactions': 'Save Transactions to File',
+        'status_idle': 'Managing your budget...',
+        'status_added': 'Transaction added: {amount} at {time}',
+        'status_cleared': 'All transactions cleared at {time}',
+        'status_loading': 'Loading transactions... {percent}%',
+        'status_loaded': 'Loaded {count} transactions at {time}',
+        'load_failed': 'Could not load transactions: {error}',
+        'import_statement': 'Import Statement...',
+        'status_importing': 'Importing statement... {percent}%',
+        'status_imported': 'Imported {added} transactions ({skipped} duplicates, {invalid} invalid rows skipped) at {time}',
+        'import_failed': 'Could not import statement: {error}',
+        'import_mapping': 'Statement Columns',
+        'map_debit': 'Debit',
+        'map_credit': 'Credit',
+        'map_none': '(not in file)',
+        'date_format': 'Date format',
+        'date_format_detect': 'Detect from file',
+        'balance_label': 'Current Balance:',
+        'income_label': 'Total Income:',
+        'expense_label': 'Total Expenses:',
+        'table_date': 'Date',
+        'table_type': 'Type',
+        'table_category': 'Category',
+        'table_amount': 'Amount',
+        'table_description': 'Description',
+        'theme_label': 'Theme:',
+        'language_label': 'Language:',
+        'apply': 'Apply',
+        'file_menu': 'File',
+        'exit_action': 'Exit',
+        'about': 'About',
+        'about_text': 'Budget Manager\nVersion 1.0\nDeveloped by Hamid Yarali\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
+        'overview_title': 'Financial Overview',
+        'add_button': 'Add',
+        'delete_button': 'Delete Selected',
+        'search_placeholder': 'Search descriptions...',
+        'search_all_categories': 'All categories',
+        'search_all_types': 'All types',
+        'search_date_from': 'From (YYYY-MM-DD)',
+        'search_date_to': 'To (YYYY-MM-DD)',
+        'search_amount_min': 'Min amount',
+        'search_amount_max': 'Max amount',
+        'search_clear': 'Clear Search',
+        'search_results': '{count} matching transactions ({ms:.1f} ms)',
+        'report_label': 'Report:',
+        'report_categories': 'Expenses by category',
+        'report_daily': 'Daily (last 30 days)',
+        'report_weekly': 'Weekly (last 12 weeks)',
+        'report_monthly': 'Monthly totals (this year)',
+        'report_yoy': 'Year-over-year expenses',
+        'report_trailing': 'Trailing 12 months',
+        'axis_categories': 'Categories',
+        'axis_period': 'Period',
+        'axis_amount': 'Amount',
+        'save_failed': 'Could not save transactions: {error}',
+        'repeat_label': 'Repeat:',
+        'repeat_never': 'Never',
+        'repeat_daily': 'Daily',
+        'repeat_weekly': 'Weekly',
+        'repeat_monthly': 'Monthly',
+        'repeat_custom': 'Custom schedule',
+        'schedule_placeholder': 'Day of month, month, weekday (e.g. "1,15 * *")',
+        'invalid_schedule': 'Please enter a valid schedule.',
+        'recurring_label': 'Recurring transactions:',
+        'recurring_remove': 'Remove Selected Rule',
+        'status_recurring': 'Posted {count} recurring transactions at {time}',
+        'categories_label': 'Categories and budgets:',
+        'category_name_placeholder': 'New category name',
+        'add_category': 'Add Category',
+        'remove_category': 'Remove Category',
+        'budget_limit_placeholder': 'Budget limit (empty for none)',
+        'budget_period_week': 'per week',
+        'budget_period_month': 'per month',
+        'budget_period_year': 'per year',
+        'set_budget': 'Set Budget',
+        'budgets_title': 'Budgets:',
+        'budget_entry': '{category}: {spent} / {limit} {period}',
+        'budget_over': 'Over budget: {category} {spent} / {limit} {period}',
+        'ledger_label': 'Ledger:',
+        'new_ledger': 'New Ledger...',
+        'new_ledger_prompt': 'Name of the new ledger:',
+        'consolidated_label': 'All accounts ({count} ledgers): {balance}',
+        'edit_menu': 'Edit',
+        'undo_action': 'Undo',
+        'redo_action': 'Redo',
+        'status_undone': 'Undone: {added} restored, {deleted} removed at {time}',
+        'status_redone': 'Redone: {added} restored, {deleted} removed at {time}',
+        'status_not_undoable': 'This change is too large to be undone; the undo history was cleared.',
+        'diagnostics_label': 'Diagnostics:',
+        'diagnostics_enable': 'Record performance timings',
+        'diagnostics_reset': 'Reset',
+        'diagnostics_export': 'Export Diagnostics',
+        'diagnostics_exported': 'Diagnostics exported to {path}',
+        'diagnostics_metric': 'Metric',
+        'diagnostics_calls': 'Calls',
+        'diagnostics_p50': 'p50',
+        'diagnostics_p95': 'p95',
+        'diagnostics_max': 'Max',
+        'diagnostics_total': 'Total'
+    }
+
+def _persian_texts():
+    return {
+        'title': 'مدیریت بودجه',
+        'add_transaction': 'افزودن تراکنش',
+        'amount_label': 'مقدار:',
+        'category_label': 'دسته‌بندی:',
+        'type_label': 'نوع:',
+        'date_label': 'تاریخ:',
+        'description_label': 'توضیحات:',
+        'income': 'درآمد',
+        'expense': 'هزینه',
+        'overview_tab': 'نمای کلی',
+        'transactions_tab': 'تراکنش‌ها',
+        'settings_tab': 'تنظیمات',
+        'clear_transactions': 'پاک کردن تراکنش‌ها',
+        'save_transactions': 'ذخیره تراکنش‌ها در فایل',
+        'status_idle': 'مدیریت بودجه شما...',
+        'status_added': 'تراکنش اضافه شد: {amount} در {time}',
+        'status_cleared': 'همه تراکنش‌ها پاک شدند در {time}',
+        'status_loading': 'در حال بارگذاری تراکنش‌ها... {percent}٪',
+        'status_loaded': '{count} تراکنش بارگذاری شد در {time}',
+        'load_failed': 'بارگذاری تراکنش‌ها ممکن نشد: {error}',
+        'import_statement': 'وارد کردن صورت‌حساب...',
+        'status_importing': 'در حال وارد کردن صورت‌حساب... {percent}٪',
+        'status_imported': '{added} تراکنش وارد شد ({skipped} تکراری و {invalid} ردیف نامعتبر نادیده گرفته شد) در {time}',
+        'import_failed': 'وارد کردن صورت‌حساب ممکن نشد: {error}',
+        'import_mapping': 'ستون‌های صورت‌حساب',
+        'map_debit': 'برداشت',
+        'map_credit': 'واریز',
+        'map_none': '(در فایل نیست)',
+        'date_format': 'قالب تاریخ',
+        'date_format_detect': 'تشخیص از روی فایل',
+        'balance_label': 'تراز کنونی:',
+        'income_label': 'کل درآمدها:',
+        'expense_label': 'کل هزینه‌ها:',
+        'table_date': 'تاریخ',
+        'table_type': 'نوع',
+        'table_category': 'دسته‌بندی',
+        'table_amount': 'مقدار',
+        'table_description': 'توضیحات',
+        'theme_label': 'تم:',
+        'language_label': 'زبان:',
+        'apply': 'اعمال',
+        'file_menu': 'فایل',
+        'exit_action': 'خروج',
+        'about': 'درباره',
+        'about_text': 'مدیریت بودجه\nنسخه ۱.۰\nتوسعه‌یافته توسط حمید یارعلی\nگیت‌هاب: https://github.com/HamidYaraliOfficial\nاینستاگرام: https://www.instagram.com/hamidyaraliofficial\nتلگرام: @Hamid_Yarali',
+        'overview_title': 'نمای کلی مالی',
+        'add_button': 'افزودن',
+        'delete_button': 'حذف انتخاب‌شده',
+        'search_placeholder': 'جستجو در توضیحات...',
+        'search_all_categories': 'همه دسته‌بندی‌ها',
+        'search_all_types': 'همه انواع',
+        'search_date_from': 'از تاریخ (YYYY-MM-DD)',
+        'search_date_to': 'تا تاریخ (YYYY-MM-DD)',
+        'search_amount_min': 'حداقل مقدار',
+        'search_amount_max': 'حداکثر مقدار',
+        'search_clear': 'پاک کردن جستجو',
+        'search_results': '{count} تراکنش مطابق ({ms:.1f} میلی‌ثانیه)',
+        'report_label': 'گزارش:',
+        'report_categories': 'هزینه‌ها بر اساس دسته‌بندی',
+        'report_daily': 'روزانه (۳۰ روز اخیر)',
+        'report_weekly': 'هفتگی (۱۲ هفته اخیر)',
+        'report_monthly': 'مجموع ماهانه (امسال)',
+        'report_yoy': 'مقایسه هزینه‌ها با سال قبل',
+        'report_trailing': '۱۲ ماه اخیر',
+        'axis_categories': 'دسته‌بندی‌ها',
+        'axis_period': 'دوره',
+        'axis_amount': 'مقدار',
+        'save_failed': 'ذخیره تراکنش‌ها ممکن نشد: {error}',
+        'repeat_label': 'تکرار:',
+        'repeat_never': 'هرگز',
+        'repeat_daily': 'روزانه',
+        'repeat_weekly': 'هفتگی',
+        'repeat_monthly': 'ماهانه',
+        'repeat_custom': 'زمان‌بندی سفارشی',
+        'schedule_placeholder': 'روز ماه، ماه، روز هفته (مثلاً "1,15 * *")',
+        'invalid_schedule': 'لطفاً یک زمان‌بندی معتبر وارد کنید.',
+        'recurring_label': 'تراکنش‌های تکراری:',
+        'recurring_remove': 'حذف قانون انتخاب‌شده',
+        'status_recurring': '{count} تراکنش تکراری در {time} ثبت شد',
+        'categories_label': 'دسته‌بندی‌ها و بودجه‌ها:',
+        'category_name_placeholder': 'نام دسته‌بندی جدید',
+        'add_category': 'افزودن دسته‌بندی',
+        'remove_category': 'حذف دسته‌بندی',
+        'budget_limit_placeholder': 'سقف بودجه (خالی برای بدون سقف)',
+        'budget_period_week': 'در هفته',
+        'budget_period_month': 'در ماه',
+        'budget_period_year': 'در سال',
+        'set_budget': 'تنظیم بودجه',
+        'budgets_title': 'بودجه‌ها:',
+        'budget_entry': '{category}: {spent} / {limit} {period}',
+        'budget_over': 'فراتر از بودجه: {category} {spent} / {limit} {period}',
+        'ledger_label': 'دفتر حساب:',
+        'new_ledger': 'دفتر جدید...',
+        'new_ledger_prompt': 'نام دفتر حساب جدید:',
+        'consolidated_label': 'همه حساب‌ها ({count} دفتر): {balance}',
+        'edit_menu': 'ویرایش',
+        'undo_action': 'واگرد',
+        'redo_action': 'ازنو',
+        'status_undone': 'واگرد شد: {added} بازگردانده، {deleted} حذف شد در {time}',
+        'status_redone': 'ازنو انجام شد: {added} بازگردانده، {deleted} حذف شد در {time}',
+        'status_not_undoable': 'این تغییر بزرگ‌تر از آن است که قابل واگرد باشد؛ تاریخچه واگرد پاک شد.',
+        'diagnostics_label': 'عیب‌یابی:',
+        'diagnostics_enable': 'ثبت زمان‌بندی کارایی',
+        'diagnostics_reset': 'بازنشانی',
+        'diagnostics_export': 'صدور داده‌های عیب‌یابی',
+        'diagnostics_exported': 'داده‌های عیب‌یابی در {path} ذخیره شد',
+        'diagnostics_metric': 'معیار',
+        'diagnostics_calls': 'تعداد',
+        'diagnostics_p50': 'p50',
+        'diagnostics_p95': 'p95',
+        'diagnostics_max': 'بیشینه',
+        'diagnostics_total': 'مجموع'
+    }
+
+def _chinese_texts():
+    return {
+        'title': '预算管理器',
+        'add_transaction': '添加交易',
+        'amount_label': '金额：',
+        'category_label': '类别：',
+        'type_label': '类型：',
+        'date_label': '日期：',
+        'description_label': '描述：',
+        'income': '收入',
+        'expense': '支出',
+        'overview_tab': '概览',
+        'transactions_tab': '交易',
+        'settings_tab': '设置',
+        'clear_transactions': '清除交易',
+        'save_transactions': '将交易保存到文件',
+        'status_idle': '正在管理您的预算...',
+        'status_added': '交易已添加：{amount} 在 {time}',
+        'status_cleared': '所有交易已清除 在 {time}',
+        'status_loading': '正在加载交易... {percent}%',
+        'status_loaded': '已加载 {count} 笔交易 在 {time}',
+        'load_failed': '无法加载交易：{error}',
+        'import_statement': '导入账单...',
+        'status_importing': '正在导入账单... {percent}%',
+        'status_imported': '已导入 {added} 笔交易（跳过 {skipped} 笔重复、{invalid} 行无效）在 {time}',
+        'import_failed': '无法导入账单：{error}',
+        'import_mapping': '账单列',
+        'map_debit': '借方',
+        'map_credit': '贷方',
+        'map_none': '（文件中没有）',
+        'date_format': '日期格式',
+        'date_format_detect': '从文件中检测',
+        'balance_label': '当前余额：',
+        'income_label': '总收入：',
+        'expense_label': '总 هزینه：',
+        'table_date': '日期',
+        'table_type': '类型',
+        'table_category': '类别',
+        'table_amount': '金额',
+        'table_description': '描述',
+        'theme_label': '主题：',
+        'language_label': '语言：',
+        'apply': '应用',
+        'file_menu': '文件',
+        'exit_action': '退出',
+        'about': '关于',
+        'about_text': '预算管理器\n版本 1.0\n由 Hamid Yarali 开发\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
+        'overview_title': '财务概览',
+        'add_button': '添加',
+        'delete_button': '删除所选',
+        'search_placeholder': '搜索描述...',
+        'search_all_categories': '所有类别',
+        'search_all_types': '所有类型',
+        'search_date_from': '起始日期 (YYYY-MM-DD)',
+        'search_date_to': '结束日期 (YYYY-MM-DD)',
+        'search_amount_min': '最小金额',
+        'search_amount_max': '最大金额',
+        'search_clear': '清除搜索',
+        'search_results': '{count} 条匹配交易（{ms:.1f} 毫秒）',
+        'report_label': '报告：',
+        'report_categories': '按类别的支出',
+        'report_daily': '每日（最近30天）',
+        'report_weekly': '每周（最近12周）',
+        'report_monthly': '月度总计（今年）',
+        'report_yoy': '支出同比',
+        'report_trailing': '最近12个月',
+        'axis_categories': '类别',
+        'axis_period': '期间',
+        'axis_amount': '金额',
+        'save_failed': '无法保存交易：{error}',
+        'repeat_label': '重复：',
+        'repeat_never': '从不',
+        'repeat_daily': '每天',
+        'repeat_weekly': '每周',
+        'repeat_monthly': '每月',
+        'repeat_custom': '自定义计划',
+        'schedule_placeholder': '月中日期、月份、星期（例如 "1,15 * *"）',
+        'invalid_schedule': '请输入有效的计划。',
+        'recurring_label': '定期交易：',
+        'recurring_remove': '删除选中的规则',
+        'status_recurring': '已于 {time} 记入 {count} 笔定期交易',
+        'categories_label': '类别和预算：',
+        'category_name_placeholder': '新类别名称',
+        'add_category': '添加类别',
+        'remove_category': '删除类别',
+        'budget_limit_placeholder': '预算上限（留空表示无）',
+        'budget_period_week': '每周',
+        'budget_period_month': '每月',
+        'budget_period_year': '每年',
+        'set_budget': '设置预算',
+        'budgets_title': '预算：',
+        'budget_entry': '{category}：{spent} / {limit} {period}',
+        'budget_over': '超出预算：{category} {spent} / {limit} {period}',
+        'ledger_label': '账本：',
+        'new_ledger': '新建账本...',
+        'new_ledger_prompt': '新账本名称：',
+        'consolidated_label': '所有账户（{count} 个账本）：{balance}',
+        'edit_menu': '编辑',
+        'undo_action': '撤销',
+        'redo_action': '重做',
+        'status_undone': '已撤销：恢复 {added} 条，移除 {deleted} 条 在 {time}',
+        'status_redone': '已重做：恢复 {added} 条，移除 {deleted} 条 在 {time}',
+        'status_not_undoable': '此更改过大，无法撤销；撤销历史已清空。',
+        'diagnostics_label': '诊断：',
+        'diagnostics_enable': '记录性能耗时',
+        'diagnostics_reset': '重置',
+        'diagnostics_export': '导出诊断数据',
+        'diagnostics_exported': '诊断数据已导出到 {path}',
+        'diagnostics_metric': '指标',
+        'diagnostics_calls': '次数',
+        'diagnostics_p50': 'p50',
+        'diagnostics_p95': 'p95',
+        'diagnostics_max': '最大',
+        'diagnostics_total': '总计'
+    }
+
+def _russian_texts():
+    return {
+        'title': 'Менеджер бюджета',
+        'add_transaction': 'Добавить транзакцию',
+        'amount_label': 'Сумма:',
+        'category_label': 'Категория:',
+        'type_label': 'Тип:',
+        'date_label': 'Дата:',
+        'description_label': 'Описание:',
+        'income': 'Доход',
+        'expense': 'Расход',
+        'overview_tab': 'Обзор',
+        'transactions_tab': 'Транзакции',
+        'settings_tab': 'Настройки',
+        'clear_transactions': 'Очистить транзакции',
+        'save_transactions': 'Сохранить транзакции в файл',
+        'status_idle': 'Управление вашим бюджетом...',
+        'status_added': 'Транзакция добавлена: {amount} в {time}',
+        'status_cleared': 'Все транзакции очищены в {time}',
+        'status_loading': 'Загрузка транзакций... {percent}%',
+        'status_loaded': 'Загружено транзакций: {count} в {time}',
+        'load_failed': 'Не удалось загрузить транзакции: {error}',
+        'import_statement': 'Импорт выписки...',
+        'status_importing': 'Импорт выписки... {percent}%',
+        'status_imported': 'Импортировано транзакций: {added} (пропущено дубликатов: {skipped}, неверных строк: {invalid}) в {time}',
+        'import_failed': 'Не удалось импортировать выписку: {error}',
+        'import_mapping': 'Столбцы выписки',
+        'map_debit': 'Списание',
+        'map_credit': 'Зачисление',
+        'map_none': '(нет в файле)',
+        'date_format': 'Формат даты',
+        'date_format_detect': 'Определить по файлу',
+        'balance_label': 'Текущий баланс:',
+        'income_label': 'Общий доход:',
+        'expense_label': 'Общие расходы:',
+        'table_date': 'Дата',
+        'table_type': 'Тип',
+        'table_category': 'Категория',
+        'table_amount': 'Сумма',
+        'table_description': 'Описание',
+        'theme_label': 'Тема:',
+        'language_label': 'Язык:',
+        'apply': 'Применить',
+        'file_menu': 'Файл',
+        'exit_action': 'Выход',
+        'about': 'О программе',
+        'about_text': 'Менеджер бюджета\nВерсия 1.0\nРазработано Hamid Yarali\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
+        'overview_title': 'Финансовый обзор',
+        'add_button': 'Добавить',
+        'delete_button': 'Удалить выбранное',
+        'search_placeholder': 'Поиск по описанию...',
+        'search_all_categories': 'Все категории',
+        'search_all_types': 'Все типы',
+        'search_date_from': 'С даты (ГГГГ-ММ-ДД)',
+        'search_date_to': 'По дату (ГГГГ-ММ-ДД)',
+        'search_amount_min': 'Мин. сумма',
+        'search_amount_max': 'Макс. сумма',
+        'search_clear': 'Сбросить поиск',
+        'search_results': 'Найдено транзакций: {count} ({ms:.1f} мс)',
+        'report_label': 'Отчёт:',
+        'report_categories': 'Расходы по категориям',
+        'report_daily': 'По дням (последние 30 дней)',
+        'report_weekly': 'По неделям (последние 12 недель)',
+        'report_monthly': 'Итоги по месяцам (этот год)',
+        'report_yoy': 'Расходы год к году',
+        'report_trailing': 'Последние 12 месяцев',
+        'axis_categories': 'Категории',
+        'axis_period': 'Период',
+        'axis_amount': 'Сумма',
+        'save_failed': 'Не удалось сохранить транзакции: {error}',
+        'repeat_label': 'Повтор:',
+        'repeat_never': 'Никогда',
+        'repeat_daily': 'Ежедневно',
+        'repeat_weekly': 'Еженедельно',
+        'repeat_monthly': 'Ежемесячно',
+        'repeat_custom': 'Своё расписание',
+        'schedule_placeholder': 'День месяца, месяц, день недели (напр. "1,15 * *")',
+        'invalid_schedule': 'Введите корректное расписание.',
+        'recurring_label': 'Повторяющиеся операции:',
+        'recurring_remove': 'Удалить выбранное правило',
+        'status_recurring': 'Проведено повторяющихся операций: {count} в {time}',
+        'categories_label': 'Категории и бюджеты:',
+        'category_name_placeholder': 'Название новой категории',
+        'add_category': 'Добавить категорию',
+        'remove_category': 'Удалить категорию',
+        'budget_limit_placeholder': 'Лимит бюджета (пусто — без лимита)',
+        'budget_period_week': 'в неделю',
+        'budget_period_month': 'в месяц',
+        'budget_period_year': 'в год',
+        'set_budget': 'Задать бюджет',
+        'budgets_title': 'Бюджеты:',
+        'budget_entry': '{category}: {spent} / {limit} {period}',
+        'budget_over': 'Бюджет превышен: {category} {spent} / {limit} {period}',
+        'ledger_label': 'Книга:',
+        'new_ledger': 'Новая книга...',
+        'new_ledger_prompt': 'Название новой книги:',
+        'consolidated_label': 'Все счета (книг: {count}): {balance}',
+        'edit_menu': 'Правка',
+        'undo_action': 'Отменить',
+        'redo_action': 'Повторить',
+        'status_undone': 'Отменено: восстановлено {added}, удалено {deleted} в {time}',
+        'status_redone': 'Повторено: восстановлено {added}, удалено {deleted} в {time}',
+        'status_not_undoable': 'Это изменение слишком велико для отмены; история отмены очищена.',
+        'diagnostics_label': 'Диагностика:',
+        'diagnostics_enable': 'Записывать время выполнения',
+        'diagnostics_reset': 'Сбросить',
+        'diagnostics_export': 'Экспорт диагностики',
+        'diagnostics_exported': 'Диагностика сохранена в {path}',
+        'diagnostics_metric': 'Метрика',
+        'diagnostics_calls': 'Вызовы',
+        'diagnostics_p50': 'p50',
+        'diagnostics_p95': 'p95',
+        'diagnostics_max': 'Макс.',
+        'diagnostics_total': 'Всего'
+    }
+
+TEXT_BUILDERS = {
+    'en': _english_texts,
+    'fa': _persian_texts,
+    'zh': _chinese_texts,
+    'ru': _russian_texts,
+}
+
+class LazyTexts(dict):
+    # Language tables are built the first time a language is used instead of
+    # all four at startup.
+    def __missing__(self, lang):
+        table = self[lang] = TEXT_BUILDERS[lang]()
+        return table
+
+class DisplayFormats:
+    # Amounts and dates as each language writes them: Persian digits and
+    # decimal separator for fa, a decimal comma for ru; dates as Y/M/D in
+    # Persian digits, Y年M月D日 and D.M.Y. A ledger has few distinct dates,
+    # so those are memoized per language.
+    DIGITS = {
+        'fa': str.maketrans('0123456789.', '۰۱۲۳۴۵۶۷۸۹٫'),
+        'ru': str.maketrans('.', ','),
+    }
 
-class BudgetManagerApp(QMainWindow):
     def __init__(self):
+        self._dates = {}
+
+    def amount(self, lang, amount):
+        text = f'{amount:.2f}'
+        digits = self.DIGITS.get(lang)
+        return text if digits is None else text.translate(digits)
+
+    def date(self, lang, day):
+        dates = self._dates.get(lang)
+        if dates is None:
+            dates = self._dates[lang] = {}
+        text = dates.get(day)
+        if text is None:
+            text = dates[day] = self._format_date(lang, day)
+        return text
+
+    def _format_date(self, lang, day):
+        year, month, dom = day[:4], day[5:7], day[8:]
+        if lang == 'en' or len(day) != 10 or not (year + month + dom).isdigit():
+            return day
+        if lang == 'fa':
+            return f'{year}/{month}/{dom}'.translate(self.DIGITS['fa'])
+        if lang == 'zh':
+            return f'{int(year)}年{int(month)}月{int(dom)}日'
+        return f'{dom}.{month}.{year}'
+
+class BudgetManagerApp(QMainWindow):
+    REPORTS = ('categories', 'daily', 'weekly', 'monthly', 'yoy', 'trailing')
+    REPEATS = ('never', 'daily', 'weekly', 'monthly', 'custom')
+    RECURRING_INTERVAL_MS = 60 * 60 * 1000
+    persist_failed = pyqtSignal(str)
+    persist_written = pyqtSignal(int, float)
+    persist_task_written = pyqtSignal(str, int, float)
+    DIAGNOSTICS_INTERVAL_MS = 1000
+    # Applied to the whole window; only widgets with the "themed" property
+    # match. Placeholders are the color roles of a theme.
+    THEME_STYLESHEET = """
+        QTextEdit[themed="true"] {{
+            border-radius: 8px;
+            font-size: 14px;
+            border: 1px solid {border};
+            background: {background};
+            color: {text};
+        }}
+        QLineEdit[themed="true"], QDateEdit[themed="true"], QComboBox[themed="true"] {{
+            border-radius: 8px;
+            padding: 8px;
+            font-size: 14px;
+            border: 1px solid {border};
+            background: {background};
+            color: {text};
+        }}
+        QComboBox[themed="true"]::drop-down {{
+            border: none;
+        }}
+        QPushButton[themed="true"] {{
+            border-radius: 8px;
+            font-size: 14px;
+            border: 1px solid {border};
+            background: {button};
+            color: {button_text};
+        }}
+        QTableView[themed="true"] {{
+            border-radius: 8px;
+            font-size: 14px;
+            border: 1px solid {border};
+            background: {background};
+            color: {text};
+        }}
+        QTableView[themed="true"] QHeaderView::section {{
+            background: {header};
+            padding: 5px;
+            font-size: 14px;
+            border: 1px solid {border};
+            color: {text};
+        }}
+    """
+    DIAGNOSTICS_COLUMNS = ('diagnostics_metric', 'diagnostics_calls', 'diagnostics_p50', 'diagnostics_p95',
+                           'diagnostics_max', 'diagnostics_total')
+
+    def __init__(self, storage='json', profiler=None, instrument=False):
         super().__init__()
+        self.profiler = profiler
+        self.instrumentation = Instrumentation(enabled=instrument)
+        self.load_started = None
         self.setWindowTitle("Budget Manager")
         self.setGeometry(100, 100, 1200, 800)
         self.setWindowIcon(QIcon('icon.ico'))
 
         self.current_lang = 'en'
         self.current_theme = 'Windows11'
-        self.transactions = []
-        self.categories = ['Food', 'Transportation', 'Utilities', 'Entertainment', 'Other']
-        self.load_transactions()
+        self.texts_lang = None
+        self.applied_theme = None
+        self._compiled_themes = {}
+        self._styles = {}
+        self.budgets = CategoryBudgets()
+        self.budgets.load()
+        self.categories = self.budgets.categories
+        self.storage = storage
+        self.ledgers = LedgerCatalog()
+        self.ledgers.load()
+        self.repository = open_repository(storage, self.ledgers.base_name(self.ledgers.active))
+        self.repository.writer.on_error = self.persist_failed.emit
+        self.repository.writer.on_batch = self.persist_written.emit
+        self.repository.writer.on_task = self.persist_task_written.emit
+        self.persist_failed.connect(self.on_persist_failed)
+        self.persist_written.connect(self.on_persist_written)
+        self.persist_task_written.connect(self.on_persist_task_written)
+        self.aggregates = AggregateCache()
+        self.loader_thread = None
+        self.import_thread = None
+        self.ledger_loaded = False
+        self.search_query = None
+        self.search_result = None
+        self.undo_log = UndoLog()
+        self.ledger_busy = False
+        self.imported_rows = None
+        self.sort_key = None
+        self.recurring = RecurringRules()
+        self.recurring.load()
+        self.profile_mark('repository')
 
-        self.texts = {
-            'en': {
-                'title': 'Budget Manager',
-                'add_transaction': 'Add Transaction',
-                'amount_label': 'Amount:',
-                'category_label': 'Category:',
-                'type_label': 'Type:',
-                'date_label': 'Date:',
-                'description_label': 'Description:',
-                'income': 'Income',
-                'expense': 'Expense',
-                'overview_tab': 'Overview',
-                'transactions_tab': 'Transactions',
-                'settings_tab': 'Settings',
-                'clear_transactions': 'Clear Transactions',
-                'save_transactions': 'Save Transactions to File',
-                'status_idle': 'Managing your budget...',
-                'status_added': 'Transaction added: {amount} at {time}',
-                'status_cleared': 'All transactions cleared at {time}',
-                'balance_label': 'Current Balance:',
-                'income_label': 'Total Income:',
-                'expense_label': 'Total Expenses:',
-                'table_date': 'Date',
-                'table_type': 'Type',
-                'table_category': 'Category',
-                'table_amount': 'Amount',
-                'table_description': 'Description',
-                'theme_label': 'Theme:',
-                'language_label': 'Language:',
-                'apply': 'Apply',
-                'file_menu': 'File',
-                'exit_action': 'Exit',
-                'about': 'About',
-                'about_text': 'Budget Manager\nVersion 1.0\nDeveloped by Hamid Yarali\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
-                'overview_title': 'Financial Overview',
-                'add_button': 'Add',
-                'delete_button': 'Delete Selected'
-            },
-            'fa': {
-                'title': 'مدیریت بودجه',
-                'add_transaction': 'افزودن تراکنش',
-                'amount_label': 'مقدار:',
-                'category_label': 'دسته‌بندی:',
-                'type_label': 'نوع:',
-                'date_label': 'تاریخ:',
-                'description_label': 'توضیحات:',
-                'income': 'درآمد',
-                'expense': 'هزینه',
-                'overview_tab': 'نمای کلی',
-                'transactions_tab': 'تراکنش‌ها',
-                'settings_tab': 'تنظیمات',
-                'clear_transactions': 'پاک کردن تراکنش‌ها',
-                'save_transactions': 'ذخیره تراکنش‌ها در فایل',
-                'status_idle': 'مدیریت بودجه شما...',
-                'status_added': 'تراکنش اضافه شد: {amount} در {time}',
-                'status_cleared': 'همه تراکنش‌ها پاک شدند در {time}',
-                'balance_label': 'تراز کنونی:',
-                'income_label': 'کل درآمدها:',
-                'expense_label': 'کل هزینه‌ها:',
-                'table_date': 'تاریخ',
-                'table_type': 'نوع',
-                'table_category': 'دسته‌بندی',
-                'table_amount': 'مقدار',
-                'table_description': 'توضیحات',
-                'theme_label': 'تم:',
-                'language_label': 'زبان:',
-                'apply': 'اعمال',
-                'file_menu': 'فایل',
-                'exit_action': 'خروج',
-                'about': 'درباره',
-                'about_text': 'مدیریت بودجه\nنسخه ۱.۰\nتوسعه‌یافته توسط حمید یارعلی\nگیت‌هاب: https://github.com/HamidYaraliOfficial\nاینستاگرام: https://www.instagram.com/hamidyaraliofficial\nتلگرام: @Hamid_Yarali',
-                'overview_title': 'نمای کلی مالی',
-                'add_button': 'افزودن',
-                'delete_button': 'حذف انتخاب‌شده'
-            },
-            'zh': {
-                'title': '预算管理器',
-                'add_transaction': '添加交易',
-                'amount_label': '金额：',
-                'category_label': '类别：',
-                'type_label': '类型：',
-                'date_label': '日期：',
-                'description_label': '描述：',
-                'income': '收入',
-                'expense': '支出',
-                'overview_tab': '概览',
-                'transactions_tab': '交易',
-                'settings_tab': '设置',
-                'clear_transactions': '清除交易',
-                'save_transactions': '将交易保存到文件',
-                'status_idle': '正在管理您的预算...',
-                'status_added': '交易已添加：{amount} 在 {time}',
-                'status_cleared': '所有交易已清除 在 {time}',
-                'balance_label': '当前余额：',
-                'income_label': '总收入：',
-                'expense_label': '总 هزینه：',
-                'table_date': '日期',
-                'table_type': '类型',
-                'table_category': '类别',
-                'table_amount': '金额',
-                'table_description': '描述',
-                'theme_label': '主题：',
-                'language_label': '语言：',
-                'apply': '应用',
-                'file_menu': '文件',
-                'exit_action': '退出',
-                'about': '关于',
-                'about_text': '预算管理器\n版本 1.0\n由 Hamid Yarali 开发\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
-                'overview_title': '财务概览',
-                'add_button': '添加',
-                'delete_button': '删除所选'
-            },
-            'ru': {
-                'title': 'Менеджер бюджета',
-                'add_transaction': 'Добавить транзакцию',
-                'amount_label': 'Сумма:',
-                'category_label': 'Категория:',
-                'type_label': 'Тип:',
-                'date_label': 'Дата:',
-                'description_label': 'Описание:',
-                'income': 'Доход',
-                'expense': 'Расход',
-                'overview_tab': 'Обзор',
-                'transactions_tab': 'Транзакции',
-                'settings_tab': 'Настройки',
-                'clear_transactions': 'Очистить транзакции',
-                'save_transactions': 'Сохранить транзакции в файл',
-                'status_idle': 'Управление вашим бюджетом...',
-                'status_added': 'Транзакция добавлена: {amount} в {time}',
-                'status_cleared': 'Все транзакции очищены в {time}',
-                'balance_label': 'Текущий баланс:',
-                'income_label': 'Общий доход:',
-                'expense_label': 'Общие расходы:',
-                'table_date': 'Дата',
-                'table_type': 'Тип',
-                'table_category': 'Категория',
-                'table_amount': 'Сумма',
-                'table_description': 'Описание',
-                'theme_label': 'Тема:',
-                'language_label': 'Язык:',
-                'apply': 'Применить',
-                'file_menu': 'Файл',
-                'exit_action': 'Выход',
-                'about': 'О программе',
-                'about_text': 'Менеджер бюджета\nВерсия 1.0\nРазработано Hamid Yarali\nGitHub: https://github.com/HamidYaraliOfficial\nInstagram: https://www.instagram.com/hamidyaraliofficial\nTelegram: @Hamid_Yarali',
-                'overview_title': 'Финансовый обзор',
-                'add_button': 'Добавить',
-                'delete_button': 'Удалить выбранное'
-            }
-        }
+        self.texts = LazyTexts()
+        self.formats = DisplayFormats()
 
         self.themes = {
             'Windows11': {
@@ -261,8 +1143,16 @@ class BudgetManagerApp(QMainWindow):
         }
 
         self.init_ui()
+        self.profile_mark('ui')
         self.apply_theme(self.current_theme)
+        self.profile_mark('theme')
         self.update_texts()
+        self.profile_mark('texts')
+        self.load_transactions()
+
+    def profile_mark(self, phase):
+        if self.profiler is not None:
+            self.profiler.mark(phase)
 
     def init_ui(self):
         self.central_widget = QWidget()
@@ -273,13 +1163,44 @@ class BudgetManagerApp(QMainWindow):
 
         self.menu_bar = QMenuBar()
         self.file_menu = QMenu(self.texts['en']['file_menu'])
+        self.import_action = self.file_menu.addAction(self.texts['en']['import_statement'])
+        self.import_action.triggered.connect(self.import_statement)
         self.exit_action = self.file_menu.addAction(self.texts['en']['exit_action'])
         self.exit_action.triggered.connect(self.close)
         self.about_action = self.file_menu.addAction(self.texts['en']['about'])
         self.about_action.triggered.connect(self.show_about)
         self.menu_bar.addMenu(self.file_menu)
+        self.edit_menu = QMenu(self.texts['en']['edit_menu'])
+        self.undo_action = self.edit_menu.addAction(self.texts['en']['undo_action'])
+        self.undo_action.setShortcut(QKeySequence('Ctrl+Z'))
+        self.undo_action.triggered.connect(self.undo_edit)
+        self.redo_action = self.edit_menu.addAction(self.texts['en']['redo_action'])
+        self.redo_action.setShortcuts([QKeySequence('Ctrl+Y'), QKeySequence('Ctrl+Shift+Z')])
+        self.redo_action.triggered.connect(self.redo_edit)
+        # Also on the window, so the shortcuts work without the menu bar.
+        self.addAction(self.undo_action)
+        self.addAction(self.redo_action)
+        self.menu_bar.addMenu(self.edit_menu)
+        self.update_undo_actions()
         self.main_layout.addWidget(self.menu_bar)
 
+        self.ledger_label = QLabel()
+        self.ledger_label.setFont(QFont("Segoe UI", 12))
+        self.ledger_combo = QComboBox()
+        self.ledger_combo.addItems(self.ledgers.names())
+        self.ledger_combo.setCurrentText(self.ledgers.active)
+        self.ledger_combo.setFixedHeight(40)
+        self.ledger_combo.currentTextChanged.connect(self.switch_ledger)
+        self.new_ledger_btn = QPushButton()
+        self.new_ledger_btn.setFixedHeight(40)
+        self.new_ledger_btn.setFont(QFont("Segoe UI", 12))
+        self.new_ledger_btn.clicked.connect(self.new_ledger)
+        self.ledger_layout = QHBoxLayout()
+        self.ledger_layout.addWidget(self.ledger_label)
+        self.ledger_layout.addWidget(self.ledger_combo, 1)
+        self.ledger_layout.addWidget(self.new_ledger_btn)
+        self.main_layout.addLayout(self.ledger_layout)
+
         self.tabs = QTabWidget()
         self.tabs.setStyleSheet("""
             QTabWidget::pane {
@@ -314,22 +1235,28 @@ class BudgetManagerApp(QMainWindow):
         self.income_label.setFont(QFont("Segoe UI", 12))
         self.expense_label = QLabel()
         self.expense_label.setFont(QFont("Segoe UI", 12))
-        self.graph = GraphWidget()
+        self.consolidated_label = QLabel()
+        self.consolidated_label.setFont(QFont("Segoe UI", 12))
+        self.budget_label = QLabel()
+        self.budget_label.setFont(QFont("Segoe UI", 12))
+        self.budget_label.setTextFormat(Qt.TextFormat.RichText)
+        self.report_label = QLabel()
+        self.report_label.setFont(QFont("Segoe UI", 12))
+        self.report_combo = QComboBox()
+        self.report_combo.addItems([self.texts['en']['report_' + report] for report in self.REPORTS])
+        self.report_combo.setFixedHeight(40)
+        self.report_combo.currentIndexChanged.connect(lambda: self.refresh.mark_dirty('overview'))
+        self.graph = GraphWidget(instrumentation=self.instrumentation)
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
         self.status_text.setFixedHeight(100)
-        self.status_text.setStyleSheet("""
-            QTextEdit {
-                border-radius: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-        """)
         self.overview_layout.addWidget(self.balance_label)
         self.overview_layout.addWidget(self.income_label)
         self.overview_layout.addWidget(self.expense_label)
+        self.overview_layout.addWidget(self.consolidated_label)
+        self.overview_layout.addWidget(self.budget_label)
+        self.overview_layout.addWidget(self.report_label)
+        self.overview_layout.addWidget(self.report_combo)
         self.overview_layout.addWidget(self.graph)
         self.overview_layout.addWidget(self.status_text)
 
@@ -346,74 +1273,33 @@ class BudgetManagerApp(QMainWindow):
         self.amount_label.setFont(QFont("Segoe UI", 12))
         self.amount_input = QLineEdit()
         self.amount_input.setFixedHeight(40)
-        self.amount_input.setStyleSheet("""
-            QLineEdit {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-        """)
         self.category_label = QLabel()
         self.category_label.setFont(QFont("Segoe UI", 12))
         self.category_combo = QComboBox()
         self.category_combo.addItems(self.categories)
         self.category_combo.setFixedHeight(40)
-        self.category_combo.setStyleSheet("""
-            QComboBox {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-            QComboBox::drop-down {
-                border: none;
-            }
-        """)
         self.type_label = QLabel()
         self.type_label.setFont(QFont("Segoe UI", 12))
         self.type_combo = QComboBox()
         self.type_combo.addItems([self.texts['en']['income'], self.texts['en']['expense']])
         self.type_combo.setFixedHeight(40)
-        self.type_combo.setStyleSheet("""
-            QComboBox {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-            QComboBox::drop-down {
-                border: none;
-            }
-        """)
         self.date_label = QLabel()
         self.date_label.setFont(QFont("Segoe UI", 12))
         self.date_input = QDateEdit()
         self.date_input.setCalendarPopup(True)
         self.date_input.setDate(QDate.currentDate())
         self.date_input.setFixedHeight(40)
-        self.date_input.setStyleSheet("""
-            QDateEdit {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-        """)
         self.description_label = QLabel()
         self.description_label.setFont(QFont("Segoe UI", 12))
         self.description_input = QLineEdit()
         self.description_input.setFixedHeight(40)
-        self.description_input.setStyleSheet("""
-            QLineEdit {
+        self.repeat_label = QLabel()
+        self.repeat_label.setFont(QFont("Segoe UI", 12))
+        self.repeat_combo = QComboBox()
+        self.repeat_combo.addItems([self.texts['en']['repeat_' + repeat] for repeat in self.REPEATS])
+        self.repeat_combo.setFixedHeight(40)
+        self.repeat_combo.setStyleSheet("""
+            QComboBox {
                 border-radius: 8px;
                 padding: 8px;
                 font-size: 14px;
@@ -421,7 +1307,15 @@ class BudgetManagerApp(QMainWindow):
                 background: rgba(255, 255, 255, 0.95);
                 color: black;
             }
+            QComboBox::drop-down {
+                border: none;
+            }
         """)
+        self.schedule_input = QLineEdit()
+        self.schedule_input.setFixedHeight(40)
+        self.schedule_input.setEnabled(False)
+        self.repeat_combo.currentIndexChanged.connect(
+            lambda index: self.schedule_input.setEnabled(self.REPEATS[index] == 'custom'))
         self.add_button = QPushButton()
         self.add_button.setFixedHeight(40)
         self.add_button.setFont(QFont("Segoe UI", 12))
@@ -449,35 +1343,59 @@ class BudgetManagerApp(QMainWindow):
         self.add_transaction_layout.addWidget(self.date_input, 3, 1)
         self.add_transaction_layout.addWidget(self.description_label, 4, 0)
         self.add_transaction_layout.addWidget(self.description_input, 4, 1)
-        self.add_transaction_layout.addWidget(self.add_button, 5, 0, 1, 2)
-
-        self.transactions_table = QTableWidget()
-        self.transactions_table.setColumnCount(5)
-        self.transactions_table.setHorizontalHeaderLabels([
-            self.texts['en']['table_date'],
-            self.texts['en']['table_type'],
-            self.texts['en']['table_category'],
-            self.texts['en']['table_amount'],
-            self.texts['en']['table_description']
-        ])
-        self.transactions_table.setStyleSheet("""
-            QTableWidget {
-                border-radius: 8px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.2);
-                background: rgba(255, 255, 255, 0.95);
-                color: black;
-            }
-            QHeaderView::section {
-                background: rgba(0, 90, 158, 0.1);
-                padding: 5px;
-                font-size: 14px;
-                border: 1px solid rgba(0, 0, 0, 0.1);
-                color: black;
-            }
-        """)
+        self.add_transaction_layout.addWidget(self.repeat_label, 5, 0)
+        self.add_transaction_layout.addWidget(self.repeat_combo, 5, 1)
+        self.add_transaction_layout.addWidget(self.schedule_input, 6, 1)
+        self.add_transaction_layout.addWidget(self.add_button, 7, 0, 1, 2)
+
+        self.search_widget = QWidget()
+        self.search_layout = QGridLayout(self.search_widget)
+        self.search_layout.setSpacing(10)
+        self.search_input = QLineEdit()
+        self.search_date_from = QLineEdit()
+        self.search_date_to = QLineEdit()
+        self.search_amount_min = QLineEdit()
+        self.search_amount_max = QLineEdit()
+        self.search_line_edits = (self.search_input, self.search_date_from, self.search_date_to,
+                                  self.search_amount_min, self.search_amount_max)
+        for line_edit in self.search_line_edits:
+            line_edit.setFixedHeight(40)
+            line_edit.textChanged.connect(self.on_search_changed)
+        self.search_category_combo = QComboBox()
+        self.search_category_combo.addItems([self.texts['en']['search_all_categories']] + self.categories)
+        self.search_type_combo = QComboBox()
+        self.search_type_combo.addItems([self.texts['en']['search_all_types'], self.texts['en']['income'], self.texts['en']['expense']])
+        for combo in (self.search_category_combo, self.search_type_combo):
+            combo.setFixedHeight(40)
+            combo.currentIndexChanged.connect(self.on_search_changed)
+        self.search_clear_btn = QPushButton()
+        self.search_clear_btn.setFixedHeight(40)
+        self.search_clear_btn.setFont(QFont("Segoe UI", 12))
+        self.search_clear_btn.clicked.connect(self.clear_search)
+        self.search_status_label = QLabel()
+        self.search_status_label.setFont(QFont("Segoe UI", 10))
+
+        self.search_layout.addWidget(self.search_input, 0, 0, 1, 3)
+        self.search_layout.addWidget(self.search_category_combo, 0, 3)
+        self.search_layout.addWidget(self.search_type_combo, 0, 4)
+        self.search_layout.addWidget(self.search_date_from, 1, 0)
+        self.search_layout.addWidget(self.search_date_to, 1, 1)
+        self.search_layout.addWidget(self.search_amount_min, 1, 2)
+        self.search_layout.addWidget(self.search_amount_max, 1, 3)
+        self.search_layout.addWidget(self.search_clear_btn, 1, 4)
+        self.search_layout.addWidget(self.search_status_label, 2, 0, 1, 5)
+
+        self.transactions_model = TransactionTableModel(self.repository, self.texts, self.formats, self.current_lang)
+        self.transactions_table = QTableView()
+        self.transactions_table.setModel(self.transactions_model)
         self.transactions_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.transactions_table.setSelectionMode(QTableWidget.SelectionMode.MultiSelection)
+        self.transactions_table.setSelectionMode(QTableView.SelectionMode.MultiSelection)
+        # Sorting is done by the search index, not by the view, so only the
+        # header's indicator is used.
+        self.transactions_table.horizontalHeader().setSectionsClickable(True)
+        self.transactions_table.horizontalHeader().setSortIndicatorShown(True)
+        self.transactions_table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.transactions_table.horizontalHeader().sortIndicatorChanged.connect(self.on_sort_changed)
 
         self.delete_button = QPushButton()
         self.delete_button.setFixedHeight(40)
@@ -531,6 +1449,7 @@ class BudgetManagerApp(QMainWindow):
         self.save_transactions_btn.clicked.connect(self.save_transactions_to_file)
 
         self.transactions_layout.addWidget(self.add_transaction_widget)
+        self.transactions_layout.addWidget(self.search_widget)
         self.transactions_layout.addWidget(self.transactions_table)
         self.transactions_layout.addWidget(self.delete_button)
         self.transactions_layout.addWidget(self.clear_transactions_btn)
@@ -602,123 +1521,200 @@ class BudgetManagerApp(QMainWindow):
         self.settings_layout.addWidget(self.language_combo)
         self.settings_layout.addWidget(self.theme_label)
         self.settings_layout.addWidget(self.theme_combo)
+        self.recurring_label = QLabel()
+        self.recurring_label.setFont(QFont("Segoe UI", 12))
+        self.recurring_list = QListWidget()
+        self.recurring_list.setMaximumHeight(160)
+        self.recurring_remove_btn = QPushButton()
+        self.recurring_remove_btn.setFixedHeight(40)
+        self.recurring_remove_btn.setFont(QFont("Segoe UI", 12))
+        self.recurring_remove_btn.clicked.connect(self.remove_recurring_rule)
+        self.update_recurring_list()
+
+        self.categories_label = QLabel()
+        self.categories_label.setFont(QFont("Segoe UI", 12))
+        self.categories_list = QListWidget()
+        self.categories_list.setMaximumHeight(160)
+        self.category_name_input = QLineEdit()
+        self.category_name_input.setFixedHeight(40)
+        self.add_category_btn = QPushButton()
+        self.add_category_btn.setFixedHeight(40)
+        self.add_category_btn.clicked.connect(self.add_category)
+        self.remove_category_btn = QPushButton()
+        self.remove_category_btn.setFixedHeight(40)
+        self.remove_category_btn.clicked.connect(self.remove_category)
+        self.budget_limit_input = QLineEdit()
+        self.budget_limit_input.setFixedHeight(40)
+        self.budget_period_combo = QComboBox()
+        self.budget_period_combo.addItems([self.texts['en']['budget_period_' + period] for period in CategoryBudgets.PERIODS])
+        self.budget_period_combo.setCurrentIndex(CategoryBudgets.PERIODS.index('month'))
+        self.budget_period_combo.setFixedHeight(40)
+        self.set_budget_btn = QPushButton()
+        self.set_budget_btn.setFixedHeight(40)
+        self.set_budget_btn.clicked.connect(self.set_budget)
+        self.categories_widget = QWidget()
+        self.categories_layout = QGridLayout(self.categories_widget)
+        self.categories_layout.setContentsMargins(0, 0, 0, 0)
+        self.categories_layout.addWidget(self.category_name_input, 0, 0)
+        self.categories_layout.addWidget(self.add_category_btn, 0, 1)
+        self.categories_layout.addWidget(self.remove_category_btn, 0, 2)
+        self.categories_layout.addWidget(self.budget_limit_input, 1, 0)
+        self.categories_layout.addWidget(self.budget_period_combo, 1, 1)
+        self.categories_layout.addWidget(self.set_budget_btn, 1, 2)
+        for button in (self.add_category_btn, self.remove_category_btn, self.set_budget_btn):
+            button.setFont(QFont("Segoe UI", 12))
+
+        self.diagnostics_label = QLabel()
+        self.diagnostics_label.setFont(QFont("Segoe UI", 12))
+        self.diagnostics_check = QCheckBox()
+        self.diagnostics_check.setFont(QFont("Segoe UI", 12))
+        self.diagnostics_table = QTableWidget(0, len(self.DIAGNOSTICS_COLUMNS))
+        self.diagnostics_table.setMaximumHeight(220)
+        self.diagnostics_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.diagnostics_table.verticalHeader().setVisible(False)
+        self.diagnostics_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.diagnostics_reset_btn = QPushButton()
+        self.diagnostics_reset_btn.setFixedHeight(40)
+        self.diagnostics_reset_btn.clicked.connect(self.reset_diagnostics)
+        self.diagnostics_export_btn = QPushButton()
+        self.diagnostics_export_btn.setFixedHeight(40)
+        self.diagnostics_export_btn.clicked.connect(self.export_diagnostics)
+        self.diagnostics_buttons = QWidget()
+        self.diagnostics_buttons_layout = QHBoxLayout(self.diagnostics_buttons)
+        self.diagnostics_buttons_layout.setContentsMargins(0, 0, 0, 0)
+        self.diagnostics_buttons_layout.addWidget(self.diagnostics_reset_btn)
+        self.diagnostics_buttons_layout.addWidget(self.diagnostics_export_btn)
+        for button in (self.diagnostics_reset_btn, self.diagnostics_export_btn):
+            button.setFont(QFont("Segoe UI", 12))
+
         self.settings_layout.addWidget(self.apply_btn)
+        self.settings_layout.addWidget(self.recurring_label)
+        self.settings_layout.addWidget(self.recurring_list)
+        self.settings_layout.addWidget(self.recurring_remove_btn)
+        self.settings_layout.addWidget(self.categories_label)
+        self.settings_layout.addWidget(self.categories_list)
+        self.settings_layout.addWidget(self.categories_widget)
+        self.settings_layout.addWidget(self.diagnostics_label)
+        self.settings_layout.addWidget(self.diagnostics_check)
+        self.settings_layout.addWidget(self.diagnostics_table)
+        self.settings_layout.addWidget(self.diagnostics_buttons)
         self.settings_layout.addStretch()
 
         self.tabs.addTab(self.overview_tab, self.texts['en']['overview_tab'])
         self.tabs.addTab(self.transactions_tab, self.texts['en']['transactions_tab'])
         self.tabs.addTab(self.settings_tab, self.texts['en']['settings_tab'])
 
-        self.update_transactions_table()
-        self.update_overview()
+        self.refresh = RefreshScheduler(self.tabs, self)
+        self.refresh.register('table', self.transactions_tab, self.update_transactions_table)
+        self.refresh.register('overview', self.overview_tab, self.update_overview, min_interval=0.1)
+        self.refresh.register('diagnostics', self.settings_tab, self.update_diagnostics)
+        self.refresh.mark_dirty('table', 'overview')
+
+        self.recurring_timer = QTimer(self)
+        self.recurring_timer.setInterval(self.RECURRING_INTERVAL_MS)
+        self.recurring_timer.timeout.connect(self.post_recurring)
+
+        # While recording, the panel is re-rendered periodically, and only
+        # when the Settings tab is showing.
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(self.DIAGNOSTICS_INTERVAL_MS)
+        self.diagnostics_timer.timeout.connect(lambda: self.refresh.mark_dirty('diagnostics'))
+        self.diagnostics_check.toggled.connect(self.toggle_diagnostics)
+        self.diagnostics_check.setChecked(self.instrumentation.enabled)
+        if self.instrumentation.enabled:
+            self.diagnostics_timer.start()
 
+        for widget in ([self.status_text, self.amount_input, self.description_input, self.date_input,
+                        self.category_combo, self.type_combo, self.search_category_combo, self.search_type_combo,
+                        self.report_combo, self.search_clear_btn, self.transactions_table]
+                       + list(self.search_line_edits)):
+            widget.setProperty('themed', True)
+
+    def compiled_theme(self, theme_name):
+        # (palette, style, stylesheet) of a theme, built the first time it is
+        # used. QStyle objects are shared between themes that use the same one.
+        compiled = self._compiled_themes.get(theme_name)
+        if compiled is None:
+            theme = self.themes[theme_name]
+            palette = QPalette()
+            palette.setColor(QPalette.ColorRole.Window, theme['background'])
+            palette.setColor(QPalette.ColorRole.WindowText, theme['text'])
+            palette.setColor(QPalette.ColorRole.Button, theme['button'])
+            palette.setColor(QPalette.ColorRole.ButtonText, theme['button_text'])
+            palette.setColor(QPalette.ColorRole.Highlight, theme['accent'])
+            palette.setColor(QPalette.ColorRole.Base, theme['background'])
+            palette.setColor(QPalette.ColorRole.AlternateBase, theme['header'])
+            palette.setColor(QPalette.ColorRole.Text, theme['text'])
+            style_name = 'WindowsVista' if theme_name == 'Windows11' else 'Fusion'
+            if style_name not in self._styles:
+                self._styles[style_name] = QStyleFactory.create(style_name)
+            stylesheet = self.THEME_STYLESHEET.format(**{role: color.name() for role, color in theme.items()})
+            compiled = self._compiled_themes[theme_name] = (palette, self._styles[style_name], stylesheet)
+        return compiled
+
+    @instrumented('apply_theme')
     def apply_theme(self, theme_name):
-        palette = QPalette()
-        theme = self.themes.get(theme_name, self.themes['Windows11'])
-        palette.setColor(QPalette.ColorRole.Window, theme['background'])
-        palette.setColor(QPalette.ColorRole.WindowText, theme['text'])
-        palette.setColor(QPalette.ColorRole.Button, theme['button'])
-        palette.setColor(QPalette.ColorRole.ButtonText, theme['button_text'])
-        palette.setColor(QPalette.ColorRole.Highlight, theme['accent'])
-        palette.setColor(QPalette.ColorRole.Base, theme['background'])
-        palette.setColor(QPalette.ColorRole.AlternateBase, theme['header'])
-        palette.setColor(QPalette.ColorRole.Text, theme['text'])
+        # One palette, style and stylesheet swap on the window; the themed
+        # widgets pick it up through their "themed" property, and no view or
+        # chart is refreshed.
+        if theme_name not in self.themes:
+            theme_name = 'Windows11'
+        if theme_name == self.applied_theme:
+            return
+        palette, style, stylesheet = self.compiled_theme(theme_name)
         self.setPalette(palette)
-        self.setStyle(QStyleFactory.create('WindowsVista' if theme_name == 'Windows11' else 'Fusion'))
-        self.status_text.setStyleSheet(f"""
-            QTextEdit {{
-                border-radius: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-        """)
-        self.amount_input.setStyleSheet(f"""
-            QLineEdit {{
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-        """)
-        self.description_input.setStyleSheet(f"""
-            QLineEdit {{
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-        """)
-        self.category_combo.setStyleSheet(f"""
-            QComboBox {{
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-            }}
-        """)
-        self.type_combo.setStyleSheet(f"""
-            QComboBox {{
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-            }}
-        """)
-        self.date_input.setStyleSheet(f"""
-            QDateEdit {{
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-        """)
-        self.transactions_table.setStyleSheet(f"""
-            QTableWidget {{
-                border-radius: 8px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                background: {theme['background'].name()};
-                color: {theme['text'].name()};
-            }}
-            QHeaderView::section {{
-                background: {theme['header'].name()};
-                padding: 5px;
-                font-size: 14px;
-                border: 1px solid {theme['border'].name()};
-                color: {theme['text'].name()};
-            }}
-        """)
+        self.setStyle(style)
+        self.setStyleSheet(stylesheet)
+        self.applied_theme = theme_name
 
     def update_texts(self):
         lang = self.current_lang
+        self.texts_lang = lang
         self.setWindowTitle(self.texts[lang]['title'])
         self.amount_label.setText(self.texts[lang]['amount_label'])
         self.category_label.setText(self.texts[lang]['category_label'])
         self.type_label.setText(self.texts[lang]['type_label'])
         self.date_label.setText(self.texts[lang]['date_label'])
         self.description_label.setText(self.texts[lang]['description_label'])
+        self.repeat_label.setText(self.texts[lang]['repeat_label'])
+        for i, repeat in enumerate(self.REPEATS):
+            self.repeat_combo.setItemText(i, self.texts[lang]['repeat_' + repeat])
+        self.schedule_input.setPlaceholderText(self.texts[lang]['schedule_placeholder'])
+        self.recurring_label.setText(self.texts[lang]['recurring_label'])
+        self.ledger_label.setText(self.texts[lang]['ledger_label'])
+        self.new_ledger_btn.setText(self.texts[lang]['new_ledger'])
+        self.recurring_remove_btn.setText(self.texts[lang]['recurring_remove'])
+        self.categories_label.setText(self.texts[lang]['categories_label'])
+        self.category_name_input.setPlaceholderText(self.texts[lang]['category_name_placeholder'])
+        self.add_category_btn.setText(self.texts[lang]['add_category'])
+        self.remove_category_btn.setText(self.texts[lang]['remove_category'])
+        self.budget_limit_input.setPlaceholderText(self.texts[lang]['budget_limit_placeholder'])
+        for i, period in enumerate(CategoryBudgets.PERIODS):
+            self.budget_period_combo.setItemText(i, self.texts[lang]['budget_period_' + period])
+        self.set_budget_btn.setText(self.texts[lang]['set_budget'])
+        self.update_categories_list()
+        self.diagnostics_label.setText(self.texts[lang]['diagnostics_label'])
+        self.diagnostics_check.setText(self.texts[lang]['diagnostics_enable'])
+        self.diagnostics_reset_btn.setText(self.texts[lang]['diagnostics_reset'])
+        self.diagnostics_export_btn.setText(self.texts[lang]['diagnostics_export'])
+        self.diagnostics_table.setHorizontalHeaderLabels([self.texts[lang][key] for key in self.DIAGNOSTICS_COLUMNS])
         self.add_button.setText(self.texts[lang]['add_button'])
         self.delete_button.setText(self.texts[lang]['delete_button'])
         self.clear_transactions_btn.setText(self.texts[lang]['clear_transactions'])
         self.save_transactions_btn.setText(self.texts[lang]['save_transactions'])
+        self.search_input.setPlaceholderText(self.texts[lang]['search_placeholder'])
+        self.search_date_from.setPlaceholderText(self.texts[lang]['search_date_from'])
+        self.search_date_to.setPlaceholderText(self.texts[lang]['search_date_to'])
+        self.search_amount_min.setPlaceholderText(self.texts[lang]['search_amount_min'])
+        self.search_amount_max.setPlaceholderText(self.texts[lang]['search_amount_max'])
+        self.search_category_combo.setItemText(0, self.texts[lang]['search_all_categories'])
+        self.search_type_combo.setItemText(0, self.texts[lang]['search_all_types'])
+        self.search_type_combo.setItemText(1, self.texts[lang]['income'])
+        self.search_type_combo.setItemText(2, self.texts[lang]['expense'])
+        self.search_clear_btn.setText(self.texts[lang]['search_clear'])
+        self.report_label.setText(self.texts[lang]['report_label'])
+        for i, report in enumerate(self.REPORTS):
+            self.report_combo.setItemText(i, self.texts[lang]['report_' + report])
         self.balance_label.setText(self.texts[lang]['balance_label'])
         self.income_label.setText(self.texts[lang]['income_label'])
         self.expense_label.setText(self.texts[lang]['expense_label'])
@@ -726,21 +1722,19 @@ class BudgetManagerApp(QMainWindow):
         self.language_label.setText(self.texts[lang]['language_label'])
         self.apply_btn.setText(self.texts[lang]['apply'])
         self.file_menu.setTitle(self.texts[lang]['file_menu'])
+        self.import_action.setText(self.texts[lang]['import_statement'])
         self.exit_action.setText(self.texts[lang]['exit_action'])
         self.about_action.setText(self.texts[lang]['about'])
+        self.edit_menu.setTitle(self.texts[lang]['edit_menu'])
+        self.undo_action.setText(self.texts[lang]['undo_action'])
+        self.redo_action.setText(self.texts[lang]['redo_action'])
         self.status_text.setText(self.texts[lang]['status_idle'])
 
         self.tabs.setTabText(0, self.texts[lang]['overview_tab'])
         self.tabs.setTabText(1, self.texts[lang]['transactions_tab'])
         self.tabs.setTabText(2, self.texts[lang]['settings_tab'])
 
-        self.transactions_table.setHorizontalHeaderLabels([
-            self.texts[lang]['table_date'],
-            self.texts[lang]['table_type'],
-            self.texts[lang]['table_category'],
-            self.texts[lang]['table_amount'],
-            self.texts[lang]['table_description']
-        ])
+        self.transactions_model.set_language(lang)
 
         alignment = Qt.AlignmentFlag.AlignRight if lang == 'fa' else Qt.AlignmentFlag.AlignLeft
         self.amount_label.setAlignment(alignment)
@@ -748,15 +1742,26 @@ class BudgetManagerApp(QMainWindow):
         self.type_label.setAlignment(alignment)
         self.date_label.setAlignment(alignment)
         self.description_label.setAlignment(alignment)
+        self.repeat_label.setAlignment(alignment)
+        self.recurring_label.setAlignment(alignment)
+        self.categories_label.setAlignment(alignment)
+        self.diagnostics_label.setAlignment(alignment)
+        self.consolidated_label.setAlignment(alignment)
+        self.budget_label.setAlignment(alignment)
         self.balance_label.setAlignment(alignment)
         self.income_label.setAlignment(alignment)
         self.expense_label.setAlignment(alignment)
+        self.report_label.setAlignment(alignment)
         self.theme_label.setAlignment(alignment)
         self.language_label.setAlignment(alignment)
         self.status_text.setAlignment(alignment)
+        self.search_status_label.setAlignment(alignment)
+        for line_edit in self.search_line_edits:
+            line_edit.setAlignment(alignment)
+        self.update_search_status()
 
-        self.update_transactions_table()
-        self.update_overview()
+        # The table re-renders only its visible rows through set_language().
+        self.refresh.mark_dirty('overview')
 
     def change_language(self, index):
         langs = ['en', 'fa', 'zh', 'ru']
@@ -771,14 +1776,38 @@ class BudgetManagerApp(QMainWindow):
         self.apply_theme(self.current_theme)
 
     def apply_settings(self):
-        self.update_texts()
+        # Both combos take effect as they change; this only catches up on
+        # whatever hasn't been applied yet.
+        if self.texts_lang != self.current_lang:
+            self.update_texts()
         self.apply_theme(self.current_theme)
 
     def show_about(self):
         QMessageBox.information(self, self.texts[self.current_lang]['about'], 
                                self.texts[self.current_lang]['about_text'])
 
+    def repeat_schedule(self, date):
+        # The schedule spec picked in the repeat combo for a rule starting on
+        # date, or None if the custom schedule doesn't parse.
+        repeat = self.REPEATS[self.repeat_combo.currentIndex()]
+        if repeat == 'daily':
+            return 'daily'
+        if repeat == 'weekly':
+            return f'weekly:{date.dayOfWeek() % 7}'
+        if repeat == 'monthly':
+            return f'monthly:{date.day()}'
+        try:
+            return RecurringSchedule(self.schedule_input.text()).spec
+        except ValueError:
+            return None
+
     def add_transaction(self):
+        schedule = None
+        if self.REPEATS[self.repeat_combo.currentIndex()] != 'never':
+            schedule = self.repeat_schedule(self.date_input.date())
+            if schedule is None:
+                QMessageBox.warning(self, "Invalid Input", self.texts[self.current_lang]['invalid_schedule'])
+                return
         try:
             amount = float(self.amount_input.text())
             category = self.category_combo.currentText()
@@ -799,79 +1828,565 @@ class BudgetManagerApp(QMainWindow):
                 'description': description,
                 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
-            self.transactions.append(transaction)
-            self.save_transactions()
-            self.update_transactions_table()
-            self.update_overview()
+            self.repository.add(transaction)
+            self.aggregates.add(transaction)
+            self.record_edit('add', [transaction])
+            self.refresh.mark_dirty('table', 'overview')
             self.status_text.setText(self.texts[self.current_lang]['status_added'].format(
                 amount=amount, time=transaction['timestamp']))
+            self.alert_over_budget([category])
+            if schedule is not None:
+                self.recurring.add(transaction, schedule, date, self.ledgers.active)
+                self.recurring.save(self.repository.writer)
+                self.update_recurring_list()
+                self.post_recurring()
             self.clear_inputs()
         except ValueError:
             QMessageBox.warning(self, "Invalid Input", "Please enter a valid amount.")
 
+    def post_recurring(self):
+        # Posts every due occurrence, including ones missed while the app was
+        # closed, as one batch: one journal write and one refresh.
+        if not self.ledger_loaded:
+            return
+        transactions = self.recurring.due(datetime.now().date(), self.ledgers.active)
+        if not transactions:
+            return
+        self.repository.add_many(transactions)
+        for transaction in transactions:
+            self.aggregates.add(transaction)
+        self.record_edit('add', transactions)
+        self.recurring.save(self.repository.writer)
+        self.refresh.mark_dirty('table', 'overview')
+        self.status_text.setText(self.texts[self.current_lang]['status_recurring'].format(
+            count=len(transactions), time=transactions[0]['timestamp']))
+        self.alert_over_budget({transaction['category'] for transaction in transactions})
+
+    def budget_lines(self, categories, over_only=False):
+        # One rollup lookup per category with a limit.
+        texts = self.texts[self.current_lang]
+        today = datetime.now().date()
+        lines = []
+        for category in categories:
+            status = self.budgets.status(self.aggregates, category, today)
+            if status is None or (over_only and status[0] <= status[1]):
+                continue
+            spent, limit, period = status
+            lines.append((spent > limit, texts['budget_over' if spent > limit else 'budget_entry'].format(
+                category=category, spent=self.formats.amount(self.current_lang, spent),
+                limit=self.formats.amount(self.current_lang, limit), period=texts['budget_period_' + period])))
+        return lines
+
+    def alert_over_budget(self, categories):
+        lines = self.budget_lines(categories, over_only=True)
+        if lines:
+            self.status_text.append('\n'.join(line for _, line in lines))
+
+    def update_categories_list(self):
+        texts = self.texts[self.current_lang]
+        self.categories_list.clear()
+        for category in self.categories:
+            limit = self.budgets.limits.get(category)
+            label = category if limit is None else \
+                f"{category}: {self.formats.amount(self.current_lang, limit['amount'])} {texts['budget_period_' + limit['period']]}"
+            item = QListWidgetItem(label)
+            item.setData(Qt.ItemDataRole.UserRole, category)
+            self.categories_list.addItem(item)
+
+    def on_categories_changed(self):
+        for combo, first in ((self.category_combo, 0), (self.search_category_combo, 1)):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            while combo.count() > first:
+                combo.removeItem(first)
+            combo.addItems(self.categories)
+            combo.setCurrentIndex(max(combo.findText(current), 0))
+            combo.blockSignals(False)
+        self.budgets.save(self.repository.writer)
+        self.update_categories_list()
+        self.refresh.mark_dirty('overview')
+
+    def selected_category(self):
+        item = self.categories_list.currentItem()
+        return None if item is None else item.data(Qt.ItemDataRole.UserRole)
+
+    def add_category(self):
+        if self.budgets.add_category(self.category_name_input.text()):
+            self.category_name_input.clear()
+            self.on_categories_changed()
+
+    def remove_category(self):
+        category = self.selected_category()
+        if category is not None and self.budgets.remove_category(category):
+            self.on_categories_changed()
+
+    def set_budget(self):
+        category = self.selected_category()
+        if category is None:
+            return
+        text = self.budget_limit_input.text().strip()
+        try:
+            amount = float(text) if text else None
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Please enter a valid amount.")
+            return
+        self.budgets.set_limit(category, amount, CategoryBudgets.PERIODS[self.budget_period_combo.currentIndex()])
+        self.budget_limit_input.clear()
+        self.on_categories_changed()
+        self.alert_over_budget([category])
+
+    def update_recurring_list(self):
+        self.recurring_list.clear()
+        for rule in self.recurring.rules:
+            item = QListWidgetItem(f"{rule['description'] or rule['category']}: {rule['amount']:.2f} ({rule['schedule']})"
+                                   + ('' if len(self.ledgers.ledgers) < 2 else f" [{rule.get('ledger', LedgerCatalog.DEFAULT_LEDGER)}]"))
+            item.setData(Qt.ItemDataRole.UserRole, rule['id'])
+            self.recurring_list.addItem(item)
+
+    def remove_recurring_rule(self):
+        for item in self.recurring_list.selectedItems():
+            self.recurring.remove(item.data(Qt.ItemDataRole.UserRole))
+        self.recurring.save(self.repository.writer)
+        self.update_recurring_list()
+
     def delete_selected_transactions(self):
-        selected_rows = sorted(set(index.row() for index in self.transactions_table.selectedIndexes()), reverse=True)
-        for row in selected_rows:
-            if 0 <= row < len(self.transactions):
-                self.transactions.pop(row)
-        self.save_transactions()
-        self.update_transactions_table()
-        self.update_overview()
+        selected_rows = set(index.row() for index in self.transactions_table.selectionModel().selectedIndexes())
+        deleted = self.repository.delete_ids(self.transactions_model.ids_for_rows(selected_rows))
+        for transaction in deleted:
+            self.aggregates.remove(transaction)
+        self.refresh.mark_dirty('table', 'overview')
         self.status_text.setText(self.texts[self.current_lang]['status_cleared'].format(
             time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.record_edit('delete', deleted)
 
     def clear_transactions(self):
-        self.transactions = []
-        self.save_transactions()
-        self.update_transactions_table()
-        self.update_overview()
+        # The cleared ledger is kept for undo as a columnar copy, if it fits
+        # in the undo budget.
+        cleared = None
+        if self.undo_log.cost('clear', self.repository.count()) <= self.undo_log.budget:
+            cleared = self.repository.snapshot()
+        self.repository.clear()
+        self.aggregates.clear()
+        self.refresh.mark_dirty('table', 'overview')
         self.status_text.setText(self.texts[self.current_lang]['status_cleared'].format(
             time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        if cleared is None:
+            self.discard_undo_history()
+        else:
+            self.record_edit('clear', cleared)
+
+    def record_edit(self, kind, rows):
+        if not self.undo_log.record(kind, rows):
+            self.status_text.append(self.texts[self.current_lang]['status_not_undoable'])
+        self.update_undo_actions()
+
+    def discard_undo_history(self):
+        # For edits too large to keep; older commands don't apply past them.
+        self.undo_log.clear()
+        self.status_text.append(self.texts[self.current_lang]['status_not_undoable'])
+        self.update_undo_actions()
+
+    def update_undo_actions(self):
+        self.undo_action.setEnabled(not self.ledger_busy and self.undo_log.can_undo())
+        self.redo_action.setEnabled(not self.ledger_busy and self.undo_log.can_redo())
+
+    def undo_edit(self):
+        self.apply_undo(self.undo_log.undo, 'status_undone')
+
+    def redo_edit(self):
+        self.apply_undo(self.undo_log.redo, 'status_redone')
 
-    def save_transactions(self):
-        with open('budget_transactions.json', 'w', encoding='utf-8') as f:
-            json.dump(self.transactions, f, ensure_ascii=False, indent=4)
+    def apply_undo(self, step, status_key):
+        # Same path as the edit itself: repository, aggregates, then a
+        # refresh of the views.
+        if self.ledger_busy:
+            return
+        changes = step(self.repository, self.aggregates)
+        self.update_undo_actions()
+        if changes is None:
+            return
+        added, deleted = changes
+        self.refresh.mark_dirty('table', 'overview')
+        self.status_text.setText(self.texts[self.current_lang][status_key].format(
+            added=added, deleted=deleted, time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        if added:
+            self.alert_over_budget(self.budgets.limits)
 
+    @instrumented('load_transactions')
     def load_transactions(self):
-        try:
-            with open('budget_transactions.json', 'r', encoding='utf-8') as f:
-                self.transactions = json.load(f)
-        except FileNotFoundError:
-            self.transactions = []
+        # Only starts the loader; the time until the ledger is in is recorded
+        # as ledger_load.
+        self.load_started = time.perf_counter()
+        self.repository.begin_load()
+        self.aggregates.clear()
+        self.update_transactions_table()
+        self.set_ledger_busy(True)
+        self.loader_thread = QThread(self)
+        self.loader = BatchLoader(self.repository)
+        self.loader.moveToThread(self.loader_thread)
+        self.loader_thread.started.connect(self.loader.run)
+        self.loader.batch_loaded.connect(self.on_ledger_batch)
+        self.loader.finished.connect(self.on_ledger_loaded)
+        self.loader.failed.connect(self.on_ledger_load_failed)
+        self.loader.finished.connect(self.loader_thread.quit)
+        self.loader.failed.connect(self.loader_thread.quit)
+        self.loader_thread.start()
+
+    def new_ledger(self):
+        name, ok = QInputDialog.getText(self, self.texts[self.current_lang]['new_ledger'],
+                                        self.texts[self.current_lang]['new_ledger_prompt'])
+        if ok and self.ledgers.add(name):
+            self.ledger_combo.addItem(name.strip())
+            self.ledger_combo.setCurrentText(name.strip())
+
+    def switch_ledger(self, name):
+        # Closes the active ledger (its totals are kept in the catalog) and
+        # loads the chosen one; nothing of the other ledgers is opened.
+        if not name or name == self.ledgers.active or name not in self.ledgers.ledgers:
+            return
+        if self.ledger_loaded:
+            self.ledgers.update_summary(self.ledgers.active, self.aggregates, self.repository.count())
+        self.ledgers.active = name
+        self.ledgers.save(self.repository.writer)
+        self.repository.flush()
+        self.repository.close()
+        self.repository = open_repository(self.storage, self.ledgers.base_name(name))
+        self.repository.writer.on_error = self.persist_failed.emit
+        self.repository.writer.on_batch = self.persist_written.emit
+        self.repository.writer.on_task = self.persist_task_written.emit
+        self.transactions_model.repository = self.repository
+        self.ledger_loaded = False
+        self.undo_log.clear()
+        self.load_transactions()
+
+    def on_ledger_batch(self, op, payload, done, total):
+        if op == 'groups':
+            for group in payload:
+                self.aggregates.add_group(*group)
+        else:
+            added, deleted = self.repository.apply_loaded(op, payload)
+            for transaction in added:
+                self.aggregates.add(transaction)
+            for transaction in deleted:
+                self.aggregates.remove(transaction)
+        self.sync_table()
+        self.refresh.mark_dirty('overview')
+        percent = 100 * done // total if total else 100
+        self.status_text.setText(self.texts[self.current_lang]['status_loading'].format(percent=percent))
+
+    def on_ledger_loaded(self):
+        self.ledger_loaded = True
+        self.profile_mark('ledger_loaded')
+        if self.instrumentation.enabled:
+            self.instrumentation.record('ledger_load', (time.perf_counter() - self.load_started) * 1000.0)
+        self.set_ledger_busy(False)
+        self.refresh.mark_dirty('overview')
+        self.status_text.setText(self.texts[self.current_lang]['status_loaded'].format(
+            count=self.repository.count(), time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.ledgers.update_summary(self.ledgers.active, self.aggregates, self.repository.count())
+        self.ledgers.save(self.repository.writer)
+        self.post_recurring()
+        self.recurring_timer.start()
+
+    def on_ledger_load_failed(self, error):
+        # Editing stays disabled: a compaction of a partially loaded ledger
+        # would overwrite the snapshot on disk.
+        message = self.texts[self.current_lang]['load_failed'].format(error=error)
+        self.status_text.setText(message)
+        if self.profiler is not None:
+            self.profiler.mark('ledger_load_failed')
+            self.profiler.finish()
+            return
+        QMessageBox.warning(self, self.texts[self.current_lang]['title'], message)
+
+    def on_persist_failed(self, error):
+        self.status_text.setText(self.texts[self.current_lang]['save_failed'].format(error=error))
+
+    def on_persist_written(self, written, seconds):
+        # One PersistenceWriter batch: every write queued since the last one.
+        if self.instrumentation.enabled:
+            self.instrumentation.record('persist', seconds * 1000.0)
+            self.instrumentation.record('persist.bytes', written, 'bytes')
+
+    def on_persist_task_written(self, label, written, seconds):
+        # One write as timed on the writer thread: journal appends,
+        # compactions, SQLite batches, settings files and exports.
+        if self.instrumentation.enabled:
+            self.instrumentation.record(f'persist.{label}', seconds * 1000.0)
+            self.instrumentation.record(f'persist.{label}.bytes', written, 'bytes')
+
+    def set_ledger_busy(self, busy):
+        self.ledger_busy = busy
+        self.update_undo_actions()
+        for button in (self.add_button, self.delete_button, self.clear_transactions_btn, self.save_transactions_btn,
+                       self.ledger_combo, self.new_ledger_btn):
+            button.setEnabled(not busy)
+        self.import_action.setEnabled(not busy)
+
+    def import_statement(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, self.texts[self.current_lang]['import_statement'], "",
+            "Bank Statements (*.csv *.ofx *.qfx);;CSV Files (*.csv);;OFX Files (*.ofx *.qfx)")
+        if not file_path:
+            return
+        column_map = date_format = None
+        reader = StatementReader(file_path, self.categories)
+        if reader.is_csv():
+            try:
+                header = reader.read_header()
+            except (OSError, ValueError) as e:
+                message = self.texts[self.current_lang]['import_failed'].format(error=e)
+                self.status_text.setText(message)
+                QMessageBox.warning(self, self.texts[self.current_lang]['title'], message)
+                return
+            dialog = ColumnMappingDialog(header, reader.guess_columns(header), self.texts[self.current_lang], self)
+            if dialog.exec() != QDialog.DialogCode.Accepted:
+                return
+            column_map, date_format = dialog.column_map(), dialog.date_format()
+        self.start_import(file_path, column_map, date_format)
+
+    def start_import(self, file_path, column_map=None, date_format=None):
+        self.statement_reader = StatementReader(file_path, self.categories, column_map, date_format)
+        self.duplicate_filter = DuplicateFilter(self.repository)
+        self.imported_count = 0
+        self.imported_rows = []
+        self.set_ledger_busy(True)
+        self.import_thread = QThread(self)
+        self.importer = BatchLoader(self.statement_reader)
+        self.importer.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.importer.run)
+        self.importer.batch_loaded.connect(self.on_import_batch)
+        self.importer.finished.connect(self.on_import_finished)
+        self.importer.failed.connect(self.on_import_failed)
+        self.importer.finished.connect(self.import_thread.quit)
+        self.importer.failed.connect(self.import_thread.quit)
+        self.import_thread.start()
+
+    def on_import_batch(self, op, batch, done, total):
+        # One persist, one aggregate pass and one view refresh per batch.
+        fresh = self.duplicate_filter.filter(batch)
+        if fresh:
+            self.repository.add_many(fresh)
+            for transaction in fresh:
+                self.aggregates.add(transaction)
+            self.imported_count += len(fresh)
+            if self.imported_rows is not None:
+                self.imported_rows.extend(fresh)
+                if self.undo_log.cost('add', len(self.imported_rows)) > self.undo_log.budget:
+                    self.imported_rows = None
+            self.sync_table()
+            self.refresh.mark_dirty('overview')
+        percent = 100 * done // total if total else 100
+        self.status_text.setText(self.texts[self.current_lang]['status_importing'].format(percent=percent))
+
+    def record_import(self):
+        # A whole import is undone as one edit.
+        if self.imported_rows is None:
+            self.discard_undo_history()
+        else:
+            self.record_edit('add', self.imported_rows)
+        self.imported_rows = None
+
+    def on_import_finished(self):
+        self.set_ledger_busy(False)
+        self.status_text.setText(self.texts[self.current_lang]['status_imported'].format(
+            added=self.imported_count, skipped=self.duplicate_filter.skipped,
+            invalid=self.statement_reader.invalid, time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.record_import()
+        self.alert_over_budget(self.budgets.limits)
+
+    def on_import_failed(self, error):
+        self.set_ledger_busy(False)
+        self.record_import()
+        message = self.texts[self.current_lang]['import_failed'].format(error=error)
+        self.status_text.setText(message)
+        QMessageBox.warning(self, self.texts[self.current_lang]['title'], message)
 
     def save_transactions_to_file(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, self.texts[self.current_lang]['save_transactions'], "", "JSON Files (*.json)")
+        file_path, _ = QFileDialog.getSaveFileName(self, self.texts[self.current_lang]['save_transactions'], "",
+                                                   "JSON Files (*.json);;Budget Snapshots (*.bin)")
         if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.transactions, f, ensure_ascii=False, indent=4)
+            self.repository.export(file_path)
             self.status_text.setText(self.texts[self.current_lang]['status_added'].format(
                 amount="Transactions", time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
 
+    def on_search_changed(self):
+        query = {}
+        text = self.search_input.text().strip()
+        if text:
+            query['text'] = text
+        if self.search_category_combo.currentIndex() > 0:
+            query['category'] = self.search_category_combo.currentText()
+        if self.search_type_combo.currentIndex() > 0:
+            query['type_key'] = TRANSACTION_TYPES[self.search_type_combo.currentIndex() - 1]
+        date_range = (self.search_bound(self.search_date_from, self.parse_search_date),
+                      self.search_bound(self.search_date_to, self.parse_search_date))
+        if date_range != (None, None):
+            query['date_range'] = date_range
+        amount_range = (self.search_bound(self.search_amount_min, float),
+                        self.search_bound(self.search_amount_max, float))
+        if amount_range != (None, None):
+            query['amount_range'] = amount_range
+        self.search_query = query or None
+        self.refresh.mark_dirty('table')
+
+    def search_bound(self, line_edit, parse):
+        # Incomplete or invalid bounds are ignored until they parse.
+        text = line_edit.text().strip()
+        if not text:
+            return None
+        try:
+            return parse(text)
+        except ValueError:
+            return None
+
+    def parse_search_date(self, text):
+        return str(np.datetime64(text, 'D'))
+
+    def clear_search(self):
+        for widget in self.search_line_edits + (self.search_category_combo, self.search_type_combo):
+            widget.blockSignals(True)
+        for line_edit in self.search_line_edits:
+            line_edit.clear()
+        self.search_category_combo.setCurrentIndex(0)
+        self.search_type_combo.setCurrentIndex(0)
+        for widget in self.search_line_edits + (self.search_category_combo, self.search_type_combo):
+            widget.blockSignals(False)
+        self.on_search_changed()
+
+    def on_sort_changed(self, section, order):
+        column = self.transactions_model.COLUMNS[section] if 0 <= section < len(self.transactions_model.COLUMNS) else None
+        if column not in self.transactions_model.SORTABLE:
+            header = self.transactions_table.horizontalHeader()
+            header.blockSignals(True)
+            if self.sort_key is None:
+                header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+            else:
+                header.setSortIndicator(self.transactions_model.COLUMNS.index(self.sort_key[0]),
+                                        Qt.SortOrder.DescendingOrder if self.sort_key[1] else Qt.SortOrder.AscendingOrder)
+            header.blockSignals(False)
+            return
+        self.sort_key = (column, order == Qt.SortOrder.DescendingOrder)
+        self.update_transactions_table()
+
+    def sync_table(self):
+        # A filtered or sorted view is re-queried instead of growing in place.
+        if self.search_query is None and self.sort_key is None:
+            self.transactions_model.sync_count()
+        else:
+            self.refresh.mark_dirty('table')
+
+    @instrumented('update_transactions_table')
     def update_transactions_table(self):
-        self.transactions_table.setRowCount(len(self.transactions))
-        for row, transaction in enumerate(self.transactions):
-            self.transactions_table.setItem(row, 0, QTableWidgetItem(transaction['date']))
-            type_text = self.texts[self.current_lang]['income'] if transaction['type'] == 'income' else self.texts[self.current_lang]['expense']
-            self.transactions_table.setItem(row, 1, QTableWidgetItem(type_text))
-            self.transactions_table.setItem(row, 2, QTableWidgetItem(transaction['category']))
-            self.transactions_table.setItem(row, 3, QTableWidgetItem(f"{transaction['amount']:.2f}"))
-            self.transactions_table.setItem(row, 4, QTableWidgetItem(transaction['description']))
-            for col in range(5):
-                self.transactions_table.item(row, col).setTextAlignment(
-                    Qt.AlignmentFlag.AlignRight if self.current_lang == 'fa' else Qt.AlignmentFlag.AlignLeft)
+        if self.instrumentation.enabled:
+            # Rows are materialized as the view paints, after a refresh
+            # returns, so this is what the previous refresh ended up reading.
+            self.instrumentation.record_delta('update_transactions_table.rows',
+                                              self.transactions_model.materialized, 'rows')
+        self.search_result = None
+        if self.search_query is None and self.sort_key is None:
+            self.transactions_model.set_filter(None)
+        else:
+            sort, descending = self.sort_key or (None, False)
+            started = time.perf_counter()
+            ids = self.repository.search(**(self.search_query or {}), sort=sort, descending=descending)
+            elapsed = (time.perf_counter() - started) * 1000.0
+            self.transactions_model.set_filter(ids)
+            if self.search_query is not None:
+                self.search_result = (len(ids), elapsed)
+        self.update_search_status()
+        self.transactions_model.refresh()
 
+    def update_search_status(self):
+        if self.search_result is None:
+            self.search_status_label.clear()
+        else:
+            count, elapsed = self.search_result
+            self.search_status_label.setText(self.texts[self.current_lang]['search_results'].format(
+                count=count, ms=elapsed))
+
+    @instrumented('update_overview')
     def update_overview(self):
-        total_income = sum(t['amount'] for t in self.transactions if t['type'] == 'income')
-        total_expense = sum(t['amount'] for t in self.transactions if t['type'] == 'expense')
+        total_income = self.aggregates.total('income')
+        total_expense = self.aggregates.total('expense')
         balance = total_income - total_expense
 
-        self.balance_label.setText(f"{self.texts[self.current_lang]['balance_label']} {balance:.2f}")
-        self.income_label.setText(f"{self.texts[self.current_lang]['income_label']} {total_income:.2f}")
-        self.expense_label.setText(f"{self.texts[self.current_lang]['expense_label']} {total_expense:.2f}")
+        amount = self.formats.amount
+        lang = self.current_lang
+        self.balance_label.setText(f"{self.texts[lang]['balance_label']} {amount(lang, balance)}")
+        self.income_label.setText(f"{self.texts[lang]['income_label']} {amount(lang, total_income)}")
+        self.expense_label.setText(f"{self.texts[lang]['expense_label']} {amount(lang, total_expense)}")
+        self.consolidated_label.setVisible(len(self.ledgers.ledgers) > 1)
+        self.consolidated_label.setText(self.texts[self.current_lang]['consolidated_label'].format(
+            count=len(self.ledgers.ledgers), balance=amount(lang, self.ledgers.consolidated_balance(self.aggregates))))
+        lines = self.budget_lines(self.budgets.limits)
+        self.budget_label.setVisible(bool(lines))
+        if lines:
+            self.budget_label.setText(self.texts[self.current_lang]['budgets_title'] + '<br>' + '<br>'.join(
+                f'<span style="color: #C00000">{html.escape(line)}</span>' if over else html.escape(line)
+                for over, line in lines))
 
-        categories = self.categories
-        amounts = [sum(t['amount'] for t in self.transactions if t['category'] == cat and t['type'] == 'expense') for cat in categories]
-        self.graph.update_graph(categories, amounts, self.texts[self.current_lang]['overview_title'], self.current_lang)
+        texts = self.texts[self.current_lang]
+        report = self.REPORTS[self.report_combo.currentIndex()]
+        labels, series = self.report_series(report)
+        if report == 'categories':
+            self.graph.update_graph(labels, series, texts['overview_title'], texts['axis_categories'], texts['axis_amount'])
+        else:
+            self.graph.update_graph(labels, series, texts['report_' + report], texts['axis_period'], texts['axis_amount'])
+        if self.ledger_loaded:
+            self.profile_mark('chart_ready')
+
+    def toggle_diagnostics(self, enabled):
+        self.instrumentation.enabled = enabled
+        if enabled:
+            self.diagnostics_timer.start()
+        else:
+            self.diagnostics_timer.stop()
+        self.refresh.mark_dirty('diagnostics')
+
+    def reset_diagnostics(self):
+        self.instrumentation.reset()
+        self.refresh.mark_dirty('diagnostics')
+
+    def update_diagnostics(self):
+        metrics = self.instrumentation.report()['metrics']
+        self.diagnostics_table.setRowCount(len(metrics))
+        for row, (name, metric) in enumerate(metrics.items()):
+            unit = metric['unit']
+            value_format = '{:.2f} ms' if unit == 'ms' else '{:.0f} ' + unit
+            cells = [name, str(metric['count'])] + [value_format.format(metric[key])
+                                                     for key in ('p50', 'p95', 'max', 'total')]
+            for column, text in enumerate(cells):
+                self.diagnostics_table.setItem(row, column, QTableWidgetItem(text))
+
+    def export_diagnostics(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, self.texts[self.current_lang]['diagnostics_export'],
+                                                   "diagnostics.json", "JSON Files (*.json)")
+        if not file_path:
+            return
+        report = self.instrumentation.report()
+        report.update(created=datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), storage=self.storage,
+                      ledger=self.ledgers.active, rows=self.repository.count())
+        self.repository.writer.submit(lambda: atomic_write_json(file_path, report, indent=2), label='export')
+        self.status_text.setText(self.texts[self.current_lang]['diagnostics_exported'].format(path=file_path))
+
+    def report_series(self, report):
+        texts = self.texts[self.current_lang]
+        labels, series = report_series(self.aggregates, report, datetime.now().date(), self.categories)
+        return labels, [(texts[key] if key in TRANSACTION_TYPES else key, values) for key, values in series]
+
+    def closeEvent(self, event):
+        for thread in (self.loader_thread, self.import_thread):
+            if thread is not None and thread.isRunning():
+                thread.requestInterruption()
+                thread.quit()
+                thread.wait()
+        if self.ledger_loaded:
+            self.ledgers.update_summary(self.ledgers.active, self.aggregates, self.repository.count())
+        self.ledgers.save(self.repository.writer)
+        self.repository.flush()
+        self.repository.close()
+        super().closeEvent(event)
 
     def clear_inputs(self):
         self.amount_input.clear()
@@ -879,10 +2394,42 @@ class BudgetManagerApp(QMainWindow):
         self.type_combo.setCurrentIndex(0)
         self.date_input.setDate(QDate.currentDate())
         self.description_input.clear()
+        self.repeat_combo.setCurrentIndex(0)
+        self.schedule_input.clear()
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='Budget Manager')
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json',
+                        help='ledger storage backend (sqlite migrates budget_transactions.json once)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print per-phase startup timings as JSON and exit once the ledger and chart are ready')
+    parser.add_argument('--startup-budget-ms', type=float, default=None,
+                        help='with --profile-startup, exit with status 1 if the window takes longer than this to show')
+    parser.add_argument('--instrument', action='store_true',
+                        help='record hot-path timings from startup (see Diagnostics on the Settings tab)')
+    args, qt_args = parser.parse_known_args()
+    profiler = None
+    if args.profile_startup:
+        profiler = StartupProfiler(_STARTUP_T0, wait_for=('ledger_loaded', 'chart_ready'))
+        profiler.mark('imports')
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Windows')
-    window = BudgetManagerApp()
+    if profiler is not None:
+        profiler.mark('qapplication')
+    window = BudgetManagerApp(storage=args.storage, profiler=profiler, instrument=args.instrument)
     window.show()
+    if profiler is not None:
+        profiler.mark('window_shown')
+
+        def report_startup():
+            report = profiler.report()
+            status = 0
+            if args.startup_budget_ms is not None:
+                report['budget_ms'] = args.startup_budget_ms
+                report['within_budget'] = profiler.elapsed_ms('window_shown') <= args.startup_budget_ms
+                status = 0 if report['within_budget'] else 1
+            print(json.dumps(report, indent=2))
+            window.close()
+            app.exit(status)
+        profiler.on_complete = lambda: QTimer.singleShot(0, report_startup)
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,2536 @@
+import os
+import io
+import re
+import csv
+import json
+import codecs
+import logging
+import sqlite3
+import threading
+import bisect
+import mmap
+import struct
+import time
+import itertools
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from datetime import datetime, timedelta
+import numpy as np
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def _fsync_dir(path):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def atomic_write_json(path, data, **dump_kwargs):
+    # Returns the number of bytes written.
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+        written = os.fstat(f.fileno()).st_size
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+    return written
+
+class PersistenceWriter:
+    # A single daemon thread that performs ledger writes in submission order,
+    # so the GUI thread never waits on the disk. Once a request arrives the
+    # thread waits `window` seconds before draining the queue, and a keyed
+    # request is not queued again while one with the same key is waiting:
+    # keyed tasks read the latest state when they run, so a burst of saves
+    # collapses into a single write.
+    #
+    # Tasks may return the number of bytes they wrote. On the writer thread,
+    # on_task, if set, is called with (label, bytes, seconds) after each
+    # task submitted with a label, and on_batch with (bytes, seconds) after
+    # each batch. A task that fails is reported to on_error and the batch goes on;
+    # anything but an I/O error is also logged with its traceback.
+    def __init__(self, window=0.05):
+        self.window = window
+        self.on_error = None
+        self.on_task = None
+        self.on_batch = None
+        self.bytes_written = 0
+        self._tasks = []
+        self._keys = set()
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, task, key=None, label=None):
+        with self._cond:
+            if key is not None:
+                if key in self._keys:
+                    return
+                self._keys.add(key)
+            self._tasks.append((task, label))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks and not self._closed:
+                    self._cond.wait()
+                if not self._tasks:
+                    return
+                deadline = time.monotonic() + self.window
+                while not self._flushing and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                tasks, self._tasks = self._tasks, []
+                self._keys.clear()
+                self._busy = True
+            try:
+                self._run_batch(tasks)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _run_batch(self, tasks):
+        # Nothing may escape: with the thread gone, flush() would wait
+        # forever, and the app calls it on exit.
+        started = time.perf_counter()
+        written = 0
+        for task, label in tasks:
+            task_started = time.perf_counter()
+            task_written = 0
+            try:
+                task_written = task() or 0
+            except (OSError, sqlite3.Error) as e:
+                self._notify(self.on_error, str(e))
+            except Exception as e:
+                logger.exception('Ledger write failed')
+                self._notify(self.on_error, f'{type(e).__name__}: {e}')
+            written += task_written
+            if label is not None:
+                self._notify(self.on_task, label, task_written, time.perf_counter() - task_started)
+        self.bytes_written += written
+        self._notify(self.on_batch, written, time.perf_counter() - started)
+
+    def _notify(self, callback, *args):
+        if callback is not None:
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception('PersistenceWriter callback failed')
+
+    def flush(self):
+        # Blocks until everything submitted so far is on disk; used on exit.
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while self._tasks or self._busy:
+                self._cond.wait()
+            self._flushing = False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._thread = None
+        self._closed = False
+
+class JsonArrayStream:
+    # Incremental reader for a snapshot file: either a bare JSON array (the
+    # original format) or {"seq": n, "transactions": [...]}. Elements are
+    # decoded one at a time with JSONDecoder.raw_decode over a rolling buffer,
+    # so a large ledger is never held as one parsed document.
+    WHITESPACE = ' \t\r\n'
+    NUMBER_CHARS = '0123456789+-.eE'
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.seq = 0
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f'Malformed ledger snapshot: expected {char!r} at byte ~{self.bytes_read}')
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut at the buffer edge ("12" of "12.5") may continue
+                # in the next chunk.
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in self.NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _object_member(self):
+        key = self._value()
+        self._expect(':')
+        if key == 'transactions':
+            return True
+        value = self._value()
+        if key == 'seq':
+            self.seq = value
+        return False
+
+    def __iter__(self):
+        is_object = self._peek() == '{'
+        if is_object:
+            self.pos += 1
+            while not self._object_member():
+                self._expect(',')
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+        else:
+            while True:
+                yield self._value()
+                if self._peek() == ']':
+                    self.pos += 1
+                    break
+                self._expect(',')
+        if is_object:
+            while self._peek() == ',':
+                self.pos += 1
+                self._object_member()
+            self._expect('}')
+
+class TransactionJournal:
+    # The ledger is kept as a snapshot file plus an append-only journal of
+    # add/delete records. Every record carries a sequence number and the
+    # snapshot remembers the last one it contains, so a crash at any point
+    # of a compaction still replays to the same state.
+    #
+    # Writes happen on a PersistenceWriter: records are numbered and buffered
+    # on the calling thread, and the writer appends everything buffered with
+    # one fsync per batch.
+    def __init__(self, path='budget_transactions.json', compact_every=1000, writer=None):
+        # path is the original JSON ledger; compactions write the binary
+        # snapshot next to it, which takes precedence once it exists.
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_suffix('.bin')
+        self.journal_path = self.path.with_name(self.path.stem + '.journal')
+        self.rotated_path = self.path.with_name(self.path.stem + '.journal.old')
+        self.rollup_path = self.path.with_name(self.path.stem + '.rollup.json')
+        self.compact_every = compact_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.pending = 0
+        self.writer = writer if writer is not None else PersistenceWriter()
+        self._journal = None
+        self._buffer = []
+        self._compaction = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return any(p.exists() for p in (self.snapshot_path, self.path, self.journal_path, self.rotated_path))
+
+    def load(self):
+        store = ColumnarTransactionStore()
+        for op, payload, _, _ in self.iter_load_ops():
+            if op == 'store':
+                store = payload
+            elif op == 'add':
+                store.extend(payload)
+            elif op == 'delete':
+                store.delete_ids(payload)
+            else:
+                store.delete_ids(store.ids_at(payload))
+        return list(store)
+
+    def iter_load_ops(self, batch_size=5000):
+        # Yields (op, payload, bytes_done, bytes_total) in replay order: one
+        # 'store' with the memory-mapped binary snapshot, or 'add' batches
+        # streamed from a JSON snapshot; then 'add' batches and 'delete' lists
+        # of transaction ids from the journal. Journals written before rows
+        # had ids yield 'delete_rows' with the positions instead.
+        use_binary = self.snapshot_path.exists()
+        paths = (self.snapshot_path if use_binary else self.path, self.rotated_path, self.journal_path)
+        total = sum(path.stat().st_size for path in paths if path.exists())
+        done = 0
+        snapshot_seq = 0
+        f = None
+        if use_binary:
+            store, snapshot_seq = read_binary_snapshot(self.snapshot_path)
+            self.snapshot_seq = snapshot_seq
+            done = self.snapshot_path.stat().st_size
+            yield 'store', store, done, total
+        else:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                pass
+        if f is not None:
+            with f:
+                stream = JsonArrayStream(f)
+                batch = []
+                for transaction in stream:
+                    batch.append(transaction)
+                    if len(batch) >= batch_size:
+                        yield 'add', batch, stream.bytes_read, total
+                        batch = []
+                if batch:
+                    yield 'add', batch, stream.bytes_read, total
+                snapshot_seq = stream.seq
+                done = stream.bytes_read
+        self.seq = snapshot_seq
+        self.pending = 0
+        batch = []
+        for journal_path in (self.rotated_path, self.journal_path):
+            for record in self._read_records(journal_path):
+                if record['seq'] <= snapshot_seq:
+                    continue
+                self.seq = max(self.seq, record['seq'])
+                self.pending += 1
+                if record['op'] == 'add':
+                    batch.append(record['transaction'])
+                    if len(batch) >= batch_size:
+                        yield 'add', batch, done, total
+                        batch = []
+                elif record['op'] == 'delete':
+                    if batch:
+                        yield 'add', batch, done, total
+                        batch = []
+                    if 'ids' in record:
+                        yield 'delete', record['ids'], done, total
+                    else:
+                        yield 'delete_rows', record['rows'], done, total
+        if batch:
+            yield 'add', batch, total, total
+
+    def _read_records(self, journal_path):
+        try:
+            f = open(journal_path, 'r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            good_end = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is None or not line.endswith(b'\n'):
+                    # A torn final line from a crash mid-append is cut off so
+                    # that later appends start on a clean line.
+                    f.truncate(good_end)
+                    break
+                good_end += len(line)
+                yield record
+
+    def _append(self, records):
+        with self._lock:
+            for record in records:
+                self.seq += 1
+                record['seq'] = self.seq
+                self._buffer.append((self.seq, json.dumps(record, ensure_ascii=False) + '\n'))
+            self.pending += len(records)
+        self.writer.submit(self._write_buffer, key='journal', label='journal')
+
+    def _write_buffer(self, upto=None):
+        # Runs on the writer thread. While a compaction is queued, records
+        # newer than its snapshot are held back for the journal that replaces
+        # the rotated one.
+        with self._lock:
+            if upto is None and self._compaction is not None:
+                upto = self._compaction[0]
+            count = len(self._buffer)
+            if upto is not None:
+                count = 0
+                while count < len(self._buffer) and self._buffer[count][0] <= upto:
+                    count += 1
+            lines, self._buffer = self._buffer[:count], self._buffer[count:]
+        if not lines:
+            return 0
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        start = self._journal.tell()
+        self._journal.write(''.join(line for _, line in lines))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        return self._journal.tell() - start
+
+    def record_add(self, transaction):
+        self.record_add_many([transaction])
+
+    def record_add_many(self, transactions):
+        self._append([{'op': 'add', 'transaction': transaction} for transaction in transactions])
+
+    def record_delete(self, ids):
+        self._append([{'op': 'delete', 'ids': list(ids)}])
+
+    def maybe_compact(self, snapshot):
+        # snapshot is called for an immutable copy of the ledger only when a
+        # compaction is actually due.
+        if self.pending >= self.compact_every:
+            self.compact(snapshot())
+
+    def compact(self, transactions):
+        # Queues a snapshot of the ledger as of the last numbered record; a
+        # newer request replaces one that hasn't been written yet.
+        with self._lock:
+            self._compaction = (self.seq, transactions)
+            self.pending = 0
+        self.writer.submit(self._write_compaction, key='compact', label='compaction')
+
+    def _write_compaction(self):
+        with self._lock:
+            compaction = self._compaction
+        if compaction is None:
+            return 0
+        seq, transactions = compaction
+        written = self._write_buffer(upto=seq)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        # A rotated journal still there is left by a compaction that crashed
+        # before its snapshot was written, and holds records no snapshot has.
+        # Then the journal stays where it is: this snapshot covers both, and
+        # replay skips the records it holds.
+        if self.journal_path.exists() and not self.rotated_path.exists():
+            os.replace(self.journal_path, self.rotated_path)
+        written += self._write_snapshot(seq, transactions)
+        with self._lock:
+            if self._compaction is compaction:
+                self._compaction = None
+        return written + self._write_buffer()
+
+    def read_rollup(self, store):
+        # The day-level rollup groups saved with the binary snapshot, or None
+        # when they don't belong to the snapshot that was just opened.
+        try:
+            with open(self.rollup_path, 'r', encoding='utf-8') as f:
+                rollup = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if rollup.get('seq') != self.snapshot_seq or rollup.get('count') != len(store):
+            return None
+        return rollup['groups']
+
+    def _write_snapshot(self, seq, transactions):
+        if not isinstance(transactions, ColumnarTransactionStore):
+            store = ColumnarTransactionStore()
+            store.extend(list(transactions))
+            transactions = store
+        written = write_binary_snapshot(self.snapshot_path, transactions, seq)
+        written += atomic_write_json(self.rollup_path, {'seq': seq, 'count': len(transactions),
+                                                        'groups': list(transactions.aggregate_groups())})
+        try:
+            os.remove(self.rotated_path)
+        except FileNotFoundError:
+            pass
+        return written
+
+    def close(self):
+        self.writer.flush()
+        self.writer.close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+TRANSACTION_FIELDS = ('amount', 'category', 'type', 'date', 'description', 'timestamp')
+TRANSACTION_TYPES = ('income', 'expense')
+
+class StringPool:
+    # Interns strings to dense int32 codes. A pool opened from a binary
+    # snapshot keeps its first entries as UTF-8 slices of the mapped heap and
+    # decodes them only when read; strings interned afterwards are deduplicated
+    # among themselves.
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self._heap = None
+        self._heap_start = 0
+        self._offsets = None
+        self._base = 0
+
+    @classmethod
+    def from_heap(cls, heap, heap_start, offsets):
+        pool = cls()
+        pool._heap = heap
+        pool._heap_start = heap_start
+        pool._offsets = offsets
+        pool._base = len(offsets) - 1
+        return pool
+
+    def __len__(self):
+        return self._base + len(self.values)
+
+    def __getitem__(self, code):
+        if code < self._base:
+            return self.encoded(code).decode('utf-8')
+        return self.values[code - self._base]
+
+    def encoded(self, code):
+        if code < self._base:
+            start = self._heap_start + int(self._offsets[code])
+            return self._heap[start:self._heap_start + int(self._offsets[code + 1])]
+        return self.values[code - self._base].encode('utf-8')
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self)
+            self.values.append(value)
+        return code
+
+    def intern_many(self, values):
+        return np.fromiter((self.intern(value) for value in values), dtype=np.int32, count=len(values))
+
+    def materialize(self):
+        # Decodes heap entries into ordinary interned values; used for small
+        # pools such as categories where full deduplication matters.
+        if self._heap is not None:
+            heap_values = [self[code] for code in range(self._base)]
+            self.values = heap_values + self.values
+            self.codes = {value: code for code, value in reversed(list(enumerate(self.values)))}
+            self._heap = None
+            self._offsets = None
+            self._base = 0
+
+    def detach(self):
+        # Copies the heap and its offset table out of the mapped file so the
+        # mapping can be closed.
+        if self._heap is not None and not isinstance(self._heap, bytes):
+            end = self._heap_start + int(self._offsets[-1])
+            self._heap = self._heap[self._heap_start:end]
+            self._heap_start = 0
+            self._offsets = self._offsets.copy()
+
+class ColumnarTransactionStore:
+    # In-memory ledger kept as parallel NumPy columns instead of one dict per
+    # row. Capacity doubles on growth so appends are amortized O(1).
+    #
+    # Every row has a stable id. Ids only grow and rows are only appended, so
+    # the id column is sorted and doubles as the id -> slot index. Deleting
+    # marks slots dead in `alive` instead of moving the columns; compact()
+    # drops them once enough have piled up. Positions count live rows only.
+    INITIAL_CAPACITY = 1024
+    DTYPES = {
+        'id': np.int64,
+        'amount': np.float64,
+        'type': np.uint8,
+        'category': np.int32,
+        'date': 'datetime64[D]',
+        'description': np.int32,
+        'timestamp': np.int32,
+    }
+
+    def __init__(self, categories=None, strings=None):
+        self.categories = categories if categories is not None else StringPool()
+        self.strings = strings if strings is not None else StringPool()
+        self.size = 0
+        self.columns = {name: np.empty(self.INITIAL_CAPACITY, dtype=dtype) for name, dtype in self.DTYPES.items()}
+        self.alive = np.ones(self.INITIAL_CAPACITY, dtype=bool)
+        self.dead = 0
+        self.next_id = 1
+        self.mapping = None
+        self._live = None
+
+    def __len__(self):
+        return self.size - self.dead
+
+    def __iter__(self):
+        for start in range(0, len(self), 4096):
+            yield from self.slice(start, start + 4096)
+
+    def _reserve(self, needed):
+        capacity = len(self.columns['amount'])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, self.INITIAL_CAPACITY)
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+        alive = np.ones(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def append(self, transaction):
+        self.extend([transaction])
+
+    def extend(self, transactions):
+        # Rows without an id (or with one that would break the ordering) get
+        # the next free one, written back into the dict so that callers
+        # persist it.
+        count = len(transactions)
+        if not count:
+            return
+        self._reserve(self.size + count)
+        end = self.size + count
+        next_id = self.next_id
+        last_id = int(self.columns['id'][self.size - 1]) if self.size else 0
+        for t in transactions:
+            transaction_id = t.get('id')
+            if transaction_id is None or transaction_id <= last_id:
+                transaction_id = t['id'] = next_id
+            last_id = transaction_id
+            next_id = max(next_id, transaction_id + 1)
+        columns = self.columns
+        columns['id'][self.size:end] = [t['id'] for t in transactions]
+        columns['amount'][self.size:end] = [t['amount'] for t in transactions]
+        columns['type'][self.size:end] = [TRANSACTION_TYPES.index(t['type']) for t in transactions]
+        columns['category'][self.size:end] = self.categories.intern_many([t['category'] for t in transactions])
+        columns['date'][self.size:end] = np.array([t['date'] for t in transactions], dtype='datetime64[D]')
+        columns['description'][self.size:end] = self.strings.intern_many([t['description'] for t in transactions])
+        columns['timestamp'][self.size:end] = self.strings.intern_many([t['timestamp'] for t in transactions])
+        self.alive[self.size:end] = True
+        self.size = end
+        self.next_id = next_id
+        self._live = None
+
+    def live_slots(self):
+        if self._live is None:
+            self._live = np.flatnonzero(self.alive[:self.size]) if self.dead else np.arange(self.size)
+        return self._live
+
+    def slots_at(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        return self.live_slots()[positions] if self.dead else positions
+
+    def get(self, position):
+        return self.slice(position, position + 1)[0]
+
+    def slice(self, start=0, stop=None):
+        count = len(self)
+        stop = count if stop is None else min(stop, count)
+        if start >= stop:
+            return []
+        if not self.dead:
+            return self._materialize(slice(start, stop))
+        return self._materialize(self.live_slots()[start:stop])
+
+    def take(self, slots):
+        return self._materialize(np.asarray(slots, dtype=np.int64))
+
+    def slots_for_ids(self, ids):
+        # Binary search over the sorted id column; ids that were never issued
+        # or are already deleted are dropped.
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.size or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self.columns['id'][:self.size], ids), self.size - 1)
+        found = (self.columns['id'][slots] == ids) & self.alive[slots]
+        return slots[found]
+
+    def take_ids(self, ids):
+        return self.take(self.slots_for_ids(ids))
+
+    def ids_at(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        positions = positions[(positions >= 0) & (positions < len(self))]
+        return self.columns['id'][self.slots_at(positions)]
+
+    def _materialize(self, index):
+        columns = self.columns
+        categories = self.categories
+        strings = self.strings
+        return [
+            {
+                'id': transaction_id,
+                'amount': amount,
+                'category': categories[category],
+                'type': TRANSACTION_TYPES[type_code],
+                'date': date,
+                'description': strings[description],
+                'timestamp': strings[timestamp],
+            }
+            for transaction_id, amount, category, type_code, date, description, timestamp in zip(
+                columns['id'][index].tolist(),
+                columns['amount'][index].tolist(),
+                columns['category'][index].tolist(),
+                columns['type'][index].tolist(),
+                np.datetime_as_string(columns['date'][index], unit='D').tolist(),
+                columns['description'][index].tolist(),
+                columns['timestamp'][index].tolist(),
+            )
+        ]
+
+    def delete_ids(self, ids):
+        # O(k log n) for k ids: the rows are only marked dead.
+        slots = np.unique(self.slots_for_ids(ids))
+        deleted = self.take(slots)
+        if len(slots):
+            self.alive[slots] = False
+            self.dead += len(slots)
+            self._live = None
+        return deleted
+
+    def compact(self):
+        # Drops dead slots. Returns the keep mask over the old slots, or None
+        # if there was nothing to drop, so indexes over slots can follow.
+        if not self.dead:
+            return None
+        keep = self.alive[:self.size].copy()
+        for name, column in self.columns.items():
+            self.columns[name] = column[:self.size][keep]
+        self.size = len(self.columns['amount'])
+        self.alive = np.ones(self.size, dtype=bool)
+        self.dead = 0
+        self._live = None
+        return keep
+
+    def clear(self):
+        next_id = self.next_id
+        self.detach()
+        self.__init__()
+        self.next_id = next_id
+
+    def detach(self):
+        # Replaces views into a memory-mapped snapshot with owned copies and
+        # closes the mapping, e.g. before that snapshot file is rewritten
+        # (Windows refuses to replace a file that is still mapped). Closing
+        # fails with BufferError if any view was missed.
+        if self.mapping is None:
+            return
+        self.columns = {name: column[:self.size].copy() for name, column in self.columns.items()}
+        self.categories.detach()
+        self.strings.detach()
+        self.mapping.close()
+        self.mapping = None
+
+    def slots_for_dates(self, dates):
+        wanted = np.array(sorted(dates), dtype='datetime64[D]')
+        return np.flatnonzero(np.isin(self.columns['date'][:self.size], wanted) & self.alive[:self.size])
+
+    def copy(self):
+        # A copy holds live rows only. Pools are append-only, so it can share
+        # them with the original.
+        clone = ColumnarTransactionStore(self.categories, self.strings)
+        live = self.live_slots() if self.dead else slice(None)
+        clone.columns = {name: column[:self.size][live].copy() for name, column in self.columns.items()}
+        clone.size = len(clone.columns['amount'])
+        clone.alive = np.ones(clone.size, dtype=bool)
+        clone.next_id = self.next_id
+        return clone
+
+    def aggregate_groups(self):
+        # One np.bincount over a combined (type, category, day) key instead
+        # of a Python pass per group.
+        if not len(self):
+            return
+        live = self.live_slots() if self.dead else slice(0, self.size)
+        columns = {name: self.columns[name][live] for name in ('type', 'category', 'date', 'amount')}
+        days, day_codes = np.unique(columns['date'], return_inverse=True)
+        category_count = max(len(self.categories), 1)
+        day_count = len(days)
+        keys = (columns['type'].astype(np.int64) * category_count + columns['category']) * day_count + day_codes
+        length = len(TRANSACTION_TYPES) * category_count * day_count
+        sums = np.bincount(keys, weights=columns['amount'], minlength=length)
+        counts = np.bincount(keys, minlength=length)
+        day_names = np.datetime_as_string(days, unit='D').tolist()
+        for key in np.flatnonzero(counts).tolist():
+            rest, day = divmod(key, day_count)
+            type_code, category = divmod(rest, category_count)
+            yield (TRANSACTION_TYPES[type_code], self.categories[category], day_names[day],
+                   float(sums[key]), int(counts[key]))
+
+SNAPSHOT_MAGIC = b'BMLS'
+SNAPSHOT_VERSION = 2
+# Version 2 added the id column and next_id; version 1 files are still read,
+# with ids 1..n.
+SNAPSHOT_HEADER = struct.Struct('<4sHHQQIIQQ')
+SNAPSHOT_HEADER_SIZE = 64
+SNAPSHOT_COLUMNS = (
+    ('amount', '<f8'),
+    ('date', '<M8[D]'),
+    ('category', '<i4'),
+    ('description', '<i4'),
+    ('timestamp', '<i4'),
+    ('type', 'u1'),
+    ('id', '<i8'),
+)
+
+def _snapshot_layout(count, category_count, string_count, version=SNAPSHOT_VERSION):
+    # Sections follow the header back to back, each 8-byte aligned: one
+    # fixed-width array per column, the category and string offset tables,
+    # then the UTF-8 heap they index into.
+    layout = {}
+    offset = SNAPSHOT_HEADER_SIZE
+    columns = SNAPSHOT_COLUMNS if version >= 2 else SNAPSHOT_COLUMNS[:-1]
+    sections = [(name, np.dtype(dtype), count) for name, dtype in columns]
+    sections.append(('category_offsets', np.dtype('<u8'), category_count + 1))
+    sections.append(('string_offsets', np.dtype('<u8'), string_count + 1))
+    for name, dtype, length in sections:
+        layout[name] = (offset, dtype, length)
+        offset += -(-dtype.itemsize * length // 8) * 8
+    return layout, offset
+
+def _pack_pool(pool, codes):
+    chunks = [pool.encoded(code) for code in codes.tolist()]
+    offsets = np.zeros(len(chunks) + 1, dtype='<u8')
+    np.cumsum(np.fromiter(map(len, chunks), dtype=np.uint64, count=len(chunks)), out=offsets[1:])
+    return offsets, b''.join(chunks)
+
+def write_binary_snapshot(path, transactions, seq=0):
+    # Accepts a ColumnarTransactionStore or any iterable of transaction dicts.
+    # Only strings still referenced by a row are written, with codes remapped.
+    # Returns the size of the file written.
+    if isinstance(transactions, ColumnarTransactionStore):
+        store = transactions
+    else:
+        store = ColumnarTransactionStore()
+        store.extend(list(transactions))
+    if store.dead:
+        store = store.copy()
+    size = store.size
+    columns = {name: column[:size] for name, column in store.columns.items()}
+    used_categories, categories = np.unique(columns['category'], return_inverse=True)
+    string_codes = np.concatenate([columns['description'], columns['timestamp']])
+    used_strings, strings = np.unique(string_codes, return_inverse=True)
+    columns['category'] = categories
+    columns['description'] = strings[:size]
+    columns['timestamp'] = strings[size:]
+    category_offsets, category_heap = _pack_pool(store.categories, used_categories)
+    string_offsets, string_heap = _pack_pool(store.strings, used_strings)
+    string_offsets += len(category_heap)
+    layout, heap_offset = _snapshot_layout(size, len(used_categories), len(used_strings))
+    arrays = dict(columns, category_offsets=category_offsets, string_offsets=string_offsets)
+    heap = category_heap + string_heap
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, seq, size,
+                                     len(used_categories), len(used_strings), len(heap), store.next_id))
+        for name, (offset, dtype, length) in layout.items():
+            f.seek(offset)
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        f.seek(heap_offset)
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+        written = os.fstat(f.fileno()).st_size
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+    return written
+
+def read_binary_snapshot(path):
+    # Returns (store, seq). The store's columns are read-only views into a
+    # shared memory mapping and strings are decoded lazily from its heap, so
+    # opening is close to zero-copy; the first mutation copies what it needs.
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _, seq, count, category_count, string_count, heap_size, next_id = \
+        SNAPSHOT_HEADER.unpack_from(mapping, 0)
+    if magic != SNAPSHOT_MAGIC or not 1 <= version <= SNAPSHOT_VERSION:
+        mapping.close()
+        raise ValueError(f'{path} is not a version {SNAPSHOT_VERSION} ledger snapshot')
+    layout, heap_offset = _snapshot_layout(count, category_count, string_count, version)
+    if heap_offset + heap_size > len(mapping):
+        mapping.close()
+        raise ValueError(f'{path} is truncated')
+    arrays = {name: np.frombuffer(mapping, dtype=dtype, count=length, offset=offset)
+              for name, (offset, dtype, length) in layout.items()}
+    categories = StringPool.from_heap(mapping, heap_offset, arrays.pop('category_offsets'))
+    categories.materialize()
+    strings = StringPool.from_heap(mapping, heap_offset, arrays.pop('string_offsets'))
+    if version < 2:
+        arrays['id'] = np.arange(1, count + 1, dtype=np.int64)
+        next_id = count + 1
+    store = ColumnarTransactionStore(categories, strings)
+    store.columns = arrays
+    store.size = count
+    store.alive = np.ones(count, dtype=bool)
+    store.next_id = max(next_id, 1)
+    store.mapping = mapping
+    return store, seq
+
+class TransactionRepository(ABC):
+    # Storage backends expose the ledger through this interface so callers
+    # never have to hold or scan the whole transaction list themselves. Rows are
+    # read by their position in insertion order and changed by their stable
+    # 'id', which survives deletes, sorting and filtering.
+    #
+    # Loading is split so the parsing can run on a worker thread:
+    # begin_load() runs on the GUI thread, read_batches() on the loader
+    # thread, and each (op, payload) it yields is handed back to
+    # apply_loaded() on the GUI thread. load_ledger() does all three in one go.
+    def load(self):
+        load_ledger(self)
+
+    def begin_load(self):
+        pass
+
+    def read_batches(self, batch_size=5000):
+        return iter(())
+
+    def apply_loaded(self, op, payload):
+        # Returns (added, deleted) transactions so callers can update caches.
+        return [], []
+
+    @abstractmethod
+    def count(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch(self, offset=0, limit=None):
+        raise NotImplementedError
+
+    def all(self):
+        return self.fetch()
+
+    @abstractmethod
+    def add(self, transaction):
+        raise NotImplementedError
+
+    def add_many(self, transactions):
+        for transaction in transactions:
+            self.add(transaction)
+
+    @abstractmethod
+    def delete_ids(self, ids):
+        # Returns the deleted transactions.
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_by_dates(self, dates):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ids_at(self, positions):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_ids(self, ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, text='', category=None, type_key=None, date_range=None, amount_range=None,
+               sort=None, descending=False):
+        # Returns the ids of the matching rows in ledger order, or ordered by
+        # the sort column.
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def restore(self, store):
+        # Makes a ColumnarTransactionStore the whole ledger again, ids
+        # included; only valid on an empty ledger, for undoing clear().
+        raise NotImplementedError
+
+    @abstractmethod
+    def aggregate_groups(self):
+        # Yields (type, category, day, amount, count) groups for rebuilding
+        # an AggregateCache.
+        raise NotImplementedError
+
+    @abstractmethod
+    def snapshot(self):
+        # An immutable copy of the ledger that a writer thread can serialize.
+        raise NotImplementedError
+
+    def export(self, path):
+        snapshot = self.snapshot()
+        self.writer.submit(lambda: export_ledger(path, snapshot), label='export')
+
+    def save(self):
+        pass
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        pass
+
+class StoreBackedRepository(TransactionRepository):
+    # Base for backends that serve every read from an in-memory
+    # ColumnarTransactionStore. Tombstoned rows are dropped from the store
+    # once they outnumber both TOMBSTONE_LIMIT and a quarter of its slots.
+    #
+    # With indexed=False (as the CLI opens ledgers) the search index is only
+    # built by the first search, so one-shot commands don't pay for it.
+    TOMBSTONE_LIMIT = 1024
+
+    def __init__(self, indexed=True):
+        self.indexed = indexed
+        self._reset_store()
+
+    def _reset_store(self):
+        self.store = ColumnarTransactionStore()
+        self.index = TransactionSearchIndex(self.store) if self.indexed else None
+
+    def _index_rows(self, start):
+        if self.index is not None:
+            self.index.index_rows(start)
+
+    def _restore_store(self, store):
+        store = store.copy()
+        store.next_id = max(store.next_id, self.store.next_id)
+        self.store = store
+        self.index = TransactionSearchIndex(store) if self.indexed else None
+
+    def _drop_tombstones(self):
+        if self.store.dead > max(self.TOMBSTONE_LIMIT, self.store.size // 4):
+            self.store.detach()
+            keep = self.store.compact()
+            if self.index is not None:
+                self.index.compact(keep)
+
+    def count(self):
+        return len(self.store)
+
+    def fetch(self, offset=0, limit=None):
+        return self.store.slice(offset, None if limit is None else offset + limit)
+
+    def add(self, transaction):
+        self.add_many([transaction])
+
+    def find_by_dates(self, dates):
+        return self.store.take(self.store.slots_for_dates(dates))
+
+    def ids_at(self, positions):
+        return self.store.ids_at(positions)
+
+    def fetch_ids(self, ids):
+        return self.store.take_ids(ids)
+
+    def search(self, **facets):
+        if self.index is None:
+            self.index = TransactionSearchIndex(self.store)
+        return self.index.search(**facets)
+
+    def aggregate_groups(self):
+        return self.store.aggregate_groups()
+
+class JsonTransactionRepository(StoreBackedRepository):
+    def __init__(self, path='budget_transactions.json', indexed=True):
+        super().__init__(indexed)
+        self.writer = PersistenceWriter()
+        self.journal = TransactionJournal(path, writer=self.writer)
+
+    def begin_load(self):
+        self._reset_store()
+
+    def read_batches(self, batch_size=5000):
+        for op, payload, done, total in self.journal.iter_load_ops(batch_size):
+            yield op, payload, done, total
+            if op == 'store':
+                groups = self.journal.read_rollup(payload)
+                if groups is None:
+                    groups = list(payload.aggregate_groups())
+                yield 'groups', groups, done, total
+                if self.indexed:
+                    yield 'search', TransactionSearchIndex(payload), done, total
+
+    def apply_loaded(self, op, payload):
+        if op == 'store':
+            self.store = payload
+            return [], []
+        if op == 'search':
+            self.index = payload
+            return [], []
+        if op == 'add':
+            start = self.store.size
+            self.store.extend(payload)
+            self._index_rows(start)
+            return payload, []
+        if op in ('delete', 'delete_rows'):
+            ids = payload if op == 'delete' else self.store.ids_at(payload)
+            deleted = self.store.delete_ids(ids)
+            self._drop_tombstones()
+            return [], deleted
+        return [], []
+
+    def add_many(self, transactions):
+        start = self.store.size
+        self.store.extend(transactions)
+        self._index_rows(start)
+        self.journal.record_add_many(transactions)
+        self.journal.maybe_compact(self.snapshot)
+
+    def delete_ids(self, ids):
+        deleted = self.store.delete_ids(ids)
+        if deleted:
+            self.journal.record_delete([t['id'] for t in deleted])
+            self._drop_tombstones()
+            self.journal.maybe_compact(self.snapshot)
+        return deleted
+
+    def clear(self):
+        self.store.clear()
+        self.index = TransactionSearchIndex(self.store) if self.indexed else None
+        self.journal.compact(self.snapshot())
+
+    def restore(self, store):
+        self._restore_store(store)
+        self.journal.compact(self.snapshot())
+
+    def snapshot(self):
+        self.store.detach()
+        return self.store.copy()
+
+    def save(self):
+        self.journal.compact(self.snapshot())
+
+    def close(self):
+        self.journal.close()
+
+class SqliteTransactionRepository(TransactionRepository):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+        CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category);
+        CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS rollups (
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, category, type)
+        );
+    """
+    # Description tokens for search, split like TransactionSearchIndex does.
+    FTS_SCHEMA = ('CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5('
+                  'description, tokenize="unicode61 remove_diacritics 0 tokenchars \'_\'")')
+    COLUMNS = ', '.join(TRANSACTION_FIELDS)
+    FIELDS = ('id',) + TRANSACTION_FIELDS
+    ROW_SQL = f'SELECT id, {COLUMNS} FROM transactions'
+    # Ties keep ledger order; types sort in TRANSACTION_TYPES order.
+    SORT_SQL = {
+        'date': 'date',
+        'amount': 'amount',
+        'category': 'category',
+        'type': 'CASE type ' + ' '.join(f"WHEN '{type_key}' THEN {code}"
+                                        for code, type_key in enumerate(TRANSACTION_TYPES)) + ' END',
+    }
+    CHUNK = 500
+    # rollups is maintained in the same transaction as every insert/delete,
+    # so loading the aggregates never scans the transactions table.
+    AGGREGATE_SQL = 'SELECT type, category, day, amount, count FROM rollups'
+    ROLLUP_SQL = ('INSERT INTO rollups (day, category, type, amount, count) VALUES (?, ?, ?, ?, ?) '
+                  'ON CONFLICT (day, category, type) DO UPDATE SET '
+                  'amount = amount + excluded.amount, count = count + excluded.count')
+
+    def __init__(self, path='budget_transactions.db'):
+        # Every read is a query against the table and its indexes; of the
+        # rows themselves only the sorted live ids are kept in memory (8
+        # bytes a row), so a position resolves to an id without an OFFSET
+        # scan. The table's id is the transaction id, and its order is
+        # ledger order. Changes are queued as operations that a
+        # PersistenceWriter applies on its own connection, one SQLite
+        # transaction per batch. Until an operation is committed, reads lay
+        # it over what they get from the table, so the GUI thread never
+        # waits for the disk; only a queued clear or restore, which touches
+        # every row, and whole-ledger reads wait for the writer.
+        self.path = Path(path)
+        self.conn = None
+        self.fts = True
+        self.writer = PersistenceWriter()
+        self.next_id = 1
+        self._ids = np.empty(0, dtype=np.int64)
+        self._count = 0
+        # Queued or being written, oldest first.
+        self._ops = []
+        self._ops_lock = threading.Lock()
+        self._writer_conn = None
+
+    def begin_load(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(self.SCHEMA)
+            try:
+                self.conn.execute(self.FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5: descriptions are scanned instead.
+                self.fts = False
+                self.conn.create_function('matches_tokens', 2, self._matches_tokens, deterministic=True)
+            self.conn.commit()
+            if self.get_meta('rollups') is None:
+                with self.conn:
+                    self.conn.execute('DELETE FROM rollups')
+                    self.conn.execute('INSERT INTO rollups (day, category, type, amount, count) '
+                                      'SELECT date, category, type, SUM(amount), COUNT(*) '
+                                      'FROM transactions GROUP BY date, category, type')
+                self.set_meta('rollups', '1')
+            if self.fts and self.get_meta('fts') is None:
+                with self.conn:
+                    self.conn.execute('DELETE FROM transactions_fts')
+                    self.conn.execute('INSERT INTO transactions_fts (rowid, description) '
+                                      'SELECT id, description FROM transactions')
+                self.set_meta('fts', '1')
+        self.writer.flush()
+        # The ids themselves arrive from read_batches().
+        self._set_ids(np.empty(0, dtype=np.int64))
+        self.next_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM transactions').fetchone()[0]
+
+    @staticmethod
+    def _matches_tokens(description, tokens):
+        words = TransactionSearchIndex.tokenize(description)
+        return all(any(word.startswith(token) for word in words) for token in tokens.split())
+
+    def _pending(self):
+        # (rows queued for adding by id, ids queued for deleting). An id
+        # added and deleted again stays in the latter, as the table may
+        # have the add committed but not yet the delete.
+        with self._ops_lock:
+            ops = list(self._ops)
+        if any(op[0] in ('clear', 'restore') for op in ops):
+            self.writer.flush()
+            return {}, set()
+        added = {}
+        deleted = set()
+        for op in ops:
+            if op[0] == 'add':
+                for t in op[1]:
+                    added[t['id']] = t
+            else:
+                for t in op[1]:
+                    added.pop(t['id'], None)
+                    deleted.add(t['id'])
+        return added, deleted
+
+    def _overlay(self, rows, pending, wanted):
+        # Rows read from the table, less the queued deletes and the queued
+        # adds the table may already have, plus the queued adds that
+        # `wanted` accepts; in id order.
+        added, deleted = pending
+        if not added and not deleted:
+            return rows
+        rows = [row for row in rows if row['id'] not in deleted and row['id'] not in added]
+        extra = [self._row(t) for t in added.values() if wanted(t)]
+        return sorted(rows + extra, key=lambda row: row['id']) if extra else rows
+
+    def _row(self, transaction):
+        return {field: transaction[field] for field in self.FIELDS}
+
+    def _rows(self, sql, params=()):
+        return [dict(zip(self.FIELDS, row)) for row in self.conn.execute(sql, params)]
+
+    def _set_ids(self, ids):
+        self._ids = ids
+        self._count = len(ids)
+
+    def _append_ids(self, ids):
+        # Capacity doubles, as in ColumnarTransactionStore.
+        end = self._count + len(ids)
+        if end > len(self._ids):
+            grown = np.empty(max(end, 2 * len(self._ids), 1024), dtype=np.int64)
+            grown[:self._count] = self._ids[:self._count]
+            self._ids = grown
+        self._ids[self._count:end] = ids
+        self._count = end
+
+    def _remove_ids(self, ids):
+        live = self._ids[:self._count]
+        slots = np.searchsorted(live, np.asarray(ids, dtype=np.int64))
+        self._set_ids(np.delete(live, slots))
+
+    def count(self):
+        return self._count
+
+    def fetch(self, offset=0, limit=None):
+        # The ids of a page are consecutive in the table, so a page is one
+        # range walk along the primary key.
+        ids = self._ids[max(offset, 0):self._count if limit is None else min(offset + limit, self._count)]
+        if not len(ids):
+            return []
+        first, last = int(ids[0]), int(ids[-1])
+        pending = self._pending()
+        return self._overlay(self._rows(f'{self.ROW_SQL} WHERE id BETWEEN ? AND ? ORDER BY id', (first, last)),
+                             pending, lambda t: first <= t['id'] <= last)
+
+    def add(self, transaction):
+        self.add_many([transaction])
+
+    def add_many(self, transactions):
+        # Ids are assigned here, as the store does, and written back into the
+        # dicts.
+        transactions = list(transactions)
+        if not transactions:
+            return
+        next_id = self.next_id
+        for t in transactions:
+            if t.get('id') is None or t['id'] < next_id:
+                t['id'] = next_id
+            next_id = t['id'] + 1
+        self.next_id = next_id
+        self._append_ids([t['id'] for t in transactions])
+        self._queue(('add', transactions))
+
+    def delete_ids(self, ids):
+        deleted = self.fetch_ids(ids)
+        if deleted:
+            self._remove_ids(sorted(t['id'] for t in deleted))
+            self._queue(('delete', deleted))
+        return deleted
+
+    def find_by_dates(self, dates):
+        dates = sorted(dates)
+        pending = self._pending()
+        rows = []
+        for start in range(0, len(dates), self.CHUNK):
+            chunk = dates[start:start + self.CHUNK]
+            rows.extend(self._rows(f'{self.ROW_SQL} WHERE date IN ({", ".join("?" * len(chunk))}) ORDER BY id',
+                                   chunk))
+        if len(dates) > self.CHUNK:
+            rows.sort(key=lambda row: row['id'])
+        wanted = set(dates)
+        return self._overlay(rows, pending, lambda t: t['date'] in wanted)
+
+    def ids_at(self, positions):
+        # Ids in position order.
+        positions = np.unique(np.asarray(list(positions), dtype=np.int64))
+        positions = positions[(positions >= 0) & (positions < self._count)]
+        return self._ids[positions]
+
+    def fetch_ids(self, ids):
+        # In the order given; ids that don't exist are dropped.
+        ids = list(dict.fromkeys(int(transaction_id) for transaction_id in ids))
+        added, deleted = self._pending()
+        found = {transaction_id: self._row(added[transaction_id]) for transaction_id in ids if transaction_id in added}
+        stored = [transaction_id for transaction_id in ids if transaction_id not in found and transaction_id not in deleted]
+        for start in range(0, len(stored), self.CHUNK):
+            chunk = stored[start:start + self.CHUNK]
+            for row in self._rows(f'{self.ROW_SQL} WHERE id IN ({", ".join("?" * len(chunk))})', chunk):
+                found[row['id']] = row
+        return [found[transaction_id] for transaction_id in ids if transaction_id in found]
+
+    def search(self, text='', category=None, type_key=None, date_range=None, amount_range=None,
+               sort=None, descending=False):
+        conditions = []
+        params = []
+        tokens = TransactionSearchIndex.tokenize(text)
+        if tokens and self.fts:
+            conditions.append('id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)')
+            params.append(' AND '.join(f'"{token}"*' for token in tokens))
+        elif tokens:
+            conditions.append('matches_tokens(description, ?)')
+            params.append(' '.join(tokens))
+        if category is not None:
+            conditions.append('category = ?')
+            params.append(category)
+        if type_key is not None:
+            conditions.append('type = ?')
+            params.append(type_key)
+        for column, bounds in (('date', date_range), ('amount', amount_range)):
+            low, high = bounds if bounds is not None else (None, None)
+            if low is not None:
+                conditions.append(f'{column} >= ?')
+                params.append(low)
+            if high is not None:
+                conditions.append(f'{column} <= ?')
+                params.append(high)
+        key = 'id' if sort is None else self.SORT_SQL[sort]
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        added, deleted = self._pending()
+        extra = [t for t in added.values()
+                 if self._matches(t, tokens, category, type_key, date_range, amount_range)]
+        if extra:
+            # Queued adds are merged in by sort key, so the keys are read too.
+            rows = self.conn.execute(f'SELECT {key}, id FROM transactions{where} ORDER BY {key}, id', params)
+            keyed = [row for row in rows if row[1] not in deleted and row[1] not in added]
+            keyed.extend((self._sort_key(t, sort), t['id']) for t in extra)
+            ids = np.array([row[1] for row in sorted(keyed)], dtype=np.int64)
+        else:
+            rows = self.conn.execute(f'SELECT id FROM transactions{where} ORDER BY {key}, id', params)
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64)
+            if deleted or added:
+                ids = ids[~np.isin(ids, np.fromiter(itertools.chain(deleted, added), dtype=np.int64))]
+        # Ties keep ledger order, reversed along with the rest.
+        return ids[::-1] if sort is not None and descending else ids
+
+    def _matches(self, transaction, tokens, category, type_key, date_range, amount_range):
+        # The search conditions, for a row that is still queued.
+        if tokens and not self._matches_tokens(transaction['description'], ' '.join(tokens)):
+            return False
+        if category is not None and transaction['category'] != category:
+            return False
+        if type_key is not None and transaction['type'] != type_key:
+            return False
+        for column, bounds in (('date', date_range), ('amount', amount_range)):
+            low, high = bounds if bounds is not None else (None, None)
+            if (low is not None and transaction[column] < low) or (high is not None and transaction[column] > high):
+                return False
+        return True
+
+    def _sort_key(self, transaction, sort):
+        if sort is None:
+            return transaction['id']
+        if sort == 'type':
+            return TRANSACTION_TYPES.index(transaction['type'])
+        return transaction[sort]
+
+    def clear(self):
+        self._set_ids(np.empty(0, dtype=np.int64))
+        self._queue(('clear',))
+
+    def restore(self, store):
+        # The writer gets its own copy to turn into rows.
+        store = store.copy()
+        self._set_ids(store.columns['id'][:store.size].copy())
+        self.next_id = max(self.next_id, store.next_id)
+        self._queue(('restore', store))
+
+    def aggregate_groups(self):
+        self.writer.flush()
+        return iter(self.conn.execute(self.AGGREGATE_SQL).fetchall())
+
+    def snapshot(self):
+        self.writer.flush()
+        return self._read_store(self.conn)
+
+    def export(self, path):
+        # Read on the writer thread, after the changes queued before it.
+        self.writer.submit(lambda: export_ledger(path, self._read_store(self._writer_connection())), label='export')
+
+    def _read_store(self, conn):
+        store = ColumnarTransactionStore()
+        cursor = conn.execute(f'{self.ROW_SQL} ORDER BY id')
+        while True:
+            batch = cursor.fetchmany(5000)
+            if not batch:
+                break
+            store.extend([dict(zip(self.FIELDS, row)) for row in batch])
+        store.next_id = max(store.next_id, self.next_id)
+        return store
+
+    def _queue(self, op):
+        with self._ops_lock:
+            self._ops.append(op)
+        self.writer.submit(self._write_ops, key='sqlite', label='sqlite')
+
+    def _wal_size(self):
+        try:
+            return os.path.getsize(str(self.path) + '-wal')
+        except OSError:
+            return 0
+
+    def _writer_connection(self):
+        if self._writer_conn is None:
+            self._writer_conn = sqlite3.connect(self.path)
+            self._writer_conn.execute('PRAGMA synchronous=NORMAL')
+        return self._writer_conn
+
+    def _write_ops(self):
+        # Runs on the writer thread. The operations stay queued, for reads
+        # to overlay, until their transaction is committed (or has failed
+        # and been reported). What was written is measured as the growth of
+        # the WAL file, which starts over after a checkpoint.
+        with self._ops_lock:
+            ops = list(self._ops)
+        if not ops:
+            return 0
+        try:
+            return self._commit_ops(ops)
+        finally:
+            with self._ops_lock:
+                del self._ops[:len(ops)]
+
+    def _commit_ops(self, ops):
+        wal_before = self._wal_size()
+        conn = self._writer_connection()
+        with conn:
+            for op in ops:
+                if op[0] in ('add', 'restore'):
+                    rows = op[1] if op[0] == 'add' else op[1].slice()
+                    conn.executemany(
+                        f'INSERT INTO transactions (id, {self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        ([t['id']] + [t[field] for field in TRANSACTION_FIELDS] for t in rows))
+                    if self.fts:
+                        conn.executemany('INSERT INTO transactions_fts (rowid, description) VALUES (?, ?)',
+                                         ((t['id'], t['description']) for t in rows))
+                    self._update_rollups(conn, rows, 1)
+                elif op[0] == 'delete':
+                    ids = [t['id'] for t in op[1]]
+                    for start in range(0, len(ids), self.CHUNK):
+                        chunk = ids[start:start + self.CHUNK]
+                        placeholders = ', '.join('?' * len(chunk))
+                        conn.execute(f'DELETE FROM transactions WHERE id IN ({placeholders})', chunk)
+                        if self.fts:
+                            conn.execute(f'DELETE FROM transactions_fts WHERE rowid IN ({placeholders})', chunk)
+                    self._update_rollups(conn, op[1], -1)
+                else:
+                    conn.execute('DELETE FROM transactions')
+                    conn.execute('DELETE FROM rollups')
+                    if self.fts:
+                        conn.execute('DELETE FROM transactions_fts')
+        wal_after = self._wal_size()
+        return wal_after - wal_before if wal_after >= wal_before else wal_after
+
+    def _update_rollups(self, conn, transactions, sign):
+        groups = {}
+        for t in transactions:
+            entry = groups.get((t['date'], t['category'], t['type']))
+            if entry is None:
+                entry = groups[(t['date'], t['category'], t['type'])] = [0.0, 0]
+            entry[0] += sign * t['amount']
+            entry[1] += sign
+        conn.executemany(self.ROLLUP_SQL, [key + tuple(entry) for key, entry in groups.items()])
+        if sign < 0:
+            conn.execute('DELETE FROM rollups WHERE count <= 0')
+
+    def read_batches(self, batch_size=5000):
+        # Only the aggregates, from the rollups table, and the ids are
+        # loaded, on a connection owned by the loader thread; rows stay in
+        # the table and are read as they are shown.
+        conn = sqlite3.connect(self.path)
+        try:
+            groups = conn.execute(self.AGGREGATE_SQL).fetchall()
+            yield 'groups', groups, 1, 2
+            ids = np.fromiter((row[0] for row in conn.execute('SELECT id FROM transactions ORDER BY id')),
+                              dtype=np.int64)
+        finally:
+            conn.close()
+        yield 'ids', ids, 2, 2
+
+    def apply_loaded(self, op, payload):
+        if op == 'ids':
+            self._set_ids(payload)
+        return [], []
+
+    def get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _close_writer_conn(self):
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
+
+    def close(self):
+        self.writer.submit(self._close_writer_conn)
+        self.writer.flush()
+        self.writer.close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+_PERIOD_KEYS = {}
+
+def period_keys(day):
+    # (day, ISO week, month, year) keys of a 'YYYY-MM-DD' date; memoized since
+    # every mutation goes through here.
+    keys = _PERIOD_KEYS.get(day)
+    if keys is None:
+        try:
+            year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+            week_key = f'{year}-W{week:02d}'
+        except ValueError:
+            week_key = ''
+        keys = _PERIOD_KEYS[day] = (day, week_key, day[:7], day[:4])
+    return keys
+
+def report_periods(report, today):
+    # Granularity and period keys, oldest first, of the period reports.
+    if report == 'daily':
+        return 'day', [(today - timedelta(days=n)).isoformat() for n in range(29, -1, -1)]
+    if report == 'weekly':
+        return 'week', [period_keys((today - timedelta(weeks=n)).isoformat())[1] for n in range(11, -1, -1)]
+    if report == 'monthly':
+        return 'month', [f'{today.year}-{month:02d}' for month in range(1, 13)]
+    months = [today.year * 12 + today.month - 1 - n for n in range(11, -1, -1)]
+    return 'month', [f'{month // 12}-{month % 12 + 1:02d}' for month in months]
+
+class UndoLog:
+    # Undo/redo history of ledger edits as compact commands, never copies of
+    # the ledger: ('add', rows) and ('delete', rows) hold only the rows an
+    # edit touched, ('clear', store) a columnar copy of the cleared ledger.
+    # Undo and redo go through the repository and the AggregateCache like
+    # any edit, in time proportional to the rows of the command.
+    #
+    # Rows that are added back get fresh ids, so the commands still in the
+    # history are rewritten to the new ids; a redone clear keeps a copy of
+    # the ledger as it is at that point.
+    #
+    # The oldest commands are dropped once the history holds more than
+    # `limit` commands or an estimated `budget` bytes. A command that alone
+    # exceeds the budget is not kept, and empties the history, as older
+    # commands no longer apply on top of it.
+    ROW_BYTES = 600
+    STORE_ROW_BYTES = 64
+
+    def __init__(self, budget=64 * 1024 * 1024, limit=200):
+        self.budget = budget
+        self.limit = limit
+        self.undo_stack = deque()
+        self.redo_stack = []
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def cost(self, kind, count):
+        return count * (self.STORE_ROW_BYTES if kind == 'clear' else self.ROW_BYTES)
+
+    def size(self):
+        return sum(self.cost(kind, len(rows)) for kind, rows in list(self.undo_stack) + self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def record(self, kind, rows):
+        # Returns False when the edit is too large to undo.
+        if kind != 'clear' and not rows:
+            return True
+        self.redo_stack.clear()
+        if self.cost(kind, len(rows)) > self.budget:
+            self.clear()
+            return False
+        self.undo_stack.append((kind, rows))
+        while len(self.undo_stack) > self.limit or self.size() > self.budget:
+            self.undo_stack.popleft()
+        return True
+
+    def undo(self, repository, aggregates):
+        # Returns the (added, deleted) row counts, or None with nothing to
+        # undo.
+        if not self.undo_stack:
+            return None
+        kind, rows = self.undo_stack.pop()
+        if kind == 'add':
+            changes = 0, len(self._delete(repository, aggregates, rows))
+        elif kind == 'delete':
+            rows = self._add(repository, aggregates, [dict(row) for row in rows])
+            changes = len(rows), 0
+        else:
+            changes = self._restore(repository, aggregates, rows), 0
+        self.redo_stack.append((kind, rows))
+        return changes
+
+    def redo(self, repository, aggregates):
+        if not self.redo_stack:
+            return None
+        kind, rows = self.redo_stack.pop()
+        if kind == 'add':
+            rows = self._add(repository, aggregates, [dict(row) for row in rows])
+            changes = len(rows), 0
+        elif kind == 'delete':
+            changes = 0, len(self._delete(repository, aggregates, rows))
+        else:
+            rows = repository.snapshot()
+            changes = 0, len(rows)
+            repository.clear()
+            aggregates.clear()
+        self.undo_stack.append((kind, rows))
+        return changes
+
+    def _add(self, repository, aggregates, rows):
+        # Re-added rows get fresh ids, written into the dicts, so callers pass
+        # copies: a backend may still hold the earlier dicts in its queue.
+        old_ids = [row['id'] for row in rows]
+        repository.add_many(rows)
+        for row in rows:
+            aggregates.add(row)
+        self._remap({old_id: row['id'] for old_id, row in zip(old_ids, rows) if old_id != row['id']})
+        return rows
+
+    def _remap(self, new_ids):
+        # Points the commands left in the history at the rows' new ids, with
+        # new dicts for the same reason as above.
+        if not new_ids:
+            return
+        for stack in (self.undo_stack, self.redo_stack):
+            for i, (kind, rows) in enumerate(stack):
+                if kind != 'clear' and any(row['id'] in new_ids for row in rows):
+                    stack[i] = (kind, [dict(row, id=new_ids[row['id']]) if row['id'] in new_ids else row
+                                       for row in rows])
+
+    def _restore(self, repository, aggregates, store):
+        # Undoing a clear: whatever came after it has been undone, so the
+        # ledger is empty and the cleared one goes back wholesale, with its
+        # ids, and its aggregates as groups instead of row by row.
+        if repository.count():
+            return len(self._add(repository, aggregates, store.slice()))
+        repository.restore(store)
+        for group in store.aggregate_groups():
+            aggregates.add_group(*group)
+        return len(store)
+
+    def _delete(self, repository, aggregates, rows):
+        deleted = repository.delete_ids([row['id'] for row in rows])
+        for row in deleted:
+            aggregates.remove(row)
+        return deleted
+
+def report_series(aggregates, report, today, categories):
+    # (labels, [(key, values)]) of a report, read only from the aggregate and
+    # rollup tables; key is a transaction type, or a year for 'yoy'.
+    if report == 'categories':
+        expense_totals = aggregates.category_totals('expense')
+        return list(categories), [('expense', [expense_totals.get(cat, 0.0) for cat in categories])]
+    if report == 'yoy':
+        months = [f'{month:02d}' for month in range(1, 13)]
+        return months, [(str(year), aggregates.period_totals('month', [f'{year}-{month}' for month in months], 'expense'))
+                        for year in (today.year - 1, today.year)]
+    granularity, periods = report_periods(report, today)
+    labels = [period[5:] for period in periods] if granularity == 'day' else periods
+    return labels, [(type_key, aggregates.period_totals(granularity, periods, type_key))
+                    for type_key in TRANSACTION_TYPES]
+
+class AggregateCache:
+    # Running totals keyed by type and (type, category), plus rollup tables
+    # keyed by (period, category, type) for each granularity. Each entry is
+    # [amount, count]; an entry whose count drops to zero is removed so
+    # deleted groups don't leave floating point residue behind.
+    GRANULARITIES = ('day', 'week', 'month', 'year')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.by_type = {}
+        self.by_category = {}
+        self.rollups = {granularity: {} for granularity in self.GRANULARITIES}
+
+    def rebuild(self, groups):
+        self.clear()
+        for type_key, category, day, amount, count in groups:
+            self.add_group(type_key, category, day, amount, count)
+
+    def add_group(self, type_key, category, day, amount, count):
+        self._bump(self.by_type, type_key, amount, count)
+        self._bump(self.by_category, (type_key, category), amount, count)
+        for granularity, period in zip(self.GRANULARITIES, period_keys(day)):
+            self._bump(self.rollups[granularity], (period, category, type_key), amount, count)
+
+    def _bump(self, table, key, amount, count):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0.0, 0]
+        entry[0] += amount
+        entry[1] += count
+        if entry[1] <= 0:
+            del table[key]
+
+    def add(self, transaction):
+        self.add_group(transaction['type'], transaction['category'], transaction['date'],
+                       transaction['amount'], 1)
+
+    def remove(self, transaction):
+        self.add_group(transaction['type'], transaction['category'], transaction['date'],
+                       -transaction['amount'], -1)
+
+    def total(self, type_key):
+        entry = self.by_type.get(type_key)
+        return entry[0] if entry else 0.0
+
+    def count(self):
+        return sum(entry[1] for entry in self.by_type.values())
+
+    def category_totals(self, type_key):
+        return {category: entry[0] for (t, category), entry in self.by_category.items() if t == type_key}
+
+    def amount(self, granularity, period, category, type_key):
+        entry = self.rollups[granularity].get((period, category, type_key))
+        return entry[0] if entry else 0.0
+
+    def period_totals(self, granularity, periods, type_key):
+        # One lookup per (period, category) in the rollup table.
+        table = self.rollups[granularity]
+        categories = [category for t, category in self.by_category if t == type_key]
+        totals = []
+        for period in periods:
+            total = 0.0
+            for category in categories:
+                entry = table.get((period, category, type_key))
+                if entry is not None:
+                    total += entry[0]
+            totals.append(total)
+        return totals
+
+class TransactionSearchIndex:
+    # Search structures over the rows of a ColumnarTransactionStore: an
+    # inverted index from description tokens to description string codes, and
+    # for each sortable column the slots presorted by its value. Descriptions
+    # are interned, so each distinct text is tokenized once; a query turns
+    # every facet into a boolean mask over the store's slots and returns the
+    # ids of the live matches, in ledger order or in one column's order.
+    #
+    # Appended slots [merged, size) join the presorted arrays in one merge
+    # before the next query that sorts or takes a range, so an add never
+    # pays for an insert into arrays of the whole ledger.
+    TOKEN_PATTERN = re.compile(r'\w+')
+    SORT_COLUMNS = ('date', 'amount', 'category', 'type')
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self.merged = 0
+        self.postings = {}
+        self.tokens = []
+        self.indexed_codes = np.zeros(0, dtype=bool)
+        # column -> (slots, their values), both in ascending value order
+        self.orders = {name: (np.empty(0, dtype=np.int64), np.empty(0, dtype=store.DTYPES[name]))
+                       for name in self.SORT_COLUMNS}
+        self.index_rows(0)
+        self._merge_pending()
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.TOKEN_PATTERN.findall(text.casefold())
+
+    def index_rows(self, start):
+        # Indexes store rows [start, len(store)) after they were appended.
+        store = self.store
+        end = store.size
+        if end <= start:
+            return
+        columns = store.columns
+        string_count = len(store.strings)
+        if string_count > len(self.indexed_codes):
+            grown = np.zeros(max(string_count, 2 * len(self.indexed_codes)), dtype=bool)
+            grown[:len(self.indexed_codes)] = self.indexed_codes
+            self.indexed_codes = grown
+        codes = np.unique(columns['description'][start:end])
+        codes = codes[~self.indexed_codes[codes]]
+        self.indexed_codes[codes] = True
+        new_tokens = []
+        for i, code in enumerate(codes.tolist()):
+            if not i % 256:
+                # Yields the GIL, so a build on the loader thread doesn't
+                # stall the GUI thread for a whole switch interval at a time.
+                time.sleep(0)
+            for token in set(self.tokenize(store.strings[code])):
+                holders = self.postings.get(token)
+                if holders is None:
+                    holders = self.postings[token] = []
+                    new_tokens.append(token)
+                holders.append(code)
+        if len(new_tokens) > 64:
+            self.tokens = sorted(self.postings)
+        else:
+            for token in new_tokens:
+                bisect.insort(self.tokens, token)
+        self.size = end
+
+    def _merge_pending(self):
+        # Bisects the appended slots into the presorted arrays; ties keep
+        # ledger order since new slots always go to the right.
+        start, end = self.merged, self.size
+        if end <= start:
+            return
+        columns = self.store.columns
+        for name, (order, values) in self.orders.items():
+            new_values = columns[name][start:end]
+            new_order = np.argsort(new_values, kind='stable')
+            new_sorted = new_values[new_order]
+            at = np.searchsorted(values, new_sorted, side='right')
+            self.orders[name] = np.insert(order, at, new_order + start), np.insert(values, at, new_sorted)
+        self.merged = end
+
+    def compact(self, keep):
+        # Follows ColumnarTransactionStore.compact(): slots shift down over the
+        # dropped ones. Postings point at string codes, not slots, so they stay
+        # valid.
+        if keep is None:
+            return
+        new_slots = np.cumsum(keep) - 1
+        for name, (order, values) in self.orders.items():
+            kept = keep[order]
+            self.orders[name] = (new_slots[order[kept]], values[kept])
+        # Appends not merged yet stay the last slots, behind the merged ones.
+        self.merged = int(np.count_nonzero(keep[:self.merged]))
+        self.size = int(new_slots[-1]) + 1 if len(new_slots) else 0
+
+    def _description_codes(self, token):
+        # Prefix match, so results update while a word is being typed.
+        codes = np.zeros(len(self.indexed_codes), dtype=bool)
+        start = bisect.bisect_left(self.tokens, token)
+        for candidate in self.tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            codes[self.postings[candidate]] = True
+        return codes
+
+    def sorted_slots(self, column):
+        self._merge_pending()
+        order, values = self.orders[column]
+        if column == 'category':
+            # Presorted by category code; the runs of each code are put in
+            # name order here, there are only ever a handful of them.
+            pool = self.store.categories
+            bounds = np.searchsorted(values, np.arange(len(pool) + 1))
+            order = np.concatenate([order[bounds[code]:bounds[code + 1]]
+                                    for code in sorted(range(len(pool)), key=pool.__getitem__)] + [order[:0]])
+        return order
+
+    def _in_range(self, column, low, high):
+        self._merge_pending()
+        order, values = self.orders[column]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+        inside = np.zeros(self.size, dtype=bool)
+        inside[order[start:stop]] = True
+        return inside
+
+    def search(self, text='', category=None, type_key=None, date_range=None, amount_range=None,
+               sort=None, descending=False):
+        columns = self.store.columns
+        size = self.size
+        mask = self.store.alive[:size].copy()
+        codes = None
+        for token in self.tokenize(text):
+            matched = self._description_codes(token)
+            codes = matched if codes is None else codes & matched
+        if codes is not None:
+            mask &= codes[columns['description'][:size]]
+        if category is not None:
+            pool = self.store.categories
+            wanted = [code for code in range(len(pool)) if pool[code] == category]
+            mask &= np.isin(columns['category'][:size], wanted) if len(wanted) != 1 else columns['category'][:size] == wanted[0]
+        if type_key is not None:
+            mask &= columns['type'][:size] == TRANSACTION_TYPES.index(type_key)
+        if date_range is not None:
+            low, high = (None if bound is None else np.datetime64(bound, 'D') for bound in date_range)
+            mask &= self._in_range('date', low, high)
+        if amount_range is not None:
+            mask &= self._in_range('amount', *amount_range)
+        if sort is None:
+            return columns['id'][:size][mask]
+        order = self.sorted_slots(sort)
+        if descending:
+            order = order[::-1]
+        return columns['id'][order[mask[order]]]
+
+def export_ledger(path, transactions):
+    # Export behind "Save Transactions to File": a binary snapshot for .bin,
+    # otherwise the original JSON list, written to a temp file and renamed.
+    if str(path).endswith('.bin'):
+        return write_binary_snapshot(path, transactions)
+    return atomic_write_json(path, list(transactions), indent=4)
+
+def migrate_json_to_sqlite(json_path, repository):
+    # One-shot import of the JSON ledger (snapshot plus journal) into an
+    # SQLite repository; remembered in the meta table so it never reruns.
+    journal = TransactionJournal(json_path)
+    if repository.get_meta('migrated_from') is not None or not journal.exists():
+        return 0
+    transactions = journal.load()
+    for transaction in transactions:
+        transaction.pop('id', None)
+    repository.add_many(transactions)
+    repository.flush()
+    repository.set_meta('migrated_from', str(json_path))
+    return len(transactions)
+
+def open_repository(storage='json', base_name='budget_transactions', indexed=True):
+    if storage == 'sqlite':
+        repository = SqliteTransactionRepository(base_name + '.db')
+        repository.begin_load()
+        migrate_json_to_sqlite(base_name + '.json', repository)
+        return repository
+    return JsonTransactionRepository(base_name + '.json', indexed)
+
+def load_ledger(repository, aggregates=None):
+    # Synchronous load for callers without a loader thread.
+    repository.begin_load()
+    for op, payload, done, total in repository.read_batches():
+        if op == 'groups':
+            if aggregates is not None:
+                for group in payload:
+                    aggregates.add_group(*group)
+            continue
+        added, deleted = repository.apply_loaded(op, payload)
+        if aggregates is not None:
+            for transaction in added:
+                aggregates.add(transaction)
+            for transaction in deleted:
+                aggregates.remove(transaction)
+
+class StatementReader:
+    # Streams a bank statement (CSV or OFX/QFX) into batches of transaction
+    # dicts for BatchLoader. CSV columns are mapped through column_map
+    # ({field: header}, an empty header for a field the file doesn't have);
+    # fields left out are guessed from the header row. Negative amounts
+    # become expenses unless a type column says otherwise.
+    #
+    # The date format is fixed before the first row is read: date_format if
+    # given, else the one format that reads the dates of the first
+    # DATE_SAMPLE_ROWS rows. A file whose dates read differently under two
+    # formats (01/02 as 1 Feb and as 2 Jan) is refused rather than guessed.
+    CSV_HEADERS = {
+        'date': ('date', 'transaction date', 'posting date', 'posted', 'booking date', 'value date'),
+        'amount': ('amount', 'value', 'sum', 'transaction amount'),
+        'debit': ('debit', 'withdrawal', 'paid out'),
+        'credit': ('credit', 'deposit', 'paid in'),
+        'description': ('description', 'memo', 'details', 'payee', 'narrative', 'name', 'reference'),
+        'category': ('category',),
+        'type': ('type',),
+    }
+    DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%d.%m.%Y', '%d-%m-%Y', '%Y%m%d')
+    DATE_SAMPLE_ROWS = 1000
+    OFX_TAG = re.compile(r'<(/?[A-Za-z0-9.]+)>([^<]*)')
+
+    def __init__(self, path, categories, column_map=None, date_format=None):
+        self.path = Path(path)
+        self.categories = categories
+        self.column_map = column_map or {}
+        self.date_format = date_format
+        self.invalid = 0
+        self._parsed_dates = {}
+        self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def read_batches(self, batch_size=5000):
+        total = self.path.stat().st_size
+        with open(self.path, 'rb') as raw:
+            if self.path.suffix.lower() in ('.ofx', '.qfx'):
+                rows = self._iter_ofx(raw)
+            else:
+                rows = self._iter_csv(raw)
+            batch = []
+            for transaction in rows:
+                batch.append(transaction)
+                if len(batch) >= batch_size:
+                    yield 'import', batch, raw.tell(), total
+                    batch = []
+            if batch:
+                yield 'import', batch, total, total
+
+    @staticmethod
+    def date_format_label(date_format):
+        return date_format.replace('%Y', 'YYYY').replace('%m', 'MM').replace('%d', 'DD')
+
+    def is_csv(self):
+        return self.path.suffix.lower() not in ('.ofx', '.qfx')
+
+    def read_header(self):
+        # The CSV header row as written, for picking a column_map.
+        with open(self.path, 'rb') as raw:
+            return [name.strip() for name in next(self._csv_rows(self._csv_reader(raw)), [])]
+
+    def guess_columns(self, header):
+        # {field: header} of the columns the header row maps to by itself.
+        return {field: header[index] for field, index in self._map_columns(header, guess=True).items()}
+
+    def _csv_reader(self, raw):
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        try:
+            sample = text.read(4096)
+        except UnicodeDecodeError as e:
+            raise ValueError(f'{self.path.name}: not a UTF-8 text file ({e.reason})') from e
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        return csv.reader(text, dialect)
+
+    def _csv_rows(self, reader):
+        # A malformed file (an unclosed quote running into the field size
+        # limit, bytes that aren't UTF-8) ends the import as a ValueError
+        # naming the line, like any other unreadable statement.
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                raise ValueError(f'{self.path.name}: line {reader.line_num}: {e}') from e
+            except UnicodeDecodeError as e:
+                raise ValueError(f'{self.path.name}: line {reader.line_num + 1}: not UTF-8 text ({e.reason})') from e
+            yield row
+
+    def _iter_csv(self, raw):
+        reader = self._csv_reader(raw)
+        rows = self._csv_rows(reader)
+        header = next(rows, [])
+        columns = self._map_columns(header)
+        if 'date' not in columns or not ('amount' in columns or 'debit' in columns or 'credit' in columns):
+            raise ValueError(f'{self.path.name}: no date/amount columns in header {header}')
+        sample = list(itertools.islice(rows, self.DATE_SAMPLE_ROWS))
+        if self.date_format is None:
+            date_column = columns['date']
+            dates = Counter(row[date_column].strip() for row in sample if date_column < len(row))
+            dates.pop('', None)
+            self.date_format = self._detect_date_format(dates)
+        for row in itertools.chain(sample, rows):
+            if not any(row):
+                continue
+            try:
+                values = {field: row[index].strip() for field, index in columns.items() if index < len(row)}
+                if values.get('amount'):
+                    amount = self._parse_amount(values['amount'])
+                else:
+                    amount = (self._parse_amount(values.get('credit') or '0')
+                              - abs(self._parse_amount(values.get('debit') or '0')))
+                yield self._transaction(self._parse_date(values['date']), amount,
+                                        values.get('description', ''), values.get('category'),
+                                        values.get('type'))
+            except (KeyError, ValueError):
+                self.invalid += 1
+
+    def _map_columns(self, header, guess=False):
+        header = [name.strip().lower() for name in header]
+        columns = {}
+        for field, names in self.CSV_HEADERS.items():
+            if field in self.column_map and not guess:
+                wanted = (self.column_map[field] or '').strip().lower()
+                if not wanted:
+                    continue
+                if wanted not in header:
+                    raise ValueError(f'{self.path.name}: no column {self.column_map[field]!r} for {field}')
+                columns[field] = header.index(wanted)
+                continue
+            for name in names:
+                if name in header:
+                    columns[field] = header.index(name)
+                    break
+        return columns
+
+    def _detect_date_format(self, texts):
+        # texts counts the rows of each sampled date. Of the formats that
+        # read the most rows, the first one, provided the others read every
+        # one of those dates the same way.
+        readings = []
+        for date_format in self.DATE_FORMATS:
+            parsed = {}
+            for text in texts:
+                try:
+                    parsed[text] = datetime.strptime(text, date_format).date()
+                except ValueError:
+                    pass
+            if parsed:
+                readings.append((sum(texts[text] for text in parsed), date_format, parsed))
+        if not readings:
+            if texts:
+                raise ValueError(f'{self.path.name}: unrecognized dates such as {min(texts)!r}')
+            return None
+        most = max(count for count, _, _ in readings)
+        readings = [reading for reading in readings if reading[0] == most]
+        _, date_format, parsed = readings[0]
+        for _, other_format, other in readings[1:]:
+            for text in sorted(parsed):
+                if other.get(text) != parsed[text]:
+                    raise ValueError(
+                        f'{self.path.name}: dates such as {text!r} read both as '
+                        f'{self.date_format_label(date_format)} and {self.date_format_label(other_format)}; '
+                        f'choose the date format')
+        return date_format
+
+    def _iter_ofx(self, raw):
+        # OFX dates always start with YYYYMMDD.
+        self.date_format = '%Y%m%d'
+        fields = None
+        for tag, value in self._iter_ofx_tags(raw):
+            if tag == 'STMTTRN':
+                fields = {}
+            elif tag == '/STMTTRN' and fields is not None:
+                try:
+                    description = ' - '.join(dict.fromkeys(
+                        fields[name] for name in ('NAME', 'MEMO') if fields.get(name)))
+                    yield self._transaction(self._parse_date(fields['DTPOSTED'][:8]),
+                                            self._parse_amount(fields['TRNAMT']), description)
+                except (KeyError, ValueError):
+                    self.invalid += 1
+                fields = None
+            elif fields is not None and value:
+                fields[tag] = value
+
+    def _iter_ofx_tags(self, raw):
+        # Works for both SGML (OFX 1.x, unclosed leaf tags) and XML (OFX 2.x)
+        # by scanning <TAG>value pairs; the text after the last '<' of each
+        # chunk is held back in case the tag continues in the next one.
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = ''
+        while True:
+            chunk = raw.read(1 << 20)
+            buffer += decoder.decode(chunk, final=not chunk)
+            cut = buffer.rfind('<') if chunk else len(buffer)
+            if cut > 0:
+                for match in self.OFX_TAG.finditer(buffer, 0, cut):
+                    yield match.group(1).upper(), match.group(2).strip()
+                buffer = buffer[cut:]
+            if not chunk:
+                break
+
+    def _parse_amount(self, text):
+        text = text.replace('\u00a0', '').replace(' ', '')
+        negative = text.startswith('(') and text.endswith(')')
+        text = re.sub(r'[^0-9,.\-+]', '', text)
+        if ',' in text and '.' in text:
+            text = text.replace(',', '') if text.rfind('.') > text.rfind(',') else text.replace('.', '').replace(',', '.')
+        elif ',' in text:
+            text = text.replace(',', '.') if len(text) - text.rfind(',') == 3 else text.replace(',', '')
+        amount = float(text)
+        return -abs(amount) if negative else amount
+
+    def _parse_date(self, text):
+        # Statements repeat a few hundred distinct dates over many rows, so
+        # parsed dates are memoized; strptime dominated large imports.
+        parsed = self._parsed_dates.get(text)
+        if parsed is None:
+            parsed = self._parsed_dates[text] = self._strptime(text.strip())
+        return parsed
+
+    def _strptime(self, text):
+        if self.date_format is None:
+            raise ValueError(f'Unrecognized date {text!r}')
+        return datetime.strptime(text, self.date_format).strftime('%Y-%m-%d')
+
+    def _transaction(self, date, amount, description, category=None, type_text=None):
+        type_key = type_text.lower() if type_text and type_text.lower() in TRANSACTION_TYPES else None
+        if type_key is None:
+            type_key = 'expense' if amount < 0 else 'income'
+        return {
+            'amount': abs(amount),
+            'category': category if category in self.categories else CategoryBudgets.FALLBACK_CATEGORY,
+            'type': type_key,
+            'date': date,
+            'description': description,
+            'timestamp': self.timestamp,
+        }
+
+class DuplicateFilter:
+    # Multiset of (date, signed amount, description) keys already in the
+    # ledger. Keys are loaded one date at a time, only for dates an import
+    # actually contains, so large ledgers are never scanned in full. Repeated
+    # rows inside one statement are kept unless the ledger already has them.
+    def __init__(self, repository):
+        self.repository = repository
+        self.known = Counter()
+        self.loaded_dates = set()
+        self.skipped = 0
+
+    @staticmethod
+    def key(transaction):
+        amount = transaction['amount'] if transaction['type'] == 'income' else -transaction['amount']
+        return transaction['date'], round(amount, 2), transaction['description'].strip()
+
+    def filter(self, batch):
+        new_dates = {transaction['date'] for transaction in batch} - self.loaded_dates
+        if new_dates:
+            self.known.update(self.key(transaction) for transaction in self.repository.find_by_dates(new_dates))
+            self.loaded_dates |= new_dates
+        fresh = []
+        for transaction in batch:
+            key = self.key(transaction)
+            if self.known[key] > 0:
+                self.known[key] -= 1
+                self.skipped += 1
+            else:
+                fresh.append(transaction)
+        return fresh
+
+class RecurringSchedule:
+    # Day-level subset of cron. A spec is 'daily', 'weekly:<weekday>',
+    # 'monthly:<day>' (clamped to the month's last day) or the three cron
+    # fields '<day of month> <month> <weekday>', each '*', numbers, a-b ranges
+    # and /steps, comma separated. Weekdays count from Sunday = 0 (7 is also
+    # Sunday) and, as in cron, a day matches either restricted day field.
+    FIELD_RANGES = ((1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        kind, _, arg = self.spec.partition(':')
+        self.monthly_day = None
+        if kind == 'daily':
+            fields = '* * *'
+        elif kind == 'weekly':
+            fields = f'* * {int(arg)}'
+        elif kind == 'monthly':
+            self.monthly_day = int(arg)
+            if not 1 <= self.monthly_day <= 31:
+                raise ValueError(f'Invalid schedule {spec!r}')
+            fields = '* * *'
+        else:
+            fields = self.spec
+        parts = fields.split()
+        if len(parts) != 3:
+            raise ValueError(f'Invalid schedule {spec!r}')
+        self.days, self.months, self.weekdays = (
+            self._parse_field(part, low, high) for part, (low, high) in zip(parts, self.FIELD_RANGES))
+        self.weekdays = frozenset(weekday % 7 for weekday in self.weekdays)
+        self.any_day = parts[0] == '*'
+        self.any_weekday = parts[2] == '*'
+
+    @staticmethod
+    def _parse_field(text, low, high):
+        values = set()
+        for part in text.split(','):
+            base, slash, step = part.partition('/')
+            step = int(step) if slash else 1
+            if base == '*':
+                start, stop = low, high
+            elif '-' in base:
+                start, stop = (int(value) for value in base.split('-', 1))
+            else:
+                start = int(base)
+                stop = high if slash else start
+            if step < 1 or not low <= start <= stop <= high:
+                raise ValueError(f'Invalid schedule field {text!r}')
+            values.update(range(start, stop + 1, step))
+        return frozenset(values)
+
+    def matches(self, day):
+        if day.month not in self.months:
+            return False
+        if self.monthly_day is not None:
+            next_month = day.replace(day=28) + timedelta(days=4)
+            last_day = (next_month - timedelta(days=next_month.day)).day
+            return day.day == min(self.monthly_day, last_day)
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def occurrences(self, first, last):
+        # Matching dates in [first, last].
+        day = first
+        while day <= last:
+            if self.matches(day):
+                yield day
+            day += timedelta(days=1)
+
+class SettingsFile(ABC):
+    # A small JSON document next to the ledger. save() hands a copy of the
+    # current state to the ledger's PersistenceWriter, so it is written after
+    # the transactions queued before it.
+    def __init__(self, path):
+        self.path = Path(path)
+        self._pending = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self.from_json(data)
+
+    @abstractmethod
+    def from_json(self, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def to_json(self):
+        raise NotImplementedError
+
+    def save(self, writer):
+        self._pending = self.to_json()
+        writer.submit(self._write, key=str(self.path), label='settings')
+
+    def _write(self):
+        data = self._pending
+        if data is None:
+            return 0
+        return atomic_write_json(self.path, data, indent=4)
+
+class RecurringRules(SettingsFile):
+    # Recurring transactions. Each rule remembers the last day it was posted
+    # through, so due() posts every missed occurrence exactly once, however
+    # long the app was closed.
+    RULE_FIELDS = ('amount', 'category', 'type', 'description')
+
+    def __init__(self, path='budget_recurring.json'):
+        super().__init__(path)
+        self.rules = []
+        self.next_id = 1
+
+    def from_json(self, data):
+        self.rules = data.get('rules', [])
+        self.next_id = data.get('next_id', max((rule['id'] for rule in self.rules), default=0) + 1)
+
+    def add(self, transaction, schedule, start, ledger=None):
+        # start is the first day covered by the rule; an occurrence on it is
+        # taken to be the transaction that was just entered.
+        RecurringSchedule(schedule)
+        rule = {field: transaction[field] for field in self.RULE_FIELDS}
+        rule.update(id=self.next_id, schedule=schedule, start=start, last_posted=start,
+                    ledger=ledger or LedgerCatalog.DEFAULT_LEDGER)
+        self.next_id += 1
+        self.rules.append(rule)
+        return rule
+
+    def remove(self, rule_id):
+        self.rules = [rule for rule in self.rules if rule['id'] != rule_id]
+
+    def due(self, today, ledger=None):
+        # Transactions for every occurrence after each rule's last posting up
+        # to today; the rules are marked as posted through today. Rules of
+        # other ledgers wait until their ledger is open.
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        transactions = []
+        for rule in self.rules:
+            if rule.get('ledger', LedgerCatalog.DEFAULT_LEDGER) != (ledger or LedgerCatalog.DEFAULT_LEDGER):
+                continue
+            last_posted = rule.get('last_posted')
+            if last_posted is None:
+                first = datetime.strptime(rule['start'], '%Y-%m-%d').date()
+            else:
+                first = datetime.strptime(last_posted, '%Y-%m-%d').date() + timedelta(days=1)
+            if first > today:
+                continue
+            for day in RecurringSchedule(rule['schedule']).occurrences(first, today):
+                transaction = {field: rule[field] for field in self.RULE_FIELDS}
+                transaction.update(date=day.isoformat(), timestamp=timestamp)
+                transactions.append(transaction)
+            rule['last_posted'] = today.isoformat()
+        return transactions
+
+    def to_json(self):
+        return {'next_id': self.next_id, 'rules': [dict(rule) for rule in self.rules]}
+
+class CategoryBudgets(SettingsFile):
+    # User-defined categories and per-category spending limits. A limit is
+    # for one period granularity of the AggregateCache, and what was spent is
+    # read from its rollup for the current period, so checking a limit after
+    # a mutation is one dict lookup rather than a pass over the ledger.
+    DEFAULT_CATEGORIES = ('Food', 'Transportation', 'Utilities', 'Entertainment', 'Other')
+    FALLBACK_CATEGORY = 'Other'
+    PERIODS = ('week', 'month', 'year')
+
+    def __init__(self, path='budget_categories.json'):
+        super().__init__(path)
+        self.categories = list(self.DEFAULT_CATEGORIES)
+        self.limits = {}
+
+    def from_json(self, data):
+        # The list is updated in place, as the window and statement readers
+        # share it.
+        self.categories[:] = data.get('categories', self.DEFAULT_CATEGORIES)
+        if self.FALLBACK_CATEGORY not in self.categories:
+            self.categories.append(self.FALLBACK_CATEGORY)
+        self.limits = {category: limit for category, limit in data.get('limits', {}).items()
+                       if limit.get('period') in self.PERIODS}
+
+    def to_json(self):
+        return {'categories': list(self.categories), 'limits': {c: dict(l) for c, l in self.limits.items()}}
+
+    def add_category(self, name):
+        name = name.strip()
+        if not name or name in self.categories:
+            return False
+        self.categories.append(name)
+        return True
+
+    def remove_category(self, name):
+        # The fallback stays, imports file unknown categories under it.
+        if name == self.FALLBACK_CATEGORY or name not in self.categories:
+            return False
+        self.categories.remove(name)
+        self.limits.pop(name, None)
+        return True
+
+    def set_limit(self, category, amount, period='month'):
+        if amount is None:
+            self.limits.pop(category, None)
+        else:
+            self.limits[category] = {'amount': float(amount), 'period': period}
+
+    def status(self, aggregates, category, today):
+        # (spent, limit, period) for a category with a limit, else None.
+        limit = self.limits.get(category)
+        if limit is None:
+            return None
+        period = period_keys(today.isoformat())[AggregateCache.GRANULARITIES.index(limit['period'])]
+        return aggregates.amount(limit['period'], period, category, 'expense'), limit['amount'], limit['period']
+
+class LedgerCatalog(SettingsFile):
+    # Named ledgers, each with its own store files, plus the totals each one
+    # had when it was last open. Only the active ledger is ever loaded; the
+    # cached totals let an "all accounts" balance include the others.
+    DEFAULT_LEDGER = 'Main'
+
+    def __init__(self, path='budget_ledgers.json'):
+        super().__init__(path)
+        self.ledgers = {self.DEFAULT_LEDGER: {'base': 'budget_transactions', 'summary': None}}
+        self.active = self.DEFAULT_LEDGER
+        self.next_id = 1
+
+    def from_json(self, data):
+        self.ledgers = data.get('ledgers') or self.ledgers
+        self.next_id = data.get('next_id', len(self.ledgers))
+        self.active = data.get('active') if data.get('active') in self.ledgers else next(iter(self.ledgers))
+
+    def to_json(self):
+        return {'active': self.active, 'next_id': self.next_id,
+                'ledgers': {name: dict(ledger) for name, ledger in self.ledgers.items()}}
+
+    def names(self):
+        return list(self.ledgers)
+
+    def base_name(self, name):
+        return self.ledgers[name]['base']
+
+    def add(self, name):
+        # File names come from a counter, so any ledger name is safe to use.
+        name = name.strip()
+        if not name or name in self.ledgers:
+            return False
+        self.ledgers[name] = {'base': f'budget_ledger_{self.next_id}', 'summary': None}
+        self.next_id += 1
+        return True
+
+    def update_summary(self, name, aggregates, count):
+        self.ledgers[name]['summary'] = {'income': aggregates.total('income'),
+                                         'expense': aggregates.total('expense'), 'count': count}
+
+    def consolidated_balance(self, aggregates):
+        # Live totals for the active ledger, cached ones for the rest.
+        balance = aggregates.total('income') - aggregates.total('expense')
+        for name, ledger in self.ledgers.items():
+            summary = ledger['summary']
+            if name != self.active and summary:
+                balance += summary['income'] - summary['expense']
+        return balance
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def make_transaction():
+    def make(amount=10.0, category='Food', type_key='expense', date='2024-01-15', description='Coffee'):
+        return {
+            'amount': amount,
+            'category': category,
+            'type': type_key,
+            'date': date,
+            'description': description,
+            'timestamp': f'{date} 12:00:00',
+        }
+    return make
@@ -0,0 +1,116 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from ledger_core import AggregateCache, load_ledger, open_repository
+
+def random_transaction(rng, make_transaction):
+    # Dates around a new year, so ISO weeks cross a year boundary.
+    day = date(2023, 12, 20) + timedelta(days=rng.randrange(30))
+    return make_transaction(amount=rng.randrange(1, 100000) / 100, category=rng.choice(['Food', 'Utilities', 'Other']),
+                            type_key=rng.choice(['expense', 'expense', 'income']), date=day.isoformat())
+
+def recomputed(transactions):
+    aggregates = AggregateCache()
+    for transaction in transactions:
+        aggregates.add(transaction)
+    return aggregates
+
+def tables(aggregates):
+    rounded = lambda table: {key: (round(entry[0], 6), entry[1]) for key, entry in table.items()}
+    return (rounded(aggregates.by_type), rounded(aggregates.by_category),
+            {granularity: rounded(table) for granularity, table in aggregates.rollups.items()})
+
+def test_rollups_match_a_recompute_after_mixed_edits(make_transaction):
+    rng = random.Random(13)
+    aggregates = AggregateCache()
+    live = []
+    for step in range(600):
+        if step == 400:
+            aggregates.clear()
+            live = []
+        elif live and rng.random() < 0.4:
+            aggregates.remove(live.pop(rng.randrange(len(live))))
+        else:
+            live.append(random_transaction(rng, make_transaction))
+            aggregates.add(live[-1])
+        if step % 50 == 49:
+            assert tables(aggregates) == tables(recomputed(live))
+    assert tables(aggregates) == tables(recomputed(live))
+    assert aggregates.count() == len(live)
+    assert {'2023-W52', '2024-W01'} <= {period for period, _, _ in aggregates.rollups['week']}
+
+def test_removing_everything_leaves_no_entries(make_transaction):
+    aggregates = AggregateCache()
+    transactions = [make_transaction(amount=0.1), make_transaction(amount=0.2), make_transaction(amount=0.7)]
+    for transaction in transactions:
+        aggregates.add(transaction)
+    for transaction in transactions:
+        aggregates.remove(transaction)
+    assert tables(aggregates) == ({}, {}, {granularity: {} for granularity in AggregateCache.GRANULARITIES})
+
+@pytest.mark.parametrize('storage', ['json', 'sqlite'])
+def test_rollups_loaded_from_disk_match_a_recompute(storage, tmp_path, make_transaction):
+    rng = random.Random(29)
+    base = str(tmp_path / 'budget_transactions')
+    repository = open_repository(storage, base)
+    aggregates = AggregateCache()
+    load_ledger(repository, aggregates)
+    for step in range(40):
+        if step == 25:
+            repository.clear()
+            aggregates.clear()
+        elif step == 30:
+            # From here on the JSON ledger replays its journal over a snapshot.
+            repository.save()
+        elif repository.count() and rng.random() < 0.4:
+            positions = rng.sample(range(repository.count()), min(repository.count(), rng.randrange(1, 8)))
+            for transaction in repository.delete_ids(repository.ids_at(positions)):
+                aggregates.remove(transaction)
+        else:
+            rows = [random_transaction(rng, make_transaction) for _ in range(rng.randrange(1, 20))]
+            repository.add_many(rows)
+            for transaction in rows:
+                aggregates.add(transaction)
+    live = repository.fetch(0, repository.count())
+    assert tables(aggregates) == tables(recomputed(live))
+    repository.close()
+
+    reopened = open_repository(storage, base)
+    loaded = AggregateCache()
+    load_ledger(reopened, loaded)
+    assert tables(loaded) == tables(recomputed(reopened.fetch(0, reopened.count())))
+    assert tables(loaded) == tables(aggregates)
+    reopened.close()
+
+def test_sqlite_rollups_table_is_rebuilt_from_the_transactions(tmp_path, make_transaction):
+    path = tmp_path / 'budget_transactions.db'
+    repository = open_repository('sqlite', str(tmp_path / 'budget_transactions'))
+    load_ledger(repository)
+    rng = random.Random(41)
+    repository.add_many([random_transaction(rng, make_transaction) for _ in range(200)])
+    repository.delete_ids(repository.ids_at(range(0, 200, 3)))
+    repository.close()
+    group_sql = 'SELECT date, category, type, SUM(amount), COUNT(*) FROM transactions GROUP BY date, category, type'
+    rollup_sql = 'SELECT day, category, type, amount, count FROM rollups'
+    rounded = lambda rows: sorted(row[:3] + (round(row[3], 6), row[4]) for row in rows)
+    conn = sqlite3.connect(path)
+    expected = rounded(conn.execute(group_sql).fetchall())
+    assert rounded(conn.execute(rollup_sql).fetchall()) == expected
+    # A database from before the rollups table has it built from the
+    # transactions on open, whatever the table held.
+    with conn:
+        conn.execute("UPDATE rollups SET amount = amount + 1")
+        conn.execute("DELETE FROM meta WHERE key = 'rollups'")
+    conn.close()
+
+    reopened = open_repository('sqlite', str(tmp_path / 'budget_transactions'))
+    aggregates = AggregateCache()
+    load_ledger(reopened, aggregates)
+    assert tables(aggregates) == tables(recomputed(reopened.fetch(0, reopened.count())))
+    reopened.close()
+    conn = sqlite3.connect(path)
+    assert rounded(conn.execute(rollup_sql).fetchall()) == expected
+    conn.close()
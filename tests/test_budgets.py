@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from ledger_core import AggregateCache, CategoryBudgets
+
+TODAY = date(2024, 1, 17)
+
+@pytest.fixture
+def budgets(tmp_path):
+    budgets = CategoryBudgets(tmp_path / 'budget_categories.json')
+    budgets.set_limit('Food', 100, 'month')
+    budgets.set_limit('Transportation', 20, 'week')
+    budgets.set_limit('Entertainment', 50, 'year')
+    return budgets
+
+@pytest.fixture
+def aggregates(make_transaction):
+    aggregates = AggregateCache()
+    for amount, category, type_key, day in [
+        (40.0, 'Food', 'expense', '2024-01-03'),
+        (25.5, 'Food', 'expense', '2024-01-17'),
+        (500.0, 'Food', 'expense', '2023-12-31'),
+        (300.0, 'Food', 'income', '2024-01-10'),
+        (7.0, 'Transportation', 'expense', '2024-01-14'),
+        (12.0, 'Transportation', 'expense', '2024-01-15'),
+        (8.0, 'Transportation', 'expense', '2024-01-21'),
+        (3.0, 'Transportation', 'expense', '2024-01-22'),
+        (80.0, 'Entertainment', 'expense', '2023-06-01'),
+        (45.0, 'Entertainment', 'expense', '2024-01-02'),
+        (30.0, 'Entertainment', 'expense', '2024-01-16'),
+        (999.0, 'Other', 'expense', '2024-01-17'),
+    ]:
+        aggregates.add(make_transaction(amount=amount, category=category, type_key=type_key, date=day))
+    return aggregates
+
+@pytest.mark.parametrize('category, expected', [
+    # Only this month's expenses count.
+    ('Food', (65.5, 100.0, 'month')),
+    # ISO weeks run Monday to Sunday: the 15th to the 21st.
+    ('Transportation', (20.0, 20.0, 'week')),
+    ('Entertainment', (75.0, 50.0, 'year')),
+    ('Other', None),
+    ('Utilities', None),
+])
+def test_status(budgets, aggregates, category, expected):
+    assert budgets.status(aggregates, category, TODAY) == expected
+
+def test_status_follows_edits(budgets, aggregates, make_transaction):
+    # Reaching the limit is not over it; one cent more is.
+    assert budgets.status(aggregates, 'Transportation', TODAY)[0] == 20.0
+    aggregates.add(make_transaction(amount=0.01, category='Transportation', date='2024-01-16'))
+    spent, limit, _ = budgets.status(aggregates, 'Transportation', TODAY)
+    assert spent > limit
+    aggregates.remove(make_transaction(amount=30.0, category='Entertainment', date='2024-01-16'))
+    assert budgets.status(aggregates, 'Entertainment', TODAY) == (45.0, 50.0, 'year')
+    aggregates.clear()
+    assert budgets.status(aggregates, 'Food', TODAY) == (0.0, 100.0, 'month')
+    assert budgets.status(aggregates, 'Food', date(2024, 2, 1)) == (0.0, 100.0, 'month')
+
+def test_removed_limits_and_categories_have_no_status(budgets, aggregates):
+    budgets.set_limit('Food', None)
+    assert budgets.status(aggregates, 'Food', TODAY) is None
+    assert budgets.remove_category('Entertainment')
+    assert budgets.status(aggregates, 'Entertainment', TODAY) is None
+    assert not budgets.remove_category(CategoryBudgets.FALLBACK_CATEGORY)
+
+def test_limits_round_trip(budgets, aggregates, tmp_path):
+    data = budgets.to_json()
+    data['limits']['Other'] = {'amount': 5.0, 'period': 'fortnight'}
+    reloaded = CategoryBudgets(tmp_path / 'budget_categories.json')
+    reloaded.from_json(data)
+    assert reloaded.status(aggregates, 'Transportation', TODAY) == (20.0, 20.0, 'week')
+    # A limit for a period the rollups don't keep is dropped on load.
+    assert reloaded.status(aggregates, 'Other', TODAY) is None
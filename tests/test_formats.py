@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from budget_manager import DisplayFormats
+
+@pytest.mark.parametrize('lang, amount, expected', [
+    ('en', 0, '0.00'),
+    ('en', 1234.5, '1234.50'),
+    ('en', -7.25, '-7.25'),
+    ('en', 0.125, '0.12'),
+    ('en', 1e6, '1000000.00'),
+    ('fa', 0, '۰٫۰۰'),
+    ('fa', 1234.5, '۱۲۳۴٫۵۰'),
+    ('fa', -7.25, '-۷٫۲۵'),
+    ('fa', 0.125, '۰٫۱۲'),
+    ('fa', 9876543.21, '۹۸۷۶۵۴۳٫۲۱'),
+    ('zh', 1234.5, '1234.50'),
+    ('ru', 1234.5, '1234,50'),
+])
+def test_amount(lang, amount, expected):
+    assert DisplayFormats().amount(lang, amount) == expected
+
+@pytest.mark.parametrize('lang, day, expected', [
+    ('en', '2024-03-05', '2024-03-05'),
+    ('en', '1999-12-31', '1999-12-31'),
+    ('fa', '2024-03-05', '۲۰۲۴/۰۳/۰۵'),
+    ('fa', '1999-12-31', '۱۹۹۹/۱۲/۳۱'),
+    ('zh', '2024-03-05', '2024年3月5日'),
+    ('ru', '2024-03-05', '05.03.2024'),
+    # Anything that isn't a YYYY-MM-DD date is shown as stored.
+    ('fa', '2024-3-5', '2024-3-5'),
+    ('fa', '', ''),
+    ('fa', 'abcd-ef-gh', 'abcd-ef-gh'),
+    ('zh', '2024-03-5x', '2024-03-5x'),
+])
+def test_date(lang, day, expected):
+    assert DisplayFormats().date(lang, day) == expected
+
+def test_dates_are_memoized_per_language():
+    formats = DisplayFormats()
+    assert formats.date('fa', '2024-03-05') is formats.date('fa', '2024-03-05')
+    assert formats.date('en', '2024-03-05') == '2024-03-05'
+    assert formats.date('fa', '2024-03-05') == '۲۰۲۴/۰۳/۰۵'
+    assert set(formats._dates) == {'fa', 'en'}
@@ -0,0 +1,112 @@
+import json
+
+from ledger_core import JsonTransactionRepository, TransactionJournal, load_ledger
+
+def open_ledger(tmp_path, **kwargs):
+    repository = JsonTransactionRepository(str(tmp_path / 'budget_transactions.json'), **kwargs)
+    load_ledger(repository)
+    return repository
+
+def ledger_rows(tmp_path):
+    repository = open_ledger(tmp_path)
+    try:
+        return repository.all()
+    finally:
+        repository.close()
+
+def test_journal_replays_adds_and_deletes(tmp_path, make_transaction):
+    repository = open_ledger(tmp_path)
+    repository.add_many([make_transaction(amount=float(n), description=f'row {n}') for n in range(5)])
+    repository.delete_ids([2, 4])
+    repository.add(make_transaction(amount=99.0))
+    repository.close()
+
+    assert not (tmp_path / 'budget_transactions.bin').exists()
+    rows = ledger_rows(tmp_path)
+    assert [(t['id'], t['amount']) for t in rows] == [(1, 0.0), (3, 2.0), (5, 4.0), (6, 99.0)]
+    assert rows[0]['description'] == 'row 0'
+
+def test_torn_journal_tail_is_truncated(tmp_path, make_transaction):
+    repository = open_ledger(tmp_path)
+    repository.add_many([make_transaction(amount=1.0), make_transaction(amount=2.0)])
+    repository.close()
+    journal_path = tmp_path / 'budget_transactions.journal'
+    intact = journal_path.read_bytes()
+    with open(journal_path, 'ab') as f:
+        f.write(b'{"op": "add", "transaction": {"amo')
+
+    repository = open_ledger(tmp_path)
+    assert [t['amount'] for t in repository.all()] == [1.0, 2.0]
+    assert journal_path.read_bytes() == intact
+    # Later appends start on a clean line and replay.
+    repository.add(make_transaction(amount=3.0))
+    repository.close()
+    assert [t['amount'] for t in ledger_rows(tmp_path)] == [1.0, 2.0, 3.0]
+    for line in journal_path.read_text(encoding='utf-8').splitlines():
+        json.loads(line)
+
+def test_compaction_writes_snapshot_and_keeps_newer_records(tmp_path, make_transaction):
+    repository = open_ledger(tmp_path)
+    repository.journal.compact_every = 4
+    repository.add_many([make_transaction(amount=float(n)) for n in range(4)])
+    repository.flush()
+    repository.delete_ids([1])
+    repository.add(make_transaction(amount=10.0))
+    repository.close()
+
+    snapshot_path = tmp_path / 'budget_transactions.bin'
+    assert snapshot_path.exists()
+    assert not (tmp_path / 'budget_transactions.journal.old').exists()
+    records = [json.loads(line) for line in
+               (tmp_path / 'budget_transactions.journal').read_text(encoding='utf-8').splitlines()]
+    assert [record['op'] for record in records] == ['delete', 'add']
+    assert [(t['id'], t['amount']) for t in ledger_rows(tmp_path)] == [(2, 1.0), (3, 2.0), (4, 3.0), (5, 10.0)]
+
+def test_rotated_journal_replays_after_interrupted_compaction(tmp_path, make_transaction):
+    # A crash after the journal was rotated but before the snapshot was
+    # written leaves journal.old behind; it replays before the new journal.
+    repository = open_ledger(tmp_path)
+    repository.add_many([make_transaction(amount=1.0), make_transaction(amount=2.0)])
+    repository.close()
+    journal_path = tmp_path / 'budget_transactions.journal'
+    journal_path.rename(tmp_path / 'budget_transactions.journal.old')
+
+    repository = open_ledger(tmp_path)
+    repository.add(make_transaction(amount=3.0))
+    repository.close()
+    assert [(t['id'], t['amount']) for t in ledger_rows(tmp_path)] == [(1, 1.0), (2, 2.0), (3, 3.0)]
+
+def test_compaction_crashing_twice_keeps_every_record(tmp_path, make_transaction, monkeypatch):
+    def crash(self, seq, transactions):
+        raise OSError('crashed before the snapshot was written')
+
+    repository = open_ledger(tmp_path)
+    repository.add_many([make_transaction(amount=1.0), make_transaction(amount=2.0)])
+    repository.close()
+    with monkeypatch.context() as patched:
+        patched.setattr(TransactionJournal, '_write_snapshot', crash)
+        repository = open_ledger(tmp_path)
+        repository.save()
+        repository.close()
+        assert (tmp_path / 'budget_transactions.journal.old').exists()
+        # The second crash must not rotate the new journal over the old one.
+        repository = open_ledger(tmp_path)
+        repository.add(make_transaction(amount=3.0))
+        repository.save()
+        repository.close()
+    assert [(t['id'], t['amount']) for t in ledger_rows(tmp_path)] == [(1, 1.0), (2, 2.0), (3, 3.0)]
+
+    repository = open_ledger(tmp_path)
+    repository.save()
+    repository.add(make_transaction(amount=4.0))
+    repository.close()
+    assert (tmp_path / 'budget_transactions.bin').exists()
+    assert not (tmp_path / 'budget_transactions.journal.old').exists()
+    assert [t['amount'] for t in ledger_rows(tmp_path)] == [1.0, 2.0, 3.0, 4.0]
+
+def test_legacy_json_list_snapshot_loads(tmp_path, make_transaction):
+    legacy = [make_transaction(amount=float(n)) for n in range(3)]
+    (tmp_path / 'budget_transactions.json').write_text(json.dumps(legacy), encoding='utf-8')
+    rows = TransactionJournal(tmp_path / 'budget_transactions.json').load()
+    assert [t['amount'] for t in rows] == [0.0, 1.0, 2.0]
+    assert [t['id'] for t in rows] == [1, 2, 3]
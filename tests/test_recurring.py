@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from ledger_core import RecurringRules, RecurringSchedule
+
+def days(spec, first, last):
+    return [day.isoformat() for day in RecurringSchedule(spec).occurrences(first, last)]
+
+def test_monthly_day_is_clamped_to_the_month_end():
+    assert days('monthly:31', date(2024, 1, 1), date(2024, 5, 31)) == \
+        ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30', '2024-05-31']
+    assert days('monthly:30', date(2023, 2, 1), date(2023, 3, 31)) == ['2023-02-28', '2023-03-30']
+    assert days('monthly:15', date(2024, 1, 16), date(2024, 3, 14)) == ['2024-02-15']
+
+def test_weekdays_count_from_sunday():
+    # 2024-01-01 is a Monday.
+    assert days('weekly:1', date(2024, 1, 1), date(2024, 1, 21)) == ['2024-01-01', '2024-01-08', '2024-01-15']
+    assert days('weekly:0', date(2024, 1, 1), date(2024, 1, 14)) == days('weekly:7', date(2024, 1, 1), date(2024, 1, 14)) \
+        == ['2024-01-07', '2024-01-14']
+    assert days('* * 1-5', date(2024, 1, 5), date(2024, 1, 9)) == ['2024-01-05', '2024-01-08', '2024-01-09']
+    assert days('daily', date(2024, 2, 28), date(2024, 3, 1)) == ['2024-02-28', '2024-02-29', '2024-03-01']
+
+def test_cron_fields():
+    assert days('1,15 */6 *', date(2024, 1, 1), date(2024, 12, 31)) == \
+        ['2024-01-01', '2024-01-15', '2024-07-01', '2024-07-15']
+    # As in cron, a day matches either restricted day field.
+    assert days('13 * 5', date(2024, 9, 1), date(2024, 9, 30)) == \
+        ['2024-09-06', '2024-09-13', '2024-09-20', '2024-09-27']
+    assert days('13 * 5', date(2024, 12, 1), date(2024, 12, 13)) == ['2024-12-06', '2024-12-13']
+
+@pytest.mark.parametrize('spec', [
+    'yearly', 'monthly:0', 'monthly:32', 'monthly:x', 'weekly:8', 'weekly:',
+    '* *', '* * * *', '32 * *', '* 13 *', '5-1 * *', '*/0 * *', '1-x * *', 'mon * *',
+])
+def test_bad_schedules_are_rejected(spec):
+    with pytest.raises(ValueError):
+        RecurringSchedule(spec)
+
+def test_bad_rule_is_not_added(tmp_path, make_transaction):
+    rules = RecurringRules(tmp_path / 'budget_recurring.json')
+    with pytest.raises(ValueError):
+        rules.add(make_transaction(), 'every day', '2024-01-15')
+    assert rules.rules == [] and rules.next_id == 1
+
+def test_due_catches_up_every_missed_occurrence_once(tmp_path, make_transaction):
+    rules = RecurringRules(tmp_path / 'budget_recurring.json')
+    rules.add(make_transaction(amount=900.0, category='Utilities', description='Rent'), 'monthly:31', '2024-01-31')
+    rules.add(make_transaction(amount=5.0), 'weekly:1', '2024-02-20', ledger='Trip')
+    due = rules.due(date(2024, 4, 2))
+    assert [transaction['date'] for transaction in due] == ['2024-02-29', '2024-03-31']
+    assert {(t['amount'], t['category'], t['type'], t['description']) for t in due} == \
+        {(900.0, 'Utilities', 'expense', 'Rent')}
+    assert rules.due(date(2024, 4, 2)) == []
+    assert rules.due(date(2024, 4, 29)) == []
+    assert [transaction['date'] for transaction in rules.due(date(2024, 4, 30))] == ['2024-04-30']
+    # Rules of another ledger wait until it is open, then catch up too.
+    assert [transaction['date'] for transaction in rules.due(date(2024, 3, 12), ledger='Trip')] == \
+        ['2024-02-26', '2024-03-04', '2024-03-11']
+
+def test_catch_up_survives_a_reload(tmp_path, make_transaction):
+    rules = RecurringRules(tmp_path / 'budget_recurring.json')
+    rules.add(make_transaction(), 'daily', '2024-01-15')
+    assert len(rules.due(date(2024, 1, 17))) == 2
+    reloaded = RecurringRules(tmp_path / 'budget_recurring.json')
+    reloaded.from_json(rules.to_json())
+    assert [transaction['date'] for transaction in reloaded.due(date(2024, 1, 20))] == \
+        ['2024-01-18', '2024-01-19', '2024-01-20']
+    assert reloaded.add(make_transaction(), 'daily', '2024-01-20')['id'] == 2
@@ -0,0 +1,211 @@
+import threading
+
+import pytest
+
+from ledger_core import (
+    JsonTransactionRepository, RecurringRules, SettingsFile, SqliteTransactionRepository, StoreBackedRepository,
+    TransactionRepository, TransactionSearchIndex, load_ledger, open_repository
+)
+
+def test_repository_without_overrides_fails_on_creation():
+    class Partial(TransactionRepository):
+        def count(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial()
+    with pytest.raises(TypeError):
+        StoreBackedRepository()
+
+def test_settings_file_needs_both_conversions(tmp_path):
+    class ReadOnly(SettingsFile):
+        def from_json(self, data):
+            pass
+
+    with pytest.raises(TypeError):
+        ReadOnly(tmp_path / 'settings.json')
+    RecurringRules(tmp_path / 'budget_recurring.json')
+
+DESCRIPTIONS = ('Coffee shop', 'Grocery market', 'café_au lait', 'coffee-beans 250g', 'Monthly salary', 'Bus ticket')
+
+def fill(repository, make_transaction):
+    rows = [make_transaction(amount=float((n * 37) % 101), category=('Food', 'Transport', 'Other')[n % 3],
+                             type_key='income' if n % 4 == 0 else 'expense', date=f'2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}',
+                             description=DESCRIPTIONS[n % len(DESCRIPTIONS)])
+            for n in range(120)]
+    repository.add_many(rows[:80])
+    repository.delete_ids(repository.ids_at(range(0, 80, 9)))
+    repository.add_many(rows[80:])
+
+@pytest.fixture
+def both(tmp_path, make_transaction):
+    repositories = [open_repository('json', str(tmp_path / 'memory')), open_repository('sqlite', str(tmp_path / 'ledger'))]
+    for repository in repositories:
+        load_ledger(repository)
+        fill(repository, make_transaction)
+    yield repositories
+    for repository in repositories:
+        repository.close()
+
+@pytest.mark.parametrize('facets', [
+    {},
+    {'text': 'cof'},
+    {'text': 'COFFEE sh'},
+    {'text': 'café_au'},
+    {'text': '250'},
+    {'category': 'Food', 'type_key': 'expense'},
+    {'date_range': ('2024-03-01', '2024-06-30'), 'amount_range': (10.0, 60.0)},
+    {'date_range': (None, '2024-02-15')},
+])
+def test_sqlite_search_matches_the_in_memory_index(both, facets):
+    memory, sqlite = both
+    for sort in (None,) + TransactionSearchIndex.SORT_COLUMNS:
+        for descending in (False, True):
+            expected = memory.search(**facets, sort=sort, descending=descending)
+            assert sqlite.search(**facets, sort=sort, descending=descending).tolist() == expected.tolist()
+
+def test_sqlite_paging_reads_the_table(both):
+    memory, sqlite = both
+    assert sqlite.count() == memory.count() == 111
+    assert not hasattr(sqlite, 'store')
+    # Reads see writes that are still queued for the writer.
+    assert sqlite.fetch(100, 20) == memory.fetch(100, 20)
+    positions = [0, 1, 2, 50, 51, 110, 111]
+    assert sqlite.ids_at(positions).tolist() == memory.ids_at(positions).tolist()
+    ids = [200, 90, 3, 90, 1]
+    assert sqlite.fetch_ids(ids) == memory.fetch_ids([90, 3, 1])
+    assert sqlite.find_by_dates({'2024-03-03'}) == memory.find_by_dates({'2024-03-03'})
+    assert sorted(sqlite.aggregate_groups()) == sorted(memory.aggregate_groups())
+
+def test_sqlite_reads_overlay_queued_writes_without_waiting(both, make_transaction, monkeypatch):
+    memory, sqlite = both
+    sqlite.flush()
+    release = threading.Event()
+    sqlite.writer.submit(release.wait)
+    try:
+        # Everything below stays queued behind the blocked task; a read
+        # that waited for the writer would fail here.
+        monkeypatch.setattr(sqlite.writer, 'flush', lambda: pytest.fail('read waited for the writer'))
+        for repository in (memory, sqlite):
+            repository.add_many([make_transaction(amount=float(n), description=f'queued coffee {n}',
+                                                  date='2024-03-03') for n in range(5)])
+            repository.delete_ids(repository.ids_at([1, 2, 112, 113]))
+        assert sqlite.fetch(0, sqlite.count()) == memory.fetch(0, memory.count())
+        assert sqlite.fetch(100, 20) == memory.fetch(100, 20)
+        assert sqlite.fetch_ids([112, 113, 114, 2, 3]) == memory.fetch_ids([112, 113, 114, 2, 3])
+        assert sqlite.find_by_dates({'2024-03-03'}) == memory.find_by_dates({'2024-03-03'})
+        for facets in ({}, {'text': 'coffee'}, {'category': 'Food', 'amount_range': (1.0, 50.0)}):
+            for sort in (None, 'date', 'amount', 'type'):
+                for descending in (False, True):
+                    expected = memory.search(**facets, sort=sort, descending=descending).tolist()
+                    assert sqlite.search(**facets, sort=sort, descending=descending).tolist() == expected
+    finally:
+        release.set()
+    monkeypatch.undo()
+    sqlite.flush()
+    assert sqlite.fetch(0, sqlite.count()) == memory.fetch(0, memory.count())
+    assert sqlite.search(text='coffee', sort='amount').tolist() == memory.search(text='coffee', sort='amount').tolist()
+
+def test_sqlite_reopens_with_count_and_ids(tmp_path, make_transaction):
+    repository = open_repository('sqlite', str(tmp_path / 'ledger'))
+    fill(repository, make_transaction)
+    expected = repository.all()
+    repository.close()
+    repository = open_repository('sqlite', str(tmp_path / 'ledger'))
+    load_ledger(repository)
+    assert repository.count() == len(expected)
+    assert repository.all() == expected
+    repository.add(make_transaction())
+    assert repository.fetch(len(expected))[0]['id'] == expected[-1]['id'] + 1
+    repository.close()
+
+def test_sqlite_positions_follow_scattered_deletes(tmp_path, both):
+    memory, sqlite = both
+    for repository in (memory, sqlite):
+        repository.delete_ids(repository.ids_at([0, 7, 8, 9, 64, 110, 500]))
+    assert sqlite.count() == memory.count() == 105
+    for offset in (0, 5, 60, 100):
+        assert sqlite.fetch(offset, 10) == memory.fetch(offset, 10)
+    assert sqlite.ids_at(range(0, 105, 3)).tolist() == memory.ids_at(range(0, 105, 3)).tolist()
+    store = sqlite.snapshot()
+    sqlite.clear()
+    assert sqlite.count() == 0 and sqlite.fetch(0, 10) == [] and len(sqlite.ids_at([0])) == 0
+    sqlite.restore(store)
+    assert sqlite.all() == memory.all()
+    sqlite.close()
+    # The ids are read back by the loader.
+    reopened = open_repository('sqlite', str(tmp_path / 'ledger'))
+    load_ledger(reopened)
+    assert reopened.count() == 105
+    assert reopened.ids_at([104, 0, 50]).tolist() == memory.ids_at([0, 50, 104]).tolist()
+    assert reopened.fetch(95) == memory.fetch(95)
+    reopened.close()
+
+def test_sqlite_search_without_fts5(tmp_path, make_transaction, monkeypatch):
+    monkeypatch.setattr(SqliteTransactionRepository, 'FTS_SCHEMA',
+                        'CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING no_such_module(description)')
+    memory = open_repository('json', str(tmp_path / 'memory'))
+    sqlite = open_repository('sqlite', str(tmp_path / 'ledger'))
+    try:
+        assert not sqlite.fts
+        for repository in (memory, sqlite):
+            load_ledger(repository)
+            fill(repository, make_transaction)
+        for text in ('cof', 'COFFEE sh', 'café_au', 'lait bus'):
+            assert sqlite.search(text=text).tolist() == memory.search(text=text).tolist()
+    finally:
+        memory.close()
+        sqlite.close()
+
+def test_rows_appended_after_deletes_are_searchable(tmp_path, make_transaction):
+    # Appended rows are indexed from the store's slot count, which differs
+    # from its live row count once rows were deleted; starting from the
+    # latter indexed old rows a second time.
+    path = str(tmp_path / 'ledger.json')
+    repository = JsonTransactionRepository(path)
+    load_ledger(repository)
+    repository.add_many([make_transaction(description=f'old {n}') for n in range(10)])
+    repository.delete_ids([2, 3, 5])
+    repository.add(make_transaction(amount=42.0, description='Appended parcel'))
+    found = repository.fetch_ids(repository.search(text='parcel'))
+    assert [(t['id'], t['amount']) for t in found] == [(11, 42.0)]
+    for column in TransactionSearchIndex.SORT_COLUMNS:
+        ids = repository.search(sort=column).tolist()
+        assert sorted(ids) == [1, 4, 6, 7, 8, 9, 10, 11]
+    assert repository.search(sort='amount', descending=True)[0] == 11
+    repository.close()
+
+    # The same through journal replay on load.
+    repository = JsonTransactionRepository(path)
+    load_ledger(repository)
+    assert repository.search(text='parcel').tolist() == [11]
+    repository.add(make_transaction(amount=43.0, description='Second parcel'))
+    assert repository.search(text='parcel').tolist() == [11, 12]
+    assert len(repository.search(sort='date')) == repository.count() == 9
+    repository.close()
+
+def test_rows_added_after_a_sorted_query_sort_into_place(tmp_path, make_transaction):
+    repository = JsonTransactionRepository(str(tmp_path / 'ledger.json'))
+    load_ledger(repository)
+    repository.add_many([make_transaction(amount=float(n % 7), date=f'2024-01-{n % 28 + 1:02d}') for n in range(40)])
+    repository.search(sort='amount')
+    index = repository.index
+    for amount, date in ((3.0, '2024-01-02'), (0.5, '2024-02-01'), (9.0, '2023-12-31'), (3.0, '2024-01-01')):
+        repository.add(make_transaction(amount=amount, date=date))
+    # Appends wait for the next query that needs the order.
+    assert index.merged == 40 and index.size == 44
+    rows = repository.all()
+    for column in ('amount', 'date'):
+        for descending in (False, True):
+            expected = [t['id'] for t in sorted(rows, key=lambda t: (t[column], t['id']), reverse=descending)]
+            assert repository.search(sort=column, descending=descending).tolist() == expected
+    assert index.merged == 44
+    repository.add(make_transaction(amount=6.5, date='2024-03-01'))
+    assert repository.search(amount_range=(6.0, 7.0)).tolist() == [t['id'] for t in repository.all() if 6.0 <= t['amount'] <= 7.0]
+    # Compaction with appends still unmerged.
+    repository.add(make_transaction(amount=0.25))
+    repository.delete_ids(repository.ids_at(range(0, 45, 2)))
+    index.compact(repository.store.compact())
+    rows = repository.all()
+    assert repository.search(sort='amount').tolist() == [t['id'] for t in sorted(rows, key=lambda t: (t['amount'], t['id']))]
+    repository.close()
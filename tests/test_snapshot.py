@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+
+from ledger_core import (
+    ColumnarTransactionStore, SNAPSHOT_HEADER, SNAPSHOT_MAGIC, _pack_pool, _snapshot_layout, load_ledger,
+    open_repository, read_binary_snapshot, write_binary_snapshot
+)
+
+def make_store(transactions):
+    store = ColumnarTransactionStore()
+    store.extend(transactions)
+    return store
+
+def write_v1_snapshot(path, store, seq=0):
+    # The version 1 layout: no id column, no next_id in the header.
+    size = store.size
+    columns = {name: column[:size] for name, column in store.columns.items() if name != 'id'}
+    used_categories, columns['category'] = np.unique(columns['category'], return_inverse=True)
+    used_strings, strings = np.unique(np.concatenate([columns['description'], columns['timestamp']]),
+                                      return_inverse=True)
+    columns['description'], columns['timestamp'] = strings[:size], strings[size:]
+    category_offsets, category_heap = _pack_pool(store.categories, used_categories)
+    string_offsets, string_heap = _pack_pool(store.strings, used_strings)
+    string_offsets += len(category_heap)
+    layout, heap_offset = _snapshot_layout(size, len(used_categories), len(used_strings), version=1)
+    arrays = dict(columns, category_offsets=category_offsets, string_offsets=string_offsets)
+    heap = category_heap + string_heap
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 1, 0, seq, size, len(used_categories),
+                                     len(used_strings), len(heap), 0))
+        for name, (offset, dtype, length) in layout.items():
+            f.seek(offset)
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        f.seek(heap_offset)
+        f.write(heap)
+
+def test_v2_round_trip_keeps_ids_and_strings(tmp_path, make_transaction):
+    transactions = [make_transaction(amount=float(n), category=('Food', 'Transport')[n % 2],
+                                     type_key=('income', 'expense')[n % 2], description=f'Café {n}')
+                    for n in range(6)]
+    store = make_store(transactions)
+    store.delete_ids([2, 5])
+    path = tmp_path / 'ledger.bin'
+    written = write_binary_snapshot(path, store, seq=42)
+    assert written == os.path.getsize(path)
+
+    loaded, seq = read_binary_snapshot(path)
+    assert seq == 42
+    assert loaded.next_id == 7
+    expected = [t for t in transactions if t['id'] not in (2, 5)]
+    assert list(loaded) == expected
+    # Opened read-only from the mapping; the first change copies.
+    loaded.detach()
+    loaded.extend([make_transaction(amount=7.0)])
+    assert loaded.slice()[-1]['id'] == 7
+
+def test_detach_closes_the_mapping(tmp_path, make_transaction):
+    path = tmp_path / 'ledger.bin'
+    transactions = [make_transaction(amount=float(n), description=f'row {n}') for n in range(5)]
+    write_binary_snapshot(path, make_store(transactions))
+    loaded, _ = read_binary_snapshot(path)
+    mapping = loaded.mapping
+    assert loaded.strings[0] and loaded.categories[0]
+    loaded.detach()
+    assert mapping.closed
+    assert loaded.mapping is None
+    assert list(loaded) == transactions
+    # Nothing holds the file open any more, so it can be rewritten in place.
+    write_binary_snapshot(path, loaded)
+    assert list(read_binary_snapshot(path)[0]) == transactions
+
+def test_compaction_releases_the_loaded_snapshot(tmp_path, make_transaction):
+    base_name = str(tmp_path / 'budget_transactions')
+    repository = open_repository('json', base_name)
+    load_ledger(repository)
+    repository.add_many([make_transaction(description=f'row {n}') for n in range(10)])
+    repository.save()
+    repository.close()
+    repository = open_repository('json', base_name)
+    load_ledger(repository)
+    mapping = repository.store.mapping
+    assert mapping is not None
+    assert len(repository.search(text='row', sort='amount')) == 10
+    repository.delete_ids(repository.ids_at([0]))
+    repository.save()
+    repository.flush()
+    assert mapping.closed
+    repository.close()
+
+def test_v1_snapshot_reads_with_sequential_ids(tmp_path, make_transaction):
+    transactions = [make_transaction(amount=float(n), description=f'row {n}') for n in range(4)]
+    path = tmp_path / 'ledger.bin'
+    write_v1_snapshot(path, make_store(transactions), seq=3)
+
+    loaded, seq = read_binary_snapshot(path)
+    assert seq == 3
+    assert [t['id'] for t in loaded] == [1, 2, 3, 4]
+    assert loaded.next_id == 5
+    assert [t['description'] for t in loaded] == ['row 0', 'row 1', 'row 2', 'row 3']
+
+    # Rewritten, it becomes a version 2 snapshot with the same rows.
+    write_binary_snapshot(path, loaded.copy())
+    loaded.detach()
+    reread, _ = read_binary_snapshot(path)
+    assert list(reread) == list(loaded)
+    assert SNAPSHOT_HEADER.unpack_from(path.read_bytes(), 0)[1] == 2
+
+def test_rejects_truncated_and_foreign_files(tmp_path, make_transaction):
+    path = tmp_path / 'ledger.bin'
+    write_binary_snapshot(path, make_store([make_transaction()]))
+    path.write_bytes(path.read_bytes()[:-8])
+    with pytest.raises(ValueError):
+        read_binary_snapshot(path)
+    path.write_bytes(b'\0' * 128)
+    with pytest.raises(ValueError):
+        read_binary_snapshot(path)
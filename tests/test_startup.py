@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('PyQt6')
+pytest.importorskip('matplotlib')
+
+from budget_manager import StartupProfiler
+from ledger_core import load_ledger, open_repository
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'budget_manager.py')
+# Time until the window shows, for a small ledger on a cold interpreter.
+STARTUP_BUDGET_MS = 5000
+PHASES = ['imports', 'qapplication', 'repository', 'ui', 'theme', 'texts', 'window_shown']
+
+def profile_startup(cwd, *args):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    result = subprocess.run([sys.executable, APP, '--profile-startup', *args], cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=120)
+    return result.returncode, json.loads(result.stdout)
+
+@pytest.fixture
+def ledger_dir(tmp_path, make_transaction):
+    repository = open_repository('json', str(tmp_path / 'budget_transactions'))
+    load_ledger(repository)
+    repository.add_many([make_transaction(amount=n % 90 + 1.25, date=f'2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}',
+                                          description=f'Row {n}') for n in range(2000)])
+    repository.save()
+    repository.close()
+    return tmp_path
+
+def test_profile_startup_reports_every_phase_within_budget(ledger_dir):
+    status, report = profile_startup(ledger_dir, '--startup-budget-ms', str(STARTUP_BUDGET_MS))
+    assert status == 0
+    assert set(report) == {'phases', 'total_ms', 'budget_ms', 'within_budget'}
+    phases = [phase['phase'] for phase in report['phases']]
+    assert phases[:len(PHASES)] == PHASES
+    # The ledger and the chart finish after the window is up.
+    assert sorted(phases[len(PHASES):]) == ['chart_ready', 'ledger_loaded']
+    elapsed = 0.0
+    for phase in report['phases']:
+        assert set(phase) == {'phase', 'ms', 'elapsed_ms'}
+        assert phase['ms'] >= 0
+        assert phase['elapsed_ms'] == pytest.approx(elapsed + phase['ms'], abs=0.02)
+        elapsed = phase['elapsed_ms']
+    assert report['total_ms'] == elapsed
+    assert report['budget_ms'] == STARTUP_BUDGET_MS and report['within_budget']
+    shown = report['phases'][PHASES.index('window_shown')]['elapsed_ms']
+    assert shown <= STARTUP_BUDGET_MS
+
+def test_startup_over_budget_exits_with_status_1(ledger_dir):
+    status, report = profile_startup(ledger_dir, '--startup-budget-ms', '0.01')
+    assert status == 1
+    assert report['within_budget'] is False
+
+def test_profiler_completes_once_every_awaited_phase_is_marked():
+    profiler = StartupProfiler(0.0, wait_for=('ledger_loaded', 'chart_ready'))
+    completed = []
+    profiler.on_complete = lambda: completed.append(True)
+    profiler.mark('window_shown')
+    profiler.mark('chart_ready')
+    assert completed == []
+    first = profiler.phases['chart_ready']
+    profiler.mark('chart_ready')
+    assert profiler.phases['chart_ready'] == first
+    profiler.mark('ledger_loaded')
+    profiler.finish()
+    assert completed == [True]
+    assert [phase['phase'] for phase in profiler.report()['phases']] == ['window_shown', 'chart_ready', 'ledger_loaded']
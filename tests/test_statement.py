@@ -0,0 +1,87 @@
+import pytest
+
+import budget_cli
+from ledger_core import CategoryBudgets, StatementReader
+
+CATEGORIES = CategoryBudgets.DEFAULT_CATEGORIES
+
+def read_all(path, **kwargs):
+    reader = StatementReader(path, CATEGORIES, **kwargs)
+    rows = [t for _, batch, _, _ in reader.read_batches() for t in batch]
+    return reader, rows
+
+def test_column_map_overrides_guessing(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text('Booked;Money;Text;Memo\n2024-01-13;-5,50;Shop;ignored\n', encoding='utf-8')
+    with pytest.raises(ValueError):
+        read_all(path)
+    _, rows = read_all(path, column_map={'date': 'booked', 'amount': 'Money', 'description': 'Text'})
+    assert [(t['date'], t['amount'], t['type'], t['description']) for t in rows] == \
+        [('2024-01-13', 5.5, 'expense', 'Shop')]
+
+def test_empty_mapping_ignores_a_guessed_column(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text('date,amount,type\n2024-01-13,5,income\n', encoding='utf-8')
+    _, rows = read_all(path, column_map={'type': ''})
+    assert rows[0]['type'] == 'income'
+    path.write_text('date,amount,type\n2024-01-13,-5,income\n', encoding='utf-8')
+    _, rows = read_all(path, column_map={'type': ''})
+    assert rows[0]['type'] == 'expense'
+    with pytest.raises(ValueError):
+        read_all(path, column_map={'amount': 'missing'})
+
+def test_header_and_guessed_columns(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text('Posting Date,Amount,Payee\n2024-01-13,5,Shop\n', encoding='utf-8')
+    reader = StatementReader(path, CATEGORIES)
+    header = reader.read_header()
+    assert header == ['Posting Date', 'Amount', 'Payee']
+    assert reader.guess_columns(header) == {'date': 'Posting Date', 'amount': 'Amount', 'description': 'Payee'}
+
+def test_date_format_is_chosen_from_the_sample_for_the_whole_file(tmp_path):
+    # The first rows would read as month/day, a later one only as day/month.
+    path = tmp_path / 'statement.csv'
+    path.write_text('date,amount\n01/02/2024,1\n13/02/2024,2\n03/04/2024,3\n', encoding='utf-8')
+    reader, rows = read_all(path)
+    assert reader.date_format == '%d/%m/%Y'
+    assert [t['date'] for t in rows] == ['2024-02-01', '2024-02-13', '2024-04-03']
+
+def test_ambiguous_dates_are_refused_unless_a_format_is_given(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text('date,amount\n01/02/2024,1\n03/04/2024,2\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='DD/MM/YYYY'):
+        read_all(path)
+    _, rows = read_all(path, date_format='%m/%d/%Y')
+    assert [t['date'] for t in rows] == ['2024-01-02', '2024-03-04']
+
+def test_rows_in_another_format_are_invalid_not_reinterpreted(tmp_path):
+    path = tmp_path / 'statement.csv'
+    lines = ['date,amount'] + ['13/02/2024,1'] * 3 + ['02/13/2024,2']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    reader, rows = read_all(path)
+    assert len(rows) == 3
+    assert reader.invalid == 1
+
+def test_cli_import_with_column_map(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'statement.csv').write_text('Booked,Money\n02/01/2024,-5\n', encoding='utf-8')
+    assert budget_cli.main(['import', 'statement.csv', '--map', 'date=Booked', '--map', 'amount=Money',
+                            '--date-format', 'MM/DD/YYYY']) == 0
+    assert 'imported 1' in capsys.readouterr().out
+    assert budget_cli.main(['report', '--json']) == 0
+    assert '"expense": 5.0' in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        budget_cli.main(['import', 'statement.csv', '--map', 'when=Booked'])
+
+def test_malformed_csv_is_refused_with_its_line(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'statement.csv'
+    path.write_text('date,amount,description\n2024-01-13,-5,Shop\n2024-01-14,-7,"unclosed\n'
+                    + 'x' * 200000 + '\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='line 4: field larger than field limit'):
+        read_all(path)
+    path.write_bytes(b'date,amount,description\n' + b'2024-01-13,-5,Shop\n' * 2000 + b'2024-01-14,-7,\xff\xfe\n')
+    with pytest.raises(ValueError, match='not UTF-8'):
+        read_all(path)
+    monkeypatch.chdir(tmp_path)
+    assert budget_cli.main(['import', 'statement.csv']) == 1
+    assert 'error: statement.csv' in capsys.readouterr().err
@@ -0,0 +1,160 @@
+import pytest
+
+from ledger_core import AggregateCache, CategoryBudgets, DuplicateFilter, StatementReader, UndoLog, load_ledger, open_repository
+
+@pytest.fixture(params=['json', 'sqlite'])
+def ledger(request, tmp_path):
+    repository = open_repository(request.param, str(tmp_path / 'budget_transactions'))
+    aggregates = AggregateCache()
+    load_ledger(repository, aggregates)
+    yield repository, aggregates, UndoLog(), request.param
+    repository.close()
+
+def add(ledger, rows):
+    repository, aggregates, undo_log, _ = ledger
+    repository.add_many(rows)
+    for row in rows:
+        aggregates.add(row)
+    undo_log.record('add', rows)
+
+def delete(ledger, ids):
+    repository, aggregates, undo_log, _ = ledger
+    rows = repository.delete_ids(ids)
+    for row in rows:
+        aggregates.remove(row)
+    undo_log.record('delete', rows)
+
+def clear(ledger):
+    repository, aggregates, undo_log, _ = ledger
+    undo_log.record('clear', repository.snapshot())
+    repository.clear()
+    aggregates.clear()
+
+def undo(ledger):
+    repository, aggregates, undo_log, _ = ledger
+    return undo_log.undo(repository, aggregates)
+
+def redo(ledger):
+    repository, aggregates, undo_log, _ = ledger
+    return undo_log.redo(repository, aggregates)
+
+def state(ledger):
+    repository, aggregates, _, _ = ledger
+    rows = repository.fetch(0, repository.count())
+    assert len({row['id'] for row in rows}) == len(rows)
+    assert round(sum(row['amount'] for row in rows if row['type'] == 'expense'), 2) == round(aggregates.total('expense'), 2)
+    return len(rows), round(aggregates.total('expense'), 2)
+
+def test_undo_after_a_row_was_added_back(ledger, make_transaction):
+    add(ledger, [make_transaction()])
+    delete(ledger, ledger[0].ids_at([0]))
+    assert undo(ledger) == (1, 0)
+    assert undo(ledger) == (0, 1)
+    assert state(ledger) == (0, 0.0)
+    assert redo(ledger) == (1, 0)
+    assert state(ledger) == (1, 10.0)
+    assert redo(ledger) == (0, 1)
+    assert state(ledger) == (0, 0.0)
+    assert undo(ledger) == (1, 0)
+    assert undo(ledger) == (0, 1)
+    assert redo(ledger) is not None and redo(ledger) is not None and redo(ledger) is None
+    assert state(ledger) == (0, 0.0)
+
+def test_long_chain_of_adds_and_deletes(ledger, make_transaction):
+    add(ledger, [make_transaction(amount=1.0), make_transaction(amount=2.0)])
+    add(ledger, [make_transaction(amount=4.0)])
+    delete(ledger, ledger[0].ids_at([0, 2]))
+    add(ledger, [make_transaction(amount=8.0)])
+    delete(ledger, ledger[0].ids_at([0]))
+    states = [(0, 0.0), (2, 3.0), (3, 7.0), (1, 2.0), (2, 10.0), (1, 8.0)]
+    for expected in reversed(states[:-1]):
+        undo(ledger)
+        assert state(ledger) == expected
+    assert undo(ledger) is None
+    for expected in states[1:]:
+        redo(ledger)
+        assert state(ledger) == expected
+    for _ in range(3):
+        undo(ledger)
+    assert state(ledger) == (3, 7.0)
+    # The re-added rows now sort after the 2.0 one.
+    delete(ledger, ledger[0].ids_at([1]))
+    assert not ledger[2].can_redo()
+    assert state(ledger) == (2, 6.0)
+    for expected in ((3, 7.0), (2, 3.0), (0, 0.0)):
+        undo(ledger)
+        assert state(ledger) == expected
+
+def test_import_is_undone_and_redone_as_one_edit(ledger, make_transaction, tmp_path):
+    repository, aggregates, undo_log, _ = ledger
+    path = tmp_path / 'statement.csv'
+    path.write_text('date,amount,description\n2024-01-13,-5,Shop\n2024-01-14,-7,Bus\n2024-01-15,-10,Coffee\n',
+                    encoding='utf-8')
+    add(ledger, [make_transaction()])
+    duplicate_filter = DuplicateFilter(repository)
+    imported = []
+    for _, batch, _, _ in StatementReader(path, CategoryBudgets.DEFAULT_CATEGORIES).read_batches():
+        fresh = duplicate_filter.filter(batch)
+        repository.add_many(fresh)
+        for row in fresh:
+            aggregates.add(row)
+        imported.extend(fresh)
+    undo_log.record('add', imported)
+    assert duplicate_filter.skipped == 1
+    assert state(ledger) == (3, 22.0)
+    delete(ledger, repository.ids_at(range(3)))
+    assert state(ledger) == (0, 0.0)
+    assert undo(ledger) == (3, 0)
+    assert undo(ledger) == (0, 2)
+    assert state(ledger) == (1, 10.0)
+    assert redo(ledger) == (2, 0)
+    assert redo(ledger) == (0, 3)
+    assert state(ledger) == (0, 0.0)
+    undo(ledger)
+    undo(ledger)
+    undo(ledger)
+    assert state(ledger) == (0, 0.0)
+
+def test_clear_round_trips(ledger, make_transaction):
+    repository = ledger[0]
+    add(ledger, [make_transaction(amount=1.0), make_transaction(amount=2.0, type_key='income')])
+    add(ledger, [make_transaction(amount=4.0)])
+    clear(ledger)
+    assert state(ledger) == (0, 0.0)
+    assert undo(ledger) == (3, 0)
+    assert state(ledger) == (3, 5.0)
+    assert round(ledger[1].total('income'), 2) == 2.0
+    assert undo(ledger) == (0, 1)
+    assert redo(ledger) == (1, 0)
+    assert state(ledger) == (3, 5.0)
+    assert redo(ledger) == (0, 3)
+    assert state(ledger) == (0, 0.0)
+    assert undo(ledger) == (3, 0)
+    assert undo(ledger) == (0, 1)
+    assert state(ledger) == (2, 1.0)
+    add(ledger, [make_transaction(amount=16.0)])
+    clear(ledger)
+    add(ledger, [make_transaction(amount=32.0)])
+    undo(ledger)
+    undo(ledger)
+    assert state(ledger) == (3, 17.0)
+    undo(ledger)
+    assert state(ledger) == (2, 1.0)
+    assert repository.count() == 2
+
+def test_undone_edits_survive_a_reopen(ledger, make_transaction, tmp_path):
+    repository, _, _, storage = ledger
+    add(ledger, [make_transaction(amount=1.0), make_transaction(amount=2.0)])
+    delete(ledger, repository.ids_at([0]))
+    undo(ledger)
+    undo(ledger)
+    redo(ledger)
+    redo(ledger)
+    undo(ledger)
+    expected = sorted((row['id'], row['amount']) for row in repository.fetch(0, repository.count()))
+    repository.flush()
+    reopened = open_repository(storage, str(tmp_path / 'budget_transactions'))
+    load_ledger(reopened)
+    assert sorted((row['id'], row['amount']) for row in reopened.fetch(0, reopened.count())) == expected
+    assert len(expected) == 2
+    reopened.close()
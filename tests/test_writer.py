@@ -0,0 +1,69 @@
+import threading
+
+from ledger_core import PersistenceWriter
+
+def flush_within(writer, seconds=5.0):
+    thread = threading.Thread(target=writer.flush, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return not thread.is_alive()
+
+def test_tasks_run_in_order_and_keyed_ones_coalesce():
+    writer = PersistenceWriter(window=0.05)
+    calls = []
+    writer.submit(lambda: calls.append('a'))
+    for _ in range(3):
+        writer.submit(lambda: calls.append('keyed') or 7, key='k')
+    writer.submit(lambda: calls.append('b'))
+    assert flush_within(writer)
+    assert calls == ['a', 'keyed', 'b']
+    assert writer.bytes_written == 7
+    writer.close()
+
+def test_failing_task_is_reported_and_does_not_stop_the_writer(caplog):
+    writer = PersistenceWriter(window=0)
+    errors = []
+    batches = []
+    writer.on_error = errors.append
+    writer.on_batch = lambda written, seconds: batches.append(written)
+    calls = []
+    writer.submit(lambda: 1 / 0)
+    writer.submit(lambda: calls.append('after') or 3)
+    assert flush_within(writer)
+    assert calls == ['after']
+    assert errors == ['ZeroDivisionError: division by zero']
+    assert batches[-1] == 3
+    assert 'Ledger write failed' in caplog.text
+
+    def disk_full():
+        raise OSError('disk full')
+    writer.submit(disk_full)
+    writer.submit(lambda: calls.append('still running'))
+    assert flush_within(writer)
+    assert calls == ['after', 'still running']
+    assert errors[-1] == 'disk full'
+    writer.close()
+
+def test_failing_callbacks_do_not_stop_the_writer():
+    writer = PersistenceWriter(window=0)
+    writer.on_batch = lambda written, seconds: 1 / 0
+    writer.on_error = lambda message: 1 / 0
+    calls = []
+    writer.submit(lambda: 1 / 0)
+    assert flush_within(writer)
+    writer.submit(lambda: calls.append('next'))
+    assert flush_within(writer)
+    assert calls == ['next']
+    writer.close()
+
+def test_labelled_tasks_are_timed_one_by_one():
+    writer = PersistenceWriter(window=0)
+    timings = []
+    writer.on_task = lambda label, written, seconds: timings.append((label, written, seconds >= 0))
+    writer.submit(lambda: 10, label='journal')
+    writer.submit(lambda: 5)
+    writer.submit(lambda: 1 / 0, label='settings')
+    assert flush_within(writer)
+    assert timings == [('journal', 10, True), ('settings', 0, True)]
+    assert writer.bytes_written == 15
+    writer.close()